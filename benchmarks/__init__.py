@@ -0,0 +1 @@
+"""Offline benchmarks: synthetic Firestore data, in-memory fakes and the pipeline runner."""
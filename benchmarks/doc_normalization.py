@@ -0,0 +1,129 @@
+"""
+Micro-benchmark for ``utils.process_doc_dict`` against the previous implementation.
+
+    python -m benchmarks.doc_normalization
+    python -m benchmarks.doc_normalization --docs 200000 --instance ROAR
+
+Builds trial- and run-shaped Firestore documents (camelCase keys, nested dicts and
+lists, NaN scores), checks that both implementations return the same dicts and
+reports documents per second for each.
+"""
+import argparse
+import json
+import math
+import random
+import re
+import sys
+import time
+
+import settings
+from shared import utils
+
+
+def legacy_camel_to_snake(camel_str):
+    matches = re.finditer(r'([a-z])([A-Z])', camel_str)
+    for match in matches:
+        camel_str = camel_str.replace(match.group(), match.group(1) + '_' + match.group(2))
+    return camel_str.lower()
+
+
+def legacy_handle_nan(value):
+    if isinstance(value, float) and math.isnan(value):
+        return None if settings.config['INSTANCE'] == 'LEVANTE' else "NaN"
+    elif isinstance(value, dict):
+        return {key: legacy_handle_nan(val) for key, val in value.items()}
+    elif isinstance(value, list):
+        if len(value) == 0:
+            return None
+        return [legacy_handle_nan(val) for val in value]
+    return value
+
+
+def legacy_process_doc_dict(doc_dict, ignore_keys=None):
+    if ignore_keys is None:
+        ignore_keys = []
+    return {legacy_camel_to_snake(key): legacy_handle_nan(value) for key, value in doc_dict.items()
+            if key not in ignore_keys}
+
+
+def make_docs(count: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    docs = []
+    for i in range(count):
+        if i % 10 == 0:
+            docs.append({
+                "assignmentId": f"admin{i % 7}",
+                "taskId": "egma-math",
+                "completed": True,
+                "timeStarted": "2024-05-01T10:00:00Z",
+                "scores": {"computed": {"composite": {"thetaEstimate": rng.random(), "thetaSE": float("nan")}}},
+                "userData": {"grade": rng.randint(1, 6), "schoolLevel": "elementary"},
+                "readOrig": [],
+            })
+        else:
+            docs.append({
+                "assessmentStage": "test_response",
+                "trialIndex": i % 40,
+                "trialType": "html-button-response",
+                "timeElapsed": rng.randint(1000, 90000),
+                "rt": rng.randint(200, 5000),
+                "correct": rng.random() < 0.7,
+                "response": rng.randint(0, 3),
+                "responseLocation": rng.randint(0, 3),
+                "internalNodeId": f"0.0-{i % 40}.0",
+                "isPracticeTrial": False,
+                "itemId": f"item-{i % 300}",
+                "thetaEstimate": rng.random() if i % 3 else float("nan"),
+                "thetaSE": rng.random(),
+                "answerChoices": [str(rng.randint(0, 9)) for _ in range(4)],
+                "distractors": {"a": 1, "b": float("nan")},
+            })
+    return docs
+
+
+def _same(a, b) -> bool:
+    # NaN-free after normalization on LEVANTE; "NaN" strings elsewhere, so plain JSON compares.
+    return json.dumps(a, sort_keys=True) == json.dumps(b, sort_keys=True)
+
+
+def _time(fn, docs, repeat: int) -> float:
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for doc in docs:
+            fn(doc)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=50000, help="Documents per pass (default 50000).")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes per implementation; the best is kept.")
+    parser.add_argument("--instance", default=None, help="settings.config['INSTANCE'] (default: unchanged).")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.instance:
+        settings.config['INSTANCE'] = args.instance
+    docs = make_docs(args.docs, args.seed)
+
+    mismatches = sum(not _same(legacy_process_doc_dict(doc), utils.process_doc_dict(doc, collection="trials"))
+                     for doc in docs)
+    if mismatches:
+        print(f"{mismatches} documents differ between implementations")
+        return 1
+
+    legacy = _time(legacy_process_doc_dict, docs, args.repeat)
+    current = _time(lambda doc: utils.process_doc_dict(doc, collection="trials"), docs, args.repeat)
+    print(f"docs={args.docs} instance={settings.config['INSTANCE']}")
+    print(f"  legacy   {legacy:8.3f}s  {args.docs / legacy:>12,.0f} docs/sec")
+    print(f"  current  {current:8.3f}s  {args.docs / current:>12,.0f} docs/sec  ({legacy / current:.1f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
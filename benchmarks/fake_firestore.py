@@ -0,0 +1,455 @@
+"""
+In-memory stand-in for the subset of ``google.cloud.firestore.Client`` used by
+``shared.firestore_services``: collections and documents, ``where`` / ``order_by`` /
+``limit`` / cursor / ``select`` queries, collection groups, ``get_all`` and ``count()``.
+
+Documents are plain dicts keyed by collection path, so a synthetic dataset can be
+loaded without the Firestore emulator. Ordering follows Firestore's rules (type
+rank, then value, then document name segment by segment) so name-range scans such
+as ``get_trials_for_user`` behave as they do against the real service. An optional
+per-RPC latency makes the effect of concurrency and batching visible.
+"""
+import threading
+import time
+import uuid
+from bisect import bisect_left, bisect_right
+from copy import deepcopy
+from datetime import datetime
+
+DOCUMENT_ID = "__name__"
+ASCENDING = "ASCENDING"
+
+_MISSING = object()
+_INEQUALITY_OPS = {"<", "<=", ">", ">=", "!=", "not-in"}
+
+
+def _split_path(path) -> tuple:
+    if isinstance(path, (tuple, list)):
+        path = "/".join(path)
+    return tuple(part for part in path.split("/") if part)
+
+
+def _lookup(data: dict, field_path: str):
+    value = data
+    for part in field_path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _sort_value(value) -> tuple:
+    """Firestore cross-type ordering: null < bool < number < timestamp < string < bytes < reference < array < map."""
+    if value is None:
+        return 0, 0
+    if isinstance(value, bool):
+        return 1, value
+    if isinstance(value, (int, float)):
+        return 2, value
+    if isinstance(value, datetime):
+        return 3, value
+    if isinstance(value, str):
+        return 4, value
+    if isinstance(value, (bytes, bytearray)):
+        return 5, bytes(value)
+    if isinstance(value, FakeDocumentReference):
+        return 6, value._parts
+    if isinstance(value, (list, tuple)):
+        return 8, tuple(_sort_value(v) for v in value)
+    if isinstance(value, dict):
+        return 9, tuple(sorted((k, _sort_value(v)) for k, v in value.items()))
+    return 10, repr(value)
+
+
+def _matches(value, op: str, target) -> bool:
+    if op == "==":
+        return value == target
+    if op == "!=":
+        return value != target
+    if op == "in":
+        return value in target
+    if op == "not-in":
+        return value not in target
+    if op == "array_contains":
+        return isinstance(value, list) and target in value
+    if op == "array_contains_any":
+        return isinstance(value, list) and any(t in value for t in target)
+    a, b = _sort_value(value), _sort_value(target)
+    if a[0] != b[0]:
+        return False  # range filters never match across types
+    if op == "<":
+        return a < b
+    if op == "<=":
+        return a <= b
+    if op == ">":
+        return a > b
+    if op == ">=":
+        return a >= b
+    raise ValueError(f"Unsupported operator {op!r}")
+
+
+def _project(data: dict, field_paths) -> dict:
+    projected = {}
+    for field_path in field_paths:
+        if field_path == DOCUMENT_ID:
+            continue
+        value = _lookup(data, field_path)
+        if value is _MISSING:
+            continue
+        target = projected
+        parts = field_path.split(".")
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = deepcopy(value)
+    return projected
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference: "FakeDocumentReference", data: dict | None):
+        self.reference = reference
+        self._data = data
+
+    @property
+    def id(self) -> str:
+        return self.reference.id
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> dict | None:
+        # A fresh copy per call, like decoding the protobuf; callers mutate the result.
+        return deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str):
+        value = _lookup(self._data or {}, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return deepcopy(value)
+
+
+class FakeAggregationResult:
+    def __init__(self, alias: str, value: int):
+        self.alias = alias
+        self.value = value
+
+
+class FakeAggregationQuery:
+    def __init__(self, query: "FakeQuery", alias: str | None):
+        self._query = query
+        self._alias = alias or "field_1"
+
+    def get(self, transaction=None):
+        self._query._client._rpc()
+        return [[FakeAggregationResult(self._alias, len(self._query._rows()))]]
+
+
+class FakeQuery:
+    def __init__(self, client: "FakeFirestoreClient", parts: tuple, *, all_descendants: bool = False):
+        self._client = client
+        self._parts = parts
+        self._all_descendants = all_descendants
+        self._filters = ()
+        self._orders = ()
+        self._limit = None
+        self._start = None
+        self._end = None
+        self._projection = None
+
+    def _copy(self, **changes) -> "FakeQuery":
+        query = FakeQuery.__new__(FakeQuery)
+        query.__dict__.update(self.__dict__)
+        query.__dict__.update(changes)
+        return query
+
+    # ------------------------------------------------------------------ builders
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(_filters=self._filters + ((str(field_path), op_string, value),))
+
+    def order_by(self, field_path, direction=ASCENDING):
+        if str(direction).upper() != ASCENDING:
+            raise NotImplementedError("FakeQuery only supports ascending order_by")
+        return self._copy(_orders=self._orders + (str(field_path),))
+
+    def limit(self, count: int):
+        return self._copy(_limit=count)
+
+    def select(self, field_paths):
+        return self._copy(_projection=tuple(str(f) for f in field_paths))
+
+    def start_at(self, document_fields_or_snapshot):
+        return self._copy(_start=(document_fields_or_snapshot, False))
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copy(_start=(document_fields_or_snapshot, True))
+
+    def end_at(self, document_fields_or_snapshot):
+        return self._copy(_end=(document_fields_or_snapshot, False))
+
+    def end_before(self, document_fields_or_snapshot):
+        return self._copy(_end=(document_fields_or_snapshot, True))
+
+    def count(self, alias: str | None = None):
+        return FakeAggregationQuery(self, alias)
+
+    # ------------------------------------------------------------------ execution
+    def get(self, transaction=None) -> list:
+        self._client._rpc()
+        projection = self._projection
+        return [
+            FakeDocumentSnapshot(ref, _project(data, projection) if projection is not None else data)
+            for ref, data in self._rows()
+        ]
+
+    def stream(self, transaction=None):
+        yield from self.get()
+
+    def _effective_orders(self) -> tuple:
+        orders = list(self._orders)
+        if not orders:
+            # Firestore orders by the inequality field first when no order is given.
+            for field_path, op, _ in self._filters:
+                if op in _INEQUALITY_OPS:
+                    orders.append(field_path)
+                    break
+        if DOCUMENT_ID not in orders:
+            orders.append(DOCUMENT_ID)
+        return tuple(orders)
+
+    def _sorted(self, orders: tuple) -> tuple[list, list]:
+        """(sort keys, (ref, data) rows) of every matching document, ignoring cursors and limit."""
+        keys_rows = []
+        for ref, data in self._client._iter_documents(self._parts, self._all_descendants):
+            ok = True
+            for field_path, op, target in self._filters:
+                value = ref if field_path == DOCUMENT_ID else _lookup(data, field_path)
+                if value is _MISSING or not _matches(value, op, target):
+                    ok = False
+                    break
+            if not ok:
+                continue
+            key = []
+            for field_path in orders:
+                value = ref if field_path == DOCUMENT_ID else _lookup(data, field_path)
+                if value is _MISSING:
+                    break  # documents without an order field are not in the index
+                key.append(_sort_value(value))
+            else:
+                keys_rows.append((tuple(key), (ref, data)))
+        keys_rows.sort(key=lambda kr: kr[0])
+        return [k for k, _ in keys_rows], [r for _, r in keys_rows]
+
+    def _cursor_key(self, cursor, orders: tuple) -> tuple:
+        if isinstance(cursor, FakeDocumentSnapshot):
+            values = []
+            for field_path in orders:
+                value = cursor.reference if field_path == DOCUMENT_ID else _lookup(cursor._data or {}, field_path)
+                if value is _MISSING:
+                    raise ValueError(f"Cursor snapshot has no value for order field {field_path!r}")
+                values.append(value)
+        elif isinstance(cursor, dict):
+            values = []
+            for field_path in orders:
+                if field_path not in cursor:
+                    break
+                values.append(cursor[field_path])
+        else:
+            values = list(cursor)
+        return tuple(_sort_value(v) for v in values)
+
+    def _rows(self) -> list:
+        orders = self._effective_orders()
+        keys, rows = self._client._cached_sort(self, orders)
+        lo, hi = 0, len(rows)
+        if self._start is not None:
+            cursor, exclusive = self._start
+            ck = self._cursor_key(cursor, orders)
+            prefix = (lambda k: k[:len(ck)])
+            lo = (bisect_right if exclusive else bisect_left)(keys, ck, key=prefix)
+        if self._end is not None:
+            cursor, exclusive = self._end
+            ck = self._cursor_key(cursor, orders)
+            prefix = (lambda k: k[:len(ck)])
+            hi = (bisect_left if exclusive else bisect_right)(keys, ck, key=prefix)
+        selected = rows[lo:max(lo, hi)]
+        if self._limit is not None:
+            selected = selected[:self._limit]
+        return selected
+
+    def _cache_key(self, orders: tuple):
+        return self._parts, self._all_descendants, repr(self._filters), orders
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client: "FakeFirestoreClient", parts: tuple):
+        super().__init__(client, parts)
+
+    @property
+    def id(self) -> str:
+        return self._parts[-1]
+
+    @property
+    def parent(self) -> "FakeDocumentReference | None":
+        if len(self._parts) < 2:
+            return None
+        return FakeDocumentReference(self._client, self._parts[:-1])
+
+    def document(self, document_id: str | None = None) -> "FakeDocumentReference":
+        if document_id is None:
+            document_id = uuid.uuid4().hex[:20]
+        return FakeDocumentReference(self._client, self._parts + _split_path(document_id))
+
+
+class FakeDocumentReference:
+    __slots__ = ("_client", "_parts")
+
+    def __init__(self, client: "FakeFirestoreClient", parts: tuple):
+        self._client = client
+        self._parts = parts
+
+    def __eq__(self, other):
+        return isinstance(other, FakeDocumentReference) and other._parts == self._parts
+
+    def __hash__(self):
+        return hash(self._parts)
+
+    def __repr__(self):
+        return f"FakeDocumentReference({self.path!r})"
+
+    @property
+    def id(self) -> str:
+        return self._parts[-1]
+
+    @property
+    def path(self) -> str:
+        return "/".join(self._parts)
+
+    @property
+    def parent(self) -> FakeCollectionReference:
+        return FakeCollectionReference(self._client, self._parts[:-1])
+
+    def collection(self, collection_id: str) -> FakeCollectionReference:
+        return FakeCollectionReference(self._client, self._parts + _split_path(collection_id))
+
+    def get(self, field_paths=None, transaction=None) -> FakeDocumentSnapshot:
+        self._client._rpc()
+        data = self._client._read(self._parts)
+        if data is not None and field_paths is not None:
+            data = _project(data, field_paths)
+        return FakeDocumentSnapshot(self, data)
+
+    def set(self, document_data: dict, merge: bool = False):
+        self._client._rpc()
+        self._client._write(self._parts, deepcopy(document_data), merge=merge)
+
+    def update(self, field_updates: dict):
+        self._client._rpc()
+        current = self._client._read(self._parts)
+        if current is None:
+            raise KeyError(f"No document to update: {self.path}")
+        updated = deepcopy(current)
+        for field_path, value in field_updates.items():
+            target = updated
+            parts = field_path.split(".")
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = deepcopy(value)
+        self._client._write(self._parts, updated)
+
+    def delete(self):
+        self._client._rpc()
+        self._client._delete(self._parts)
+
+
+class FakeFirestoreClient:
+    """
+    Thread-safe in-memory Firestore. ``latency_seconds`` is slept once per RPC
+    (a query page, a document get, a ``get_all`` batch, a count or a write).
+    """
+
+    def __init__(self, latency_seconds: float = 0.0):
+        self.latency_seconds = latency_seconds
+        self.rpc_count = 0
+        self._collections: dict[tuple, dict[str, dict]] = {}
+        self._groups: dict[str, list[tuple]] = {}
+        self._lock = threading.Lock()
+        self._version = 0
+        self._sort_cache: dict = {}
+
+    # ------------------------------------------------------------------ public API
+    def collection(self, *collection_path) -> FakeCollectionReference:
+        return FakeCollectionReference(self, _split_path(collection_path))
+
+    def document(self, *document_path) -> FakeDocumentReference:
+        return FakeDocumentReference(self, _split_path(document_path))
+
+    def collection_group(self, collection_id: str) -> FakeQuery:
+        return FakeQuery(self, (collection_id,), all_descendants=True)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        references = list(references)
+        self._rpc()
+        for ref in references:
+            data = self._read(ref._parts)
+            if data is not None and field_paths is not None:
+                data = _project(data, field_paths)
+            yield FakeDocumentSnapshot(ref, data)
+
+    def load(self, path: str, data: dict):
+        """Store ``data`` at document ``path`` without latency (dataset setup)."""
+        self._write(_split_path(path), data)
+
+    def document_count(self) -> int:
+        return sum(len(docs) for docs in self._collections.values())
+
+    # ------------------------------------------------------------------ internals
+    def _rpc(self):
+        with self._lock:
+            self.rpc_count += 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+    def _read(self, parts: tuple) -> dict | None:
+        return self._collections.get(parts[:-1], {}).get(parts[-1])
+
+    def _write(self, parts: tuple, data: dict, merge: bool = False):
+        if len(parts) % 2:
+            raise ValueError(f"Not a document path: {'/'.join(parts)}")
+        with self._lock:
+            docs = self._collections.get(parts[:-1])
+            if docs is None:
+                docs = self._collections[parts[:-1]] = {}
+                self._groups.setdefault(parts[-2], []).append(parts[:-1])
+            if merge and parts[-1] in docs:
+                docs[parts[-1]] = {**docs[parts[-1]], **data}
+            else:
+                docs[parts[-1]] = data
+            self._version += 1
+
+    def _delete(self, parts: tuple):
+        with self._lock:
+            self._collections.get(parts[:-1], {}).pop(parts[-1], None)
+            self._version += 1
+
+    def _iter_documents(self, parts: tuple, all_descendants: bool):
+        collections = self._groups.get(parts[0], []) if all_descendants else [parts]
+        for collection_parts in list(collections):
+            for doc_id, data in list(self._collections.get(collection_parts, {}).items()):
+                yield FakeDocumentReference(self, collection_parts + (doc_id,)), data
+
+    def _cached_sort(self, query: FakeQuery, orders: tuple) -> tuple[list, list]:
+        # Only collection groups and top-level collections are worth caching: they are
+        # re-sorted for every page of a paginated scan, per-user subcollections are tiny.
+        if not (query._all_descendants or len(query._parts) == 1):
+            return query._sorted(orders)
+        cache_key = query._cache_key(orders)
+        version = self._version
+        cached = self._sort_cache.get(cache_key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        result = query._sorted(orders)
+        with self._lock:
+            self._sort_cache[cache_key] = (version, result)
+        return result
@@ -0,0 +1,180 @@
+"""
+Offline stand-ins for Google Cloud Storage and Redivis used by the benchmarks.
+
+``FakeStorageClient`` replaces ``google.cloud.storage.Client`` inside
+``shared.storage_services`` so ``StorageServices`` runs unchanged (JSON
+serialization included) against an in-memory bucket. ``BenchmarkRedivisServices``
+mirrors the ``RedivisServices`` methods the pipeline calls and only records them.
+"""
+import io
+import threading
+
+
+class FakeBlob:
+    def __init__(self, bucket: "FakeBucket", name: str):
+        self.bucket = bucket
+        self.name = name
+        self.content_type = None
+        self.metadata = None
+        self.chunk_size = None
+
+    @property
+    def size(self) -> int | None:
+        data = self.bucket._objects.get(self.name)
+        return len(data) if data is not None else None
+
+    def exists(self) -> bool:
+        return self.name in self.bucket._objects
+
+    def reload(self):
+        meta = self.bucket._metadata.get(self.name)
+        if meta is None:
+            raise FileNotFoundError(self.name)
+        self.content_type, self.metadata = meta["content_type"], dict(meta["metadata"] or {}) or None
+
+    def patch(self):
+        with self.bucket._lock:
+            self.bucket._metadata.setdefault(self.name, {"content_type": self.content_type})["metadata"] = (
+                dict(self.metadata or {})
+            )
+
+    def upload_from_string(self, data, content_type: str | None = None, retry=None):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with self.bucket._lock:
+            self.bucket._objects[self.name] = bytes(data)
+            self.bucket._metadata[self.name] = {
+                "content_type": content_type or self.content_type,
+                "metadata": dict(self.metadata or {}),
+            }
+            self.bucket.bytes_uploaded += len(data)
+
+    def upload_from_file(self, file_obj, size: int | None = None, content_type: str | None = None, retry=None):
+        data = file_obj.read() if size is None else file_obj.read(size)
+        self.upload_from_string(data, content_type=content_type)
+
+    def open(self, mode: str = "wb", chunk_size: int | None = None, content_type: str | None = None, retry=None):
+        if mode == "rb":
+            return io.BytesIO(self.download_as_bytes())
+        if mode != "wb":
+            raise NotImplementedError(mode)
+        return _FakeBlobWriter(self, content_type)
+
+    def download_as_bytes(self) -> bytes:
+        data = self.bucket._objects.get(self.name)
+        if data is None:
+            raise FileNotFoundError(self.name)
+        return data
+
+    def download_to_file(self, file_obj):
+        file_obj.write(self.download_as_bytes())
+
+    def download_as_text(self) -> str:
+        return self.download_as_bytes().decode("utf-8")
+
+    def delete(self):
+        with self.bucket._lock:
+            self.bucket._objects.pop(self.name, None)
+            self.bucket._metadata.pop(self.name, None)
+
+
+class _FakeBlobWriter(io.BytesIO):
+    """``blob.open("wb")``: the object is stored when the writer is closed."""
+
+    def __init__(self, blob: FakeBlob, content_type: str | None):
+        super().__init__()
+        self._blob = blob
+        self._content_type = content_type
+
+    def close(self):
+        if not self.closed:
+            self._blob.upload_from_string(self.getvalue(), content_type=self._content_type)
+        super().close()
+
+
+class FakeBucket:
+    def __init__(self, name: str):
+        self.name = name
+        self.bytes_uploaded = 0
+        self._objects: dict[str, bytes] = {}
+        self._metadata: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def blob(self, blob_name: str) -> FakeBlob:
+        return FakeBlob(self, blob_name)
+
+    def get_blob(self, blob_name: str) -> FakeBlob | None:
+        if blob_name not in self._objects:
+            return None
+        blob = FakeBlob(self, blob_name)
+        blob.reload()
+        return blob
+
+    def list_blobs(self, prefix: str | None = None, delimiter: str | None = None):
+        return [FakeBlob(self, name) for name in sorted(self._objects) if name.startswith(prefix or "")]
+
+
+class FakeStorageClient:
+    """Drop-in for ``storage.Client``; every instance shares the same in-memory buckets."""
+
+    buckets: dict[str, FakeBucket] = {}
+
+    def __init__(self, credentials=None, project=None):
+        self.credentials = credentials
+
+    def bucket(self, bucket_name: str) -> FakeBucket:
+        return self.buckets.setdefault(bucket_name, FakeBucket(bucket_name))
+
+    def list_blobs(self, bucket_or_name, prefix: str | None = None, delimiter: str | None = None):
+        name = bucket_or_name.name if isinstance(bucket_or_name, FakeBucket) else bucket_or_name
+        return self.bucket(name).list_blobs(prefix=prefix, delimiter=delimiter)
+
+
+class _FakeRedivisTable:
+    def __init__(self, name: str):
+        self.name = name
+
+
+class _FakeRedivisDataset:
+    def __init__(self):
+        self.tables: dict[str, _FakeRedivisTable] = {}
+
+    def list_tables(self) -> list:
+        return list(self.tables.values())
+
+
+class BenchmarkRedivisServices:
+    """Records the calls ``run_data_validation`` makes on ``RedivisServices``."""
+
+    def __init__(self):
+        self.dataset = _FakeRedivisDataset()
+        self.dataset_id = None
+        self.calls: list[str] = []
+        self.upload_to_redivis_log = {
+            'table_counts': 0,
+            'table_deletions': [],
+            'upload_fails': [],
+            'dataset_fails': []
+        }
+
+    def set_dataset(self, dataset_id: str):
+        self.dataset_id = dataset_id
+        self.calls.append("set_dataset")
+
+    def create_dateset_version(self, params: list):
+        self.calls.append("create_dateset_version")
+
+    def save_to_redivis_table(self, file_name: str, upload_merge_strategy: str = 'replace'):
+        table_name = file_name.split("/")[1].split(".")[0]
+        self.dataset.tables.setdefault(table_name, _FakeRedivisTable(table_name))
+        self.calls.append(f"save_to_redivis_table:{table_name}")
+
+    def delete_table(self, table_name: str):
+        self.dataset.tables.pop(table_name, None)
+        self.upload_to_redivis_log['table_deletions'].append(table_name)
+
+    def release_dataset(self, params: dict):
+        self.calls.append("release_dataset")
+
+    def count_tables(self) -> int:
+        return len(self.dataset.tables)
@@ -0,0 +1,229 @@
+"""
+End-to-end throughput benchmark for the validation pipeline, fully offline.
+
+    python -m benchmarks.run_pipeline --users 1000
+    python -m benchmarks.run_pipeline --users 10000 --latency-ms 5 --workers 8 --bulk-trials
+
+Generates a synthetic dataset (see ``benchmarks.synthetic_data``) into an in-memory
+Firestore, then runs ``run_data_validation`` — and with it
+``EntityController.validate_data_from_firestore`` for every site — with GCS and
+Redivis replaced by in-memory fakes. Reports Firestore documents read per second,
+peak RSS and wall time per stage. ``--latency-ms`` adds a fixed delay to every
+Firestore RPC so changes to request counts and concurrency show up in the numbers.
+"""
+import argparse
+import functools
+import json
+import logging
+import resource
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from unittest import mock
+
+import settings
+from benchmarks.fake_firestore import FakeFirestoreClient
+from benchmarks.fake_services import BenchmarkRedivisServices, FakeStorageClient
+from benchmarks.synthetic_data import generate_dataset, survey_questions
+from shared import storage_services, utils
+from shared.table_spool import TableSpool
+from shared.firestore_services import firestore_services
+from validators import core_models, data_validation_pipeline
+from validators.entity_controller import EntityController
+
+# (owner, attribute, stage label) for every step timed by the benchmark.
+TIMED_STAGES = [
+    (EntityController, "process_users", "process_users"),
+    (EntityController, "process_surveys", "process_surveys"),
+    (EntityController, "process_runs", "process_runs"),
+    (EntityController, "process_trials", "process_trials"),
+    (core_models, "validate_runs_trials", "validate_runs_trials"),
+    (EntityController, "process_tasks_variants", "process_tasks_variants"),
+    (EntityController, "process_sites", "process_sites"),
+    (EntityController, "process_cohorts", "process_cohorts"),
+    (EntityController, "process_schools", "process_schools"),
+    (EntityController, "process_classes", "process_classes"),
+    (EntityController, "process_administration", "process_administration"),
+    (EntityController, "get_validated_data", "get_validated_data"),
+    (TableSpool, "write_tables", "spool_write"),
+    (utils, "append_schema_rows_to_validated_data", "append_schema_rows"),
+    (storage_services.StorageServices, "process", "storage_process"),
+]
+
+
+def _max_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS. Child processes (any worker
+    # started along the way) count with the largest of them.
+    rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+              resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+class StageTimer:
+    """Accumulates wall time per stage label; safe for stages run on worker threads."""
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def patch(self, owner, attribute: str, label: str):
+        original = getattr(owner, attribute)
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.seconds[label] += time.perf_counter() - t0
+                    self.calls[label] += 1
+
+        return mock.patch.object(owner, attribute, timed)
+
+
+def build_parameters(site_ids: list, args) -> utils.DatasetParameters:
+    orgs = [
+        utils.Organization(
+            org_id=site_id,
+            is_guest=False,
+            max_fetch_workers=args.workers,
+            is_bulk_trial_fetch=args.bulk_trials,
+            is_activity_index=args.activity_index,
+            filters=utils.Filters(
+                org_filter=utils.OrgFilter(key="districts", operator="array_contains_any", value=[site_id]),
+                date_filter=utils.DateFilter(start_date="2025-01-01", end_date="2025-12-31"),
+            ),
+        )
+        for site_id in site_ids
+    ]
+    return utils.DatasetParameters(
+        dataset_id="benchmark-dataset",
+        is_save_to_storage=not args.no_storage,
+        is_force_uploading_to_redivis=False,
+        send_slack=False,
+        export_format=args.export_format,
+        is_partitioned_output=args.partitioned,
+        # Orgs are validated in this process: spawned org workers would not see the
+        # in-memory fakes, and TIMED_STAGES only patch this process.
+        max_org_workers=1,
+        orgs=orgs,
+    )
+
+
+def run_benchmark(args) -> dict:
+    t0 = time.perf_counter()
+    db = FakeFirestoreClient()
+    dataset = generate_dataset(db, args.users, n_sites=args.sites, runs_per_student=args.runs_per_student,
+                               trials_per_run=args.trials_per_run, seed=args.seed)
+    generate_seconds = time.perf_counter() - t0
+    rss_after_load = _max_rss_mb()
+    db.latency_seconds = args.latency_ms / 1000
+
+    parameters = build_parameters(dataset.site_ids, args)
+    timer = StageTimer()
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch.object(firestore_services, "_admin_db", db))
+        stack.enter_context(mock.patch.object(firestore_services, "_admin_credentials", mock.sentinel.credentials))
+        stack.enter_context(mock.patch.object(storage_services.storage, "Client", FakeStorageClient))
+        stack.enter_context(mock.patch.object(data_validation_pipeline, "RedivisServices", BenchmarkRedivisServices))
+        stack.enter_context(mock.patch.object(core_models, "get_survey_questions",
+                                              return_value=survey_questions()))
+        stack.enter_context(mock.patch.dict(settings.config, {"CORE_DATA_BUCKET_NAME": "benchmark-bucket"}))
+        for owner, attribute, label in TIMED_STAGES:
+            stack.enter_context(timer.patch(owner, attribute, label))
+
+        run_t0 = time.perf_counter()
+        body, status = data_validation_pipeline.run_data_validation(parameters)
+        elapsed = time.perf_counter() - run_t0
+
+    usage = firestore_services.usage.summary()
+    stats = json.loads(body)
+    stats = stats.get("logs", stats).get("total_validation_stats", {})
+    return {
+        "status": status,
+        "users": args.users,
+        "documents_in_store": dataset.counts["documents"],
+        "generated": dataset.counts,
+        "generate_seconds": round(generate_seconds, 3),
+        "elapsed_seconds": round(elapsed, 3),
+        "firestore_docs_read": usage["docs"],
+        "firestore_rpcs": db.rpc_count,
+        "docs_per_second": round(usage["docs"] / elapsed, 1) if elapsed else None,
+        "rss_after_load_mb": round(rss_after_load, 1),
+        "peak_rss_mb": round(_max_rss_mb(), 1),
+        "stages": {
+            label: {"seconds": round(timer.seconds[label], 3), "calls": timer.calls[label]}
+            for _, _, label in TIMED_STAGES if timer.calls[label]
+        },
+        "validation": {
+            "users": stats.get("users"),
+            "runs": stats.get("runs"),
+            "trials": stats.get("trials"),
+            "survey_responses": stats.get("survey_responses"),
+            "invalid_data_count": stats.get("invalid_data_count"),
+        },
+        "options": {
+            "latency_ms": args.latency_ms,
+            "workers": args.workers,
+            "bulk_trials": args.bulk_trials,
+            "activity_index": args.activity_index,
+            "save_to_storage": not args.no_storage,
+            "export_format": args.export_format,
+            "partitioned": args.partitioned,
+        },
+    }
+
+
+def format_report(result: dict) -> str:
+    lines = [
+        f"users={result['users']} documents={result['documents_in_store']} "
+        f"(generated in {result['generate_seconds']}s)",
+        f"elapsed={result['elapsed_seconds']}s docs_read={result['firestore_docs_read']} "
+        f"rpcs={result['firestore_rpcs']} docs/sec={result['docs_per_second']}",
+        f"rss_after_load={result['rss_after_load_mb']}MB peak_rss={result['peak_rss_mb']}MB",
+        "stages (wall time; site/cohort/school/class/administration stages overlap):",
+    ]
+    for label, stage in result["stages"].items():
+        lines.append(f"  {label:<24} {stage['seconds']:>9.3f}s  x{stage['calls']}")
+    lines.append(f"validation: {json.dumps(result['validation'])}")
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000, help="Total synthetic users (default 1000).")
+    parser.add_argument("--sites", type=int, default=1, help="Sites (orgs) the users are spread over.")
+    parser.add_argument("--runs-per-student", type=int, default=4)
+    parser.add_argument("--trials-per-run", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated latency per Firestore RPC.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Organization.max_fetch_workers (default: settings MAX_FETCH_WORKERS).")
+    parser.add_argument("--bulk-trials", action="store_true", help="Set Organization.is_bulk_trial_fetch.")
+    parser.add_argument("--activity-index", action="store_true", help="Set Organization.is_activity_index.")
+    parser.add_argument("--no-storage", action="store_true", help="Skip the GCS/Redivis upload stage.")
+    parser.add_argument("--export-format", choices=["json", "ndjson.gz", "parquet"], default="json",
+                        help="DatasetParameters.export_format for the exported tables.")
+    parser.add_argument("--partitioned", action="store_true", help="Set DatasetParameters.is_partitioned_output.")
+    parser.add_argument("--json", dest="json_path", help="Also write the result as JSON to this path.")
+    parser.add_argument("--log-level", default="WARNING")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), force=True)
+    result = run_benchmark(args)
+    print(format_report(result))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    return 0 if result["status"] == 200 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,355 @@
+"""
+Deterministic synthetic LEVANTE dataset for benchmarks.
+
+``generate_dataset`` writes ``users`` (students, parents and teachers) with their
+``runs`` / ``trials`` and ``surveyResponses``, plus the org documents (districts,
+groups, schools, classes), administrations and tasks/variants they reference, into a
+``FakeFirestoreClient``. Survey documents cover every shape ``classify_survey_doc``
+knows: legacy ``data.surveyResponses``, legacy ``general``/``specific``, run-like
+``child-survey`` docs with a ``trials`` subcollection, and ``pageNo`` draft markers.
+
+A small share of the data is deliberately invalid (fast reaction times, missing
+birth months) so the invalid-row paths are exercised too.
+"""
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+TASKS = {
+    "egma-math": ["egma-math-v1", "egma-math-v2"],
+    "matrix-reasoning": ["matrix-reasoning-v1"],
+    "mental-rotation": ["mental-rotation-v1"],
+    "hearts-and-flowers": ["hearts-and-flowers-v1", "hearts-and-flowers-v2"],
+    "memory-game": ["memory-game-v1"],
+    "same-different-selection": ["same-different-selection-v1"],
+    "trog": ["trog-v1"],
+    "vocab": ["vocab-v1"],
+}
+
+SURVEY_QUESTIONS_PER_SECTION = 12
+RUN_LIKE_QUESTIONS = 10
+
+PERIOD_START = datetime(2025, 1, 6, tzinfo=timezone.utc)
+PERIOD_DAYS = 300
+
+
+@dataclass
+class SyntheticDataset:
+    """What was generated, for building the run parameters and reporting."""
+    site_ids: list = field(default_factory=list)
+    cohort_ids: list = field(default_factory=list)
+    counts: dict = field(default_factory=dict)
+
+
+def survey_questions() -> dict:
+    """Question metadata matching the generated survey responses (shape of ``get_survey_questions``)."""
+    questions = {}
+    for survey_type in ("caregiver", "teacher"):
+        for section in ("general", "specific"):
+            for i in range(1, SURVEY_QUESTIONS_PER_SECTION + 1):
+                questions[f"{survey_type}_{section}_q{i:02d}"] = {
+                    "survey_section": section,
+                    "question_survey_type": survey_type,
+                    "response_type": "numeric",
+                }
+    for i in range(1, RUN_LIKE_QUESTIONS + 1):
+        questions[f"child-survey-q{i:02d}.mp3"] = {
+            "survey_section": "general",
+            "question_survey_type": "child",
+            "response_type": "numeric",
+        }
+    return questions
+
+
+def _timestamp(rng: random.Random) -> datetime:
+    return PERIOD_START + timedelta(seconds=rng.randrange(PERIOD_DAYS * 86400))
+
+
+def _org_map(ids: list) -> dict:
+    return {"current": list(ids), "all": list(ids)}
+
+
+def _responses(rng: random.Random, prefix: str, at: datetime, *, response_objects: bool) -> dict:
+    responses = {}
+    for i in range(1, SURVEY_QUESTIONS_PER_SECTION + 1):
+        value = rng.randint(1, 5)
+        if response_objects:
+            responses[f"{prefix}_q{i:02d}"] = {
+                "responseValue": value,
+                "responseTime": at + timedelta(seconds=20 * i),
+            }
+        else:
+            responses[f"{prefix}_q{i:02d}"] = value
+    return responses
+
+
+class _Generator:
+    def __init__(self, db, rng: random.Random, *, runs_per_student: int, trials_per_run: int):
+        self.db = db
+        self.rng = rng
+        self.runs_per_student = runs_per_student
+        self.trials_per_run = trials_per_run
+        self.counts = {"users": 0, "runs": 0, "trials": 0, "surveyResponses": 0, "survey_trials": 0}
+
+    def org_documents(self, site_ids, cohort_ids, schools, classes, administration_ids):
+        created = datetime(2024, 8, 1, tzinfo=timezone.utc)
+        for site_id in site_ids:
+            self.db.load(f"districts/{site_id}", {
+                "name": f"Site {site_id}", "abbreviation": site_id.upper(),
+                "createdAt": created, "updatedAt": created,
+            })
+        for cohort_id in cohort_ids:
+            self.db.load(f"groups/{cohort_id}", {
+                "name": f"Cohort {cohort_id}", "abbreviation": cohort_id.upper(),
+                "tags": ["benchmark"], "createdAt": created, "lastUpdated": created,
+            })
+        for school_id, site_id in schools.items():
+            self.db.load(f"schools/{school_id}", {
+                "name": f"School {school_id}", "abbreviation": school_id.upper(), "districtId": site_id,
+                "createdAt": created, "updatedAt": created,
+            })
+        for class_id, (school_id, site_id) in classes.items():
+            self.db.load(f"classes/{class_id}", {
+                "name": f"Class {class_id}", "schoolId": school_id, "districtId": site_id,
+                "grade": self.rng.randint(1, 8), "createdAt": created, "updatedAt": created,
+            })
+        for administration_id, site_id in administration_ids.items():
+            self.db.load(f"administrations/{administration_id}", {
+                "name": f"Administration {administration_id}", "publicName": administration_id,
+                "siteId": site_id, "sequential": True, "createdBy": "benchmark",
+                "createdAt": created, "updatedAt": created, "dateCreated": created,
+                "dateOpened": PERIOD_START, "dateClosed": PERIOD_START + timedelta(days=PERIOD_DAYS),
+            })
+        for task_id, variant_ids in TASKS.items():
+            self.db.load(f"tasks/{task_id}", {
+                "name": task_id.replace("-", " ").title(), "description": f"{task_id} task",
+                "createdAt": created, "lastUpdated": created,
+            })
+            for variant_id in variant_ids:
+                self.db.load(f"tasks/{task_id}/variants/{variant_id}", {
+                    "name": variant_id, "createdAt": created, "lastUpdated": created,
+                    "params": {"language": "en-US", "numOfPracticeTrials": 2, "adaptive": False,
+                               "maxTime": 600, "corpus": f"{task_id}-corpus"},
+                })
+
+    def user(self, user_id: str, user_type: str, *, site_id, cohort_id, school_id, class_id,
+             administration_ids, parent_ids=(), teacher_ids=(), child_ids=()):
+        rng = self.rng
+        assigned = {a: _timestamp(rng) for a in administration_ids}
+        started = {a: t + timedelta(days=1) for a, t in assigned.items() if rng.random() < 0.8}
+        completed = {a: t + timedelta(days=2) for a, t in started.items() if rng.random() < 0.7}
+        doc = {
+            "userType": user_type,
+            "assessmentPid": f"pid-{user_id}",
+            "email": f"{user_id}@example.org",
+            "emailVerified": True,
+            "createdAt": PERIOD_START - timedelta(days=30),
+            "lastUpdated": max(assigned.values()),
+            "districts": _org_map([site_id]),
+            "groups": _org_map([cohort_id]),
+            "schools": _org_map([school_id] if school_id else []),
+            "classes": _org_map([class_id] if class_id else []),
+            "assignmentsAssigned": assigned,
+            "assignmentsStarted": started,
+            "assignmentsCompleted": completed,
+        }
+        if user_type == "student":
+            doc.update({
+                "birthYear": rng.randint(2013, 2020),
+                "birthMonth": rng.randint(1, 12) if rng.random() > 0.01 else None,
+                "grade": rng.randint(1, 8),
+                "sex": rng.choice(["male", "female"]),
+                "parentIds": list(parent_ids),
+                "teacherIds": list(teacher_ids),
+            })
+        elif user_type == "parent":
+            doc["childIds"] = list(child_ids)
+        self.db.load(f"users/{user_id}", doc)
+        self.counts["users"] += 1
+        return doc
+
+    def runs(self, user_id: str, administration_ids: list):
+        rng = self.rng
+        for r in range(self.runs_per_student):
+            task_id = rng.choice(list(TASKS))
+            run_id = f"{user_id}-run{r:03d}"
+            started = _timestamp(rng)
+            num_correct = 0
+            for t in range(self.trials_per_run):
+                correct = rng.random() < 0.7
+                num_correct += correct
+                rt = rng.randint(400, 4000) if rng.random() > 0.02 else rng.randint(10, 90)
+                self.db.load(f"users/{user_id}/runs/{run_id}/trials/t{t:04d}", {
+                    "assessment_stage": "test_response",
+                    "trial_index": t,
+                    "item": f"{task_id}-item-{rng.randint(1, 200)}",
+                    "answer": str(rng.randint(0, 3)),
+                    "response": str(rng.randint(0, 3)),
+                    "correct": correct,
+                    "rt": rt,
+                    "responseLocation": rng.randint(0, 3),
+                    "distractors": [str(d) for d in range(3)],
+                    "corpusId": f"{task_id}-corpus",
+                    "inputType": "touch",
+                    "isPracticeTrial": False,
+                    "time_elapsed": 1000 * (t + 1),
+                    "serverTimestamp": started + timedelta(seconds=5 * t),
+                })
+                self.counts["trials"] += 1
+            self.db.load(f"users/{user_id}/runs/{run_id}", {
+                "taskId": task_id,
+                "variantId": rng.choice(TASKS[task_id]),
+                "assignmentId": rng.choice(administration_ids),
+                "taskVersion": "1.0.0",
+                "timeStarted": started,
+                "timeFinished": started + timedelta(minutes=10),
+                "completed": True,
+                "reliable": rng.random() > 0.1,
+                "bestRun": True,
+                "scores": {"raw": {"composite": {"test": {
+                    "numAttempted": self.trials_per_run,
+                    "numCorrect": num_correct,
+                    "thetaEstimate": round(rng.gauss(0, 1), 3),
+                    "thetaSE": round(rng.uniform(0.2, 0.6), 3),
+                }}}},
+            })
+            self.counts["runs"] += 1
+
+    def legacy_general_specific(self, user_id: str, survey_type: str, administration_id: str,
+                                scope_field: str, scope_ids: list):
+        at = _timestamp(self.rng)
+        self.db.load(f"users/{user_id}/surveyResponses/{administration_id}", {
+            "administrationId": administration_id,
+            "createdAt": at,
+            "updatedAt": at + timedelta(minutes=15),
+            "general": {
+                "isComplete": True,
+                "responses": _responses(self.rng, f"{survey_type}_general", at, response_objects=True),
+            },
+            "specific": [
+                {
+                    scope_field: scope_id,
+                    "isComplete": self.rng.random() > 0.2,
+                    "responses": _responses(self.rng, f"{survey_type}_specific", at, response_objects=True),
+                }
+                for scope_id in scope_ids
+            ],
+        })
+        self.counts["surveyResponses"] += 1
+
+    def legacy_data(self, user_id: str, survey_type: str, administration_id: str):
+        at = _timestamp(self.rng)
+        self.db.load(f"users/{user_id}/surveyResponses/{administration_id}-legacy", {
+            "administrationId": administration_id,
+            "createdAt": at,
+            "isComplete": True,
+            "data": {"surveyResponses": _responses(self.rng, f"{survey_type}_general", at, response_objects=False)},
+        })
+        self.counts["surveyResponses"] += 1
+
+    def page_marker(self, user_id: str, administration_id: str):
+        at = _timestamp(self.rng)
+        self.db.load(f"users/{user_id}/surveyResponses/{administration_id}-draft", {
+            "administrationId": administration_id, "pageNo": self.rng.randint(1, 4),
+            "createdAt": at, "updatedAt": at,
+        })
+        self.counts["surveyResponses"] += 1
+
+    def run_like_survey(self, user_id: str, administration_id: str):
+        started = _timestamp(self.rng)
+        doc_path = f"users/{user_id}/surveyResponses/{administration_id}-child-survey"
+        for i in range(1, RUN_LIKE_QUESTIONS + 1):
+            self.db.load(f"{doc_path}/trials/t{i:03d}", {
+                "assessment_stage": "test_response",
+                "audioFile": f"child-survey-q{i:02d}.mp3",
+                "responseLocation": self.rng.randint(0, 4),
+                "answer": "agree",
+                "isPracticeTrial": False,
+                "serverTimestamp": started + timedelta(seconds=15 * i),
+            })
+            self.counts["survey_trials"] += 1
+        self.db.load(f"{doc_path}/trials/t000", {
+            "assessment_stage": "instructions", "isPracticeTrial": False, "serverTimestamp": started,
+        })
+        self.db.load(doc_path, {
+            "taskId": "child-survey",
+            "assignmentId": administration_id,
+            "timeStarted": started,
+            "timeFinished": started + timedelta(minutes=5),
+            "completed": True,
+        })
+        self.counts["surveyResponses"] += 1
+
+
+def generate_dataset(db, n_users: int, *, n_sites: int = 1, runs_per_student: int = 4,
+                     trials_per_run: int = 30, seed: int = 0) -> SyntheticDataset:
+    """
+    Load ``n_users`` users spread over ``n_sites`` sites into ``db``.
+
+    Users come in families: one student with one parent, and one teacher per 20 students
+    (about 48% students, 48% parents, 4% teachers). Each student has ``runs_per_student``
+    runs of ``trials_per_run`` trials; a quarter of them also have a run-like child survey.
+    Parents answer legacy general/specific surveys about their child (some in the older
+    ``data`` shape, some with a ``pageNo`` draft left behind); teachers answer them about
+    their class.
+    """
+    rng = random.Random(seed)
+    gen = _Generator(db, rng, runs_per_student=runs_per_student, trials_per_run=trials_per_run)
+    dataset = SyntheticDataset()
+
+    site_ids = [f"site{s}" for s in range(n_sites)]
+    cohort_ids = [f"cohort{s}" for s in range(n_sites)]
+    schools, classes, administrations = {}, {}, {}
+    per_site = max(1, n_users // n_sites)
+
+    for s, site_id in enumerate(site_ids):
+        site_admins = [f"{site_id}-admin{a}" for a in range(3)]
+        for a in site_admins:
+            administrations[a] = site_id
+        n_families = max(1, per_site * 24 // 50)
+        n_teachers = max(1, per_site - 2 * n_families)
+        teacher_ids = [f"{site_id}-teacher{t:05d}" for t in range(n_teachers)]
+        teacher_classes = {}
+        for t, teacher_id in enumerate(teacher_ids):
+            school_id = f"{site_id}-school{t // 4:04d}"
+            class_id = f"{site_id}-class{t:05d}"
+            schools[school_id] = site_id
+            classes[class_id] = (school_id, site_id)
+            teacher_classes[teacher_id] = (school_id, class_id)
+
+        class_students = {}
+        for f in range(n_families):
+            student_id = f"{site_id}-student{f:06d}"
+            parent_id = f"{site_id}-parent{f:06d}"
+            teacher_id = teacher_ids[f % n_teachers]
+            school_id, class_id = teacher_classes[teacher_id]
+            class_students.setdefault(class_id, []).append(student_id)
+            admins = rng.sample(site_admins, 2)
+            common = dict(site_id=site_id, cohort_id=cohort_ids[s], school_id=school_id, class_id=class_id,
+                          administration_ids=admins)
+
+            gen.user(student_id, "student", parent_ids=[parent_id], teacher_ids=[teacher_id], **common)
+            gen.runs(student_id, admins)
+            if rng.random() < 0.25:
+                gen.run_like_survey(student_id, admins[0])
+
+            gen.user(parent_id, "parent", child_ids=[student_id], **common)
+            if rng.random() < 0.15:
+                gen.legacy_data(parent_id, "caregiver", admins[0])
+            else:
+                gen.legacy_general_specific(parent_id, "caregiver", admins[0], "childId", [student_id])
+            if rng.random() < 0.2:
+                gen.page_marker(parent_id, admins[1])
+
+        for teacher_id in teacher_ids:
+            school_id, class_id = teacher_classes[teacher_id]
+            admins = rng.sample(site_admins, 2)
+            gen.user(teacher_id, "teacher", site_id=site_id, cohort_id=cohort_ids[s], school_id=school_id,
+                     class_id=class_id, administration_ids=admins)
+            gen.legacy_general_specific(teacher_id, "teacher", admins[0], "classId", [class_id])
+
+    gen.org_documents(site_ids, cohort_ids, schools, classes, administrations)
+    dataset.site_ids = site_ids
+    dataset.cohort_ids = cohort_ids
+    dataset.counts = dict(gen.counts, documents=db.document_count())
+    return dataset
@@ -1,4 +1,6 @@
 
+import os
+
 config = {
     'VERSION': '1.9.29',
     'INSTANCE': 'LEVANTE',
@@ -68,4 +70,27 @@ config = {
     'CLOUD_RUN_JOB_TASK_TIMEOUT_SECONDS': 86400,
     # Thin HTTP service that accepts clean JSON + API-Key and starts the job (202).
     'CLOUD_RUN_TRIGGER_SERVICE_NAME': 'data-validator-trigger',
+    # Concurrent Firestore reads per org (runs per user, trials per run, surveys per
+    # user). Organization.max_fetch_workers overrides it; 1 = fetch serially.
+    'MAX_FETCH_WORKERS': 8,
+    # Incremental exports re-read activity from this long before the stored watermark,
+    # so writes that landed around the previous run's start are not missed.
+    'INCREMENTAL_OVERLAP_MINUTES': 60,
+    # In-memory buffer for exported tables before they spill to local temp files.
+    'SPOOL_MEMORY_BUDGET_BYTES': 64 * 1024 * 1024,
+    # Directory of the spool files and other temporary export files (env SPOOL_DIR).
+    # Empty → the system temp directory, which on Cloud Run is in memory and counts
+    # against the job's --memory; the deploy workflow mounts an NFS volume for it.
+    'SPOOL_DIR': os.environ.get('SPOOL_DIR', ''),
+    # Exported tables uploaded to GCS concurrently.
+    'GCS_UPLOAD_WORKERS': 4,
+    # Tables larger than this upload resumably in chunks of this size (rounded down to
+    # a multiple of 256 KiB); a failed chunk is retried without restarting the table.
+    'GCS_UPLOAD_CHUNK_SIZE_BYTES': 32 * 1024 * 1024,
+    # Compression codec of exported Parquet files (export_format "parquet").
+    'PARQUET_COMPRESSION': 'snappy',
+    # Directory of the SQLite id -> pseudonym store reused across jobs on a host
+    # (masked orgs). Empty → no store, ids are hashed in memory. The store holds raw
+    # ids next to their pseudonyms unencrypted; only point it at a private, persistent disk.
+    'PSEUDONYM_STORE_DIR': '',
 }
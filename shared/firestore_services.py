@@ -1,8 +1,11 @@
 import json
 import logging
 import random
+import threading
+import time
 import warnings
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from datetime import datetime, timezone
 from itertools import islice
@@ -10,6 +13,7 @@ from itertools import islice
 import pytz
 from google.cloud import firestore
 from google.cloud.firestore_v1.base_query import FieldFilter, Or
+from google.cloud.firestore_v1.field_path import FieldPath
 from google.oauth2 import service_account
 
 import settings
@@ -28,6 +32,12 @@ logging.basicConfig(level=logging.INFO)
 default_start_date = "2024-01-01"
 default_end_date = "2050-01-01"
 
+# Adaptive page sizing for FirestoreServices._paginate: pages grow while they come
+# back full and fast, and shrink when a single page takes longer than the target.
+PAGE_SIZE_MIN = 50
+PAGE_SIZE_MAX = 1000
+PAGE_TARGET_SECONDS = 1.0
+
 
 def stringify_variables(variable):
     if isinstance(variable, (dict, list, tuple, bool, str, float, int)):
@@ -64,6 +74,20 @@ def convert_to_integer(variable):
 
 # Helper function to split the list into chunks of max 30 items
 
+def user_matches_filters(doc_dict: dict, org_filter: utils.OrgFilter | None,
+                         user_filter: utils.UserFilter | None) -> bool:
+    """In-memory equivalent of the org/user filters ``get_users`` applies to its query."""
+    if org_filter is not None and org_filter.operator == "array_contains_any":
+        current = (doc_dict.get(org_filter.key) or {}).get('current') or []
+        if not set(current) & set(org_filter.value):
+            return False
+    if user_filter is not None and user_filter.operator == "starts_with" and user_filter.value:
+        value = doc_dict.get(user_filter.key)
+        if not isinstance(value, str) or not value.startswith(user_filter.value):
+            return False
+    return True
+
+
 def chunked(iterable):
     it = iter(iterable)
     while True:
@@ -73,6 +97,74 @@ def chunked(iterable):
         yield chunk
 
 
+def _is_newer_key_usage(prev_meta: dict, new_meta: dict) -> bool:
+    time_created = new_meta.get("time_created")
+    prev_time = prev_meta.get("time_created")
+    return prev_time is None or bool(time_created and time_created > prev_time)
+
+
+class KeyUsage:
+    """
+    ``{task_id: {key: meta}}`` key-usage map, recorded per document shape.
+
+    Documents of a task mostly share one shape (``utils.document_shape``), so only the
+    first document of each shape is flattened; later ones just compete for the shape's
+    newest ``meta``. ``to_dict`` expands the shapes into the map per-key newest-wins
+    tracking would have built, key order included.
+    """
+
+    def __init__(self):
+        # (task_id, shape) -> [flattened keys, newest meta, position of that document]
+        self._shapes: dict[tuple, list] = {}
+        self._count = 0
+
+    def record(self, task_id, doc: dict, max_depth: int | None, meta: dict) -> None:
+        shape_id = (task_id, utils.document_shape(doc, max_depth))
+        entry = self._shapes.get(shape_id)
+        if entry is None:
+            self._shapes[shape_id] = [tuple(flatten_document(doc, max_depth=max_depth)), meta, self._count]
+        elif _is_newer_key_usage(entry[1], meta):
+            entry[1], entry[2] = meta, self._count
+        self._count += 1
+
+    def merge(self, other: "KeyUsage") -> None:
+        """Fold in the documents ``other`` recorded, as if they were recorded after ours."""
+        for shape_id, (keys, meta, position) in other._shapes.items():
+            entry = self._shapes.get(shape_id)
+            if entry is None:
+                self._shapes[shape_id] = [keys, meta, self._count + position]
+            elif _is_newer_key_usage(entry[1], meta):
+                entry[1], entry[2] = meta, self._count + position
+        self._count += other._count
+
+    def to_dict(self) -> dict:
+        usage = {}
+        entries_by_task = {}
+        for (task_id, _), entry in self._shapes.items():
+            task_dict = usage.setdefault(task_id, {})
+            for key in entry[0]:
+                task_dict.setdefault(key, None)
+            entries_by_task.setdefault(task_id, []).append(entry)
+        for task_id, entries in entries_by_task.items():
+            task_dict = usage[task_id]
+            # A key's newest meta is decided in document order, as it was read.
+            for keys, meta, _ in sorted(entries, key=lambda entry: entry[2]):
+                for key in keys:
+                    if task_dict[key] is None or _is_newer_key_usage(task_dict[key], meta):
+                        task_dict[key] = dict(meta)
+        return usage
+
+
+def merge_key_usage(target: KeyUsage, source: KeyUsage) -> KeyUsage:
+    """
+    Fold a per-user ``KeyUsage`` into ``target`` with the same newest-wins rule used
+    while reading documents. Merging per-user maps in user order gives the same result
+    as tracking into one shared map serially.
+    """
+    target.merge(source)
+    return target
+
+
 # ----------------------------------------------------------------------------
 # surveyResponses schema classification
 # ----------------------------------------------------------------------------
@@ -357,17 +449,191 @@ def apply_survey_deduplication(
             response["survey_id"] = loser_doc_survey_ids[doc_id]
 
 
+def convert_trial_doc(trial_id: str, doc_dict: dict, user_id: str, run_id: str, task_id: str,
+                      trial_key_usage: KeyUsage) -> dict:
+    """Record key usage for one trial document and convert it to the trial row shape."""
+    time_created = doc_dict.get('serverTimestamp', None)
+
+    trial_key_usage.record(task_id, doc_dict, 1, {
+        "user_id": user_id,
+        "run_id": run_id,
+        "trial_id": trial_id,
+        "time_created": time_created,
+    })
+
+    doc_dict.update({
+        'trial_id': trial_id,
+        'user_id': user_id,
+        'run_id': run_id,
+        'task_id': task_id,
+    })
+
+    # Add identifiers to the dictionary
+    if settings.config['INSTANCE'] == 'ROAR':
+        doc_dict.update({
+            # Pop required Firekit attributes
+            'correct': handle_nan(doc_dict.pop('correct', None)),
+            'assessment_stage': handle_nan(doc_dict.pop('assessment_stage', None)),
+            # Pop default jsPsych data attributes
+            'trial_index': handle_nan(doc_dict.pop('trial_index', None)),
+            'trial_type': handle_nan(doc_dict.pop('trial_type', None)),
+            'time_elapsed': handle_nan(doc_dict.pop('time_elapsed', None)),
+        })
+
+        # Ignore keys which we do not want duplicated in trial_attributes
+        ignore_keys = ['trial_id', 'user_id', 'run_id', 'task_id']
+        # Process the remaining doc_dict keys
+        doc_dict['trial_attributes'] = process_doc_dict(doc_dict, ignore_keys, collection='trials')
+        converted_doc_dict = doc_dict
+    else:
+        answer = doc_dict.get(
+            'answer',
+            doc_dict.get('goal', doc_dict.get('sequence', doc_dict.get('word', None)))
+        )
+        item = doc_dict.get('item')
+        distractors = doc_dict.get('distractors')
+        subtask = doc_dict.get('subtask')
+        response = doc_dict.get('response')
+        response_location = doc_dict.get('responseLocation')
+        rt = doc_dict.get('rt')
+        doc_dict.update({
+            # 'corpus_trial_type': stringify_variables(doc_dict.get('corpus_trial_type', '')),
+            'item': stringify_variables(item) if item is not None else None,
+            'distractors': stringify_variables(distractors) if distractors is not None else None,
+            'answer': stringify_variables(answer) if answer is not None else None,
+            'subtask': stringify_variables(subtask) if subtask is not None else None,
+            'response': stringify_variables(response) if response is not None else None,
+            'rt': rt if isinstance(rt, int) else (stringify_variables(rt) if rt is not None else None),
+            'response_location': stringify_variables(response_location) if response_location is not None else None,
+        })
+        converted_doc_dict = process_doc_dict(doc_dict=doc_dict, collection='trials')
+    return converted_doc_dict
+
+
+def _value_storage_bytes(value) -> int:
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, datetime)):
+        return 8
+    if isinstance(value, str):
+        return len(value.encode("utf-8")) + 1
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(str(k).encode("utf-8")) + 1 + _value_storage_bytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(_value_storage_bytes(v) for v in value)
+    path = getattr(value, "path", None)
+    if isinstance(path, str):  # DocumentReference
+        return _document_name_bytes(path)
+    return 16  # GeoPoint and anything else fixed-size
+
+
+def _document_name_bytes(path: str) -> int:
+    return sum(len(segment.encode("utf-8")) + 1 for segment in path.split("/")) + 16
+
+
+def estimate_document_bytes(snapshot) -> int:
+    """
+    Approximate size of a document snapshot using Firestore's storage size rules
+    (document name + field names and values + 32 bytes); 0 for missing documents.
+    """
+    data = getattr(snapshot, "_data", None)
+    if not data:
+        return 0
+    return _document_name_bytes(snapshot.reference.path) + _value_storage_bytes(data) + 32
+
+
+class FirestoreUsage:
+    """
+    Thread-safe read accounting for FirestoreServices, keyed by (org, method).
+
+    ``reads`` estimates billed document reads (a query returning nothing still costs
+    one; ``get_all`` costs one per requested document; a count() costs one per 1000
+    index entries), ``docs`` is documents returned, ``bytes`` their estimated size.
+    """
+    FIELDS = ("rpcs", "reads", "docs", "bytes", "seconds")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+    def record(self, org: str | None, method: str, *, rpcs: int = 1, reads: int = 0, docs: int = 0,
+               bytes_read: int = 0, seconds: float = 0.0):
+        with self._lock:
+            entry = self._stats.setdefault((org or "-", method), dict.fromkeys(self.FIELDS, 0))
+            entry["rpcs"] += rpcs
+            entry["reads"] += reads
+            entry["docs"] += docs
+            entry["bytes"] += bytes_read
+            entry["seconds"] += seconds
+
+    def export(self) -> list:
+        """Raw ``((org, method), counters)`` entries, e.g. to ship a worker process's usage back."""
+        with self._lock:
+            return [(key, dict(entry)) for key, entry in self._stats.items()]
+
+    def merge(self, entries: list):
+        """Add entries from ``export()`` of another instance."""
+        with self._lock:
+            for key, counters in entries:
+                entry = self._stats.setdefault(tuple(key), dict.fromkeys(self.FIELDS, 0))
+                for field in self.FIELDS:
+                    entry[field] += counters[field]
+
+    def summary(self, org: str | None = None) -> dict:
+        """Totals plus a per-method breakdown, for one org or (``org=None``) all of them."""
+        with self._lock:
+            items = [(key, dict(entry)) for key, entry in self._stats.items()
+                     if org is None or key[0] == org]
+
+        def add(target: dict, entry: dict):
+            for field in self.FIELDS:
+                target[field] = target.get(field, 0) + entry[field]
+
+        total, by_method = dict.fromkeys(self.FIELDS, 0), {}
+        for (_org, method), entry in items:
+            add(total, entry)
+            add(by_method.setdefault(method, {}), entry)
+        for entry in (total, *by_method.values()):
+            entry["seconds"] = round(entry["seconds"], 3)
+        return {**total, "by_method": by_method}
+
+
 class FirestoreServices:
     def __init__(self):
         self._admin_db = None
         self._admin_credentials = None
+        self._admin_credentials_info = None
+        # (users|guests, start, end) -> get_activity_index result, shared by every org of a job.
+        self.activity_indexes = {}
+        self.usage = FirestoreUsage()
+        # Org the current reads are attributed to in ``usage`` (set per org by the pipeline).
+        self.current_org = None
+
+    @property
+    def admin_credentials_info(self) -> dict:
+        """The admin service account key, as read from Secret Manager."""
+        if self._admin_credentials_info is None:
+            self._admin_credentials_info = json.loads(
+                secret_service.get_secret_payload(secret_id=settings.config['ADMIN_SERVICE_ACCOUNT_SECRET_ID']))
+        return self._admin_credentials_info
+
+    def set_admin_credentials_info(self, info: dict):
+        """Use ``info`` (e.g. handed over by the parent process) instead of reading the secret."""
+        self._admin_credentials_info = info
+        self._admin_credentials = None
+        self._admin_db = None
 
     @property
     def admin_credentials(self):
         if self._admin_credentials is None:
-            info = json.loads(
-                secret_service.get_secret_payload(secret_id=settings.config['ADMIN_SERVICE_ACCOUNT_SECRET_ID']))
-            self._admin_credentials = service_account.Credentials.from_service_account_info(info)
+            self._admin_credentials = service_account.Credentials.from_service_account_info(
+                self.admin_credentials_info)
         return self._admin_credentials
 
 
@@ -379,6 +645,104 @@ class FirestoreServices:
         return self._admin_db
 
 
+    def _get(self, target, method: str):
+        """``target.get()`` for a query or document reference, recorded in ``usage`` under ``method``."""
+        t0 = time.monotonic()
+        result = target.get()
+        snaps = result if isinstance(result, list) else [result]
+        docs = sum(1 for snap in snaps if snap.exists)
+        self.usage.record(self.current_org, method, reads=max(1, docs), docs=docs,
+                          bytes_read=sum(estimate_document_bytes(snap) for snap in snaps),
+                          seconds=time.monotonic() - t0)
+        return result
+
+    def _get_all(self, refs: list, method: str, field_paths: list | None = None) -> list:
+        """``admin_db.get_all(refs)`` as a list, recorded in ``usage`` under ``method``."""
+        t0 = time.monotonic()
+        snaps = list(self.admin_db.get_all(refs, field_paths=field_paths))
+        self.usage.record(self.current_org, method, reads=len(refs),
+                          docs=sum(1 for snap in snaps if snap.exists),
+                          bytes_read=sum(estimate_document_bytes(snap) for snap in snaps),
+                          seconds=time.monotonic() - t0)
+        return snaps
+
+    def count_query(self, query, method: str = "count_query") -> int | None:
+        """Server-side aggregation count (no documents downloaded); None if unavailable."""
+        try:
+            t0 = time.monotonic()
+            result = query.count(alias="total").get()
+            total = int(result[0][0].value)
+            self.usage.record(self.current_org, method, reads=max(1, -(-total // 1000)),
+                              seconds=time.monotonic() - t0)
+            return total
+        except Exception as e:
+            logging.info(f"count() aggregation unavailable: {e}")
+            return None
+
+    def _paginate(self, base_query, *, method: str, progress: str, chunk_size: int = 100,
+                  with_count: bool = False, raise_errors: bool = False):
+        """
+        Stream ``base_query`` as ``DocumentSnapshot``s using ``limit``/``start_after``
+        cursors, reading each document once.
+
+        - Progress totals come from an aggregation ``count()`` when ``with_count`` is
+          set, otherwise only the page number is logged.
+        - As soon as a full page arrives, the next page is requested in the
+          background so Firestore latency overlaps with the caller's processing.
+        - The page size adapts between PAGE_SIZE_MIN and PAGE_SIZE_MAX: it doubles
+          while full pages return under half of PAGE_TARGET_SECONDS and halves when
+          a page exceeds it (large documents or a loaded backend).
+
+        A failed page read is logged as ``Error in {method}`` and ends the stream,
+        matching the previous per-method loops; with ``raise_errors`` it is re-raised
+        so callers can tell a partial scan from a complete one.
+        """
+
+        def fetch(cursor, size):
+            query = base_query.limit(size)
+            if cursor is not None:
+                query = query.start_after(cursor)
+            t0 = time.monotonic()
+            docs = self._get(query, method)
+            return docs, size, time.monotonic() - t0
+
+        total = self.count_query(base_query, method) if with_count else None
+        page_size = min(max(chunk_size, 1), PAGE_SIZE_MAX)
+        read_ahead = None
+        pending = None
+        current_chunk = 0
+        seen = 0
+        try:
+            docs, size, elapsed = fetch(None, page_size)
+            while docs:
+                current_chunk += 1
+                seen += len(docs)
+                is_full_page = len(docs) >= size
+                if is_full_page:
+                    if elapsed > PAGE_TARGET_SECONDS:
+                        page_size = max(PAGE_SIZE_MIN, page_size // 2)
+                    elif elapsed < PAGE_TARGET_SECONDS / 2:
+                        page_size = min(PAGE_SIZE_MAX, page_size * 2)
+                    if read_ahead is None:
+                        read_ahead = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fs-page")
+                    pending = read_ahead.submit(fetch, docs[-1], page_size)
+
+                progress_total = f" ({seen} of {total} docs)" if total is not None else ""
+                logging.info(f"Setting {progress}... processing chunk {current_chunk}{progress_total}.")
+                yield from docs
+
+                if pending is None:
+                    break
+                docs, size, elapsed = pending.result()
+                pending = None
+        except Exception as e:
+            logging.error(f"Error in {method}: {e}")
+            if raise_errors:
+                raise
+        finally:
+            if read_ahead is not None:
+                read_ahead.shutdown(wait=False, cancel_futures=True)
+
     def set_logs_to_firebase(self, response, dataset_id):
         pst_timezone = pytz.timezone('America/Los_Angeles')
         date_doc_name = datetime.now(pst_timezone).strftime("%Y-%m-%d")
@@ -394,10 +758,71 @@ class FirestoreServices:
         except Exception as e:
             logging.info(f'An error occurred: {e}')
 
+    def get_incremental_watermark(self, dataset_id: str) -> datetime | None:
+        """High-water mark of the last successful incremental export (``logs/{dataset_id}``)."""
+        snap = self._get(self.admin_db.collection('logs').document(dataset_id), 'get_incremental_watermark')
+        if not snap.exists:
+            return None
+        return (snap.to_dict() or {}).get('incremental_watermark')
+
+    def set_incremental_watermark(self, dataset_id: str, watermark: datetime):
+        # Stored as a field on the dataset's log document; the dated log subcollections
+        # underneath it (read by the weekly report) are untouched.
+        self.admin_db.collection('logs').document(dataset_id).set(
+            {'incremental_watermark': watermark}, merge=True)
+        logging.info(f"Incremental watermark for {dataset_id} set to {watermark.isoformat()}.")
+
+    def get_changed_user_ids(self, is_guest: bool, since: datetime, chunk_size=1000) -> set[str]:
+        """
+        Users that own runs started, or survey responses created/updated, at or after ``since``.
+        Used by incremental exports in addition to the users whose own ``lastUpdated`` moved.
+        Scan errors are raised: a partial set would silently drop activity from the export.
+        """
+        collection_name = 'guests' if is_guest else 'users'
+        changed = self._scan_parent_user_ids(
+            self._collection_group_in_range('runs', 'timeStarted', since),
+            collection_name, method="get_changed_user_ids", progress="runs changed since watermark",
+            chunk_size=chunk_size)
+        if not is_guest:
+            for field in ('createdAt', 'updatedAt'):
+                changed |= self._scan_parent_user_ids(
+                    self._collection_group_in_range('surveyResponses', field, since),
+                    collection_name, method="get_changed_user_ids",
+                    progress=f"survey responses changed since watermark ({field})",
+                    chunk_size=chunk_size)
+        logging.info(f"{len(changed)} {collection_name} have runs/surveys changed since {since.isoformat()}.")
+        return changed
+
+    def get_changed_user_ids_by_org(self, orgs: list, since: datetime, chunk_size=1000) -> list[set[str]]:
+        """
+        ``get_changed_user_ids`` for every org of a job, in ``orgs`` order. The project-wide
+        collection-group scans run once per collection (users/guests), not once per org;
+        the changed users' filter fields are then read once and matched to each org's
+        org/user filters.
+        """
+        by_org = [set() for _ in orgs]
+        for is_guest in dict.fromkeys(org.is_guest for org in orgs):
+            collection_name = 'guests' if is_guest else 'users'
+            changed = sorted(self.get_changed_user_ids(is_guest=is_guest, since=since, chunk_size=chunk_size))
+            indexed_orgs = [(index, org) for index, org in enumerate(orgs) if org.is_guest == is_guest]
+            field_paths = sorted({f.key for _, org in indexed_orgs
+                                  for f in (org.filters.org_filter, org.filters.user_filter) if f is not None})
+            col = self.admin_db.collection(collection_name)
+            for i in range(0, len(changed), chunk_size):
+                refs = [col.document(uid) for uid in changed[i:i + chunk_size]]
+                for snap in self._get_all(refs, "get_changed_user_ids", field_paths=field_paths or None):
+                    if not snap.exists:
+                        continue
+                    doc_dict = snap.to_dict() or {}
+                    for index, org in indexed_orgs:
+                        if user_matches_filters(doc_dict, org.filters.org_filter, org.filters.user_filter):
+                            by_org[index].add(snap.id)
+        return by_org
+
     def get_district_name(self, district_id: str) -> str | None:
         """Human-readable name from `districts/{district_id}` (site == district)."""
         try:
-            doc = self.admin_db.collection("districts").document(district_id).get()
+            doc = self._get(self.admin_db.collection("districts").document(district_id), "get_district_name")
             if not doc.exists:
                 return None
             return (doc.to_dict() or {}).get("name")
@@ -418,7 +843,7 @@ class FirestoreServices:
             col = self.admin_db.collection("districts")
             for field in ("name", "normalizedName"):
                 docs = list(
-                    col.where(filter=FieldFilter(field, "==", name)).limit(2).get()
+                    self._get(col.where(filter=FieldFilter(field, "==", name)).limit(2), "find_district_id_by_name")
                 )
                 if len(docs) == 1:
                     return docs[0].id
@@ -434,7 +859,7 @@ class FirestoreServices:
             logging.error("find_district_id_by_name(%r): %s", name, e)
             return None
 
-    def get_org_by_org_id_list(self, org_name: str, org_id_list: list):
+    def get_org_by_org_id_list(self, org_name: str, org_id_list: list, chunk_size: int = 100):
         result = []
         if org_name == "site":
             org_in_firebase = "districts"
@@ -447,10 +872,16 @@ class FirestoreServices:
         else:
             return
         try:
-            for org_id in org_id_list:
-                doc_ref = self.admin_db.collection(org_in_firebase).document(org_id)
-                doc = doc_ref.get()
-                if doc.exists:
+            col = self.admin_db.collection(org_in_firebase)
+            for i in range(0, len(org_id_list), chunk_size):
+                chunk = org_id_list[i:i + chunk_size]
+                # get_all returns snapshots in arbitrary order; keep the order of org_id_list.
+                refs = [col.document(org_id) for org_id in chunk]
+                snaps = {snap.id: snap for snap in self._get_all(refs, "get_org_by_org_id_list")}
+                for org_id in chunk:
+                    doc = snaps.get(org_id)
+                    if doc is None or not doc.exists:
+                        continue
                     doc_dict = doc.to_dict()
 
                     doc_dict.update({
@@ -458,7 +889,7 @@ class FirestoreServices:
                         f'{org_name}_name': doc_dict.get('name', None),
                         f'{org_name}_abbreviation': doc_dict.get('abbreviation', None),
                     })
-                    converted_doc_dict = process_doc_dict(doc_dict=doc_dict)
+                    converted_doc_dict = process_doc_dict(doc_dict=doc_dict, collection=org_in_firebase)
                     result.append(converted_doc_dict)
 
         except Exception as e:
@@ -466,74 +897,45 @@ class FirestoreServices:
         return result
 
     def get_tasks(self, task_filter: list, chunk_size=100):
-        last_doc = None
+        task_filter = set(task_filter or ())
         base_query = self.admin_db.collection('tasks')
-        total_docs = base_query.get()
-        total_chunks = len(total_docs) // chunk_size + (len(total_docs) % chunk_size > 0)
-        current_chunk = 0
-
-        while True:
-            try:
-                query = base_query.limit(chunk_size)
-                if last_doc:
-                    query = query.start_after(last_doc)
-                docs = query.get()
-                if not docs:
-                    break
-
-                current_chunk += 1
-                logging.info(f"Setting tasks... processing chunk {current_chunk} of {total_chunks} chunks.")
-                for doc in docs:
+        try:
+            for doc in self._paginate(base_query, method="get_tasks", progress="tasks",
+                                      chunk_size=chunk_size, with_count=True):
+                if not task_filter or doc.id in task_filter:
                     doc_dict = doc.to_dict()  # Convert the document to a dictionary
-                    if not task_filter or doc.id in task_filter:
-                        doc_dict.update({
-                            'task_id': doc.id,
-                            'task_name': doc_dict.get('name', None),
-                        })
-                        converted_doc_dict = promote_last_updated_to_updated_at(
-                            process_doc_dict(doc_dict=doc_dict),
-                        )
-                        yield converted_doc_dict
-                last_doc = docs[-1]
-            except Exception as e:
-                logging.error(f"Error in get_tasks: {e}")
-                break
+                    doc_dict.update({
+                        'task_id': doc.id,
+                        'task_name': doc_dict.get('name', None),
+                    })
+                    converted_doc_dict = promote_last_updated_to_updated_at(
+                        process_doc_dict(doc_dict=doc_dict, collection='tasks'),
+                    )
+                    yield converted_doc_dict
+        except Exception as e:
+            logging.error(f"Error in get_tasks: {e}")
 
     def get_variants(self, task_id: str, variant_filter: list, chunk_size=100):
-        last_doc = None
+        variant_filter = set(variant_filter or ())
         base_query = self.admin_db.collection('tasks').document(task_id).collection('variants')
-        total_docs = base_query.get()
-        total_chunks = len(total_docs) // chunk_size + (len(total_docs) % chunk_size > 0)
-        current_chunk = 0
-        while True:
-            try:
-                query = base_query.limit(chunk_size)
-                if last_doc:
-                    query = query.start_after(last_doc)
-                docs = query.get()
-                if not docs:
-                    break
-                current_chunk += 1
-                logging.info(f"Setting variants... processing chunk {current_chunk} of {total_chunks} "
-                             f"chunks for task {task_id}.")
-                for doc in docs:
+        try:
+            for doc in self._paginate(base_query, method="get_variants",
+                                      progress=f"variants for task {task_id}", chunk_size=chunk_size):
+                if not variant_filter or doc.id in variant_filter:
                     doc_dict = doc.to_dict()
                     param_dict = doc_dict.get('params', {})
-                    if not variant_filter or doc.id in variant_filter:
-                        doc_dict.update(param_dict)
-                        doc_dict.update({
-                            'variant_id': doc.id,
-                            'task_id': task_id,
-                            'variant_name': doc_dict.get('name', None),
-                        })
-                        converted_doc_dict = promote_last_updated_to_updated_at(
-                            process_doc_dict(doc_dict=doc_dict),
-                        )
-                        yield converted_doc_dict
-                last_doc = docs[-1]
-            except Exception as e:
-                logging.error(f"Error in get_variants: {e}")
-                break
+                    doc_dict.update(param_dict)
+                    doc_dict.update({
+                        'variant_id': doc.id,
+                        'task_id': task_id,
+                        'variant_name': doc_dict.get('name', None),
+                    })
+                    converted_doc_dict = promote_last_updated_to_updated_at(
+                        process_doc_dict(doc_dict=doc_dict, collection='variants'),
+                    )
+                    yield converted_doc_dict
+        except Exception as e:
+            logging.error(f"Error in get_variants: {e}")
 
     def get_administrations_by_ids(self, administration_ids, chunk_size: int = 100):
         try:
@@ -548,14 +950,14 @@ class FirestoreServices:
                 try:
                     doc_refs = [col.document(doc_id) for doc_id in chunk]
                     # get_all returns a generator of DocumentSnapshot
-                    docs = list(self.admin_db.get_all(doc_refs))
+                    docs = self._get_all(doc_refs, "get_administrations_by_ids")
                     for snap in docs:
                         if not snap.exists:
                             continue
                         d = snap.to_dict() or {}
                         d['administration_id'] = snap.id
                         d['administration_name'] = d.get('name', None)
-                        converted_doc_dict = process_doc_dict(doc_dict=d)
+                        converted_doc_dict = process_doc_dict(doc_dict=d, collection='administrations')
                         results.append(converted_doc_dict)
                 except Exception as e:
                     logging.error(f"[get_administrations_by_ids] chunk {i}-{i + len(chunk)} failed: {e}", exc_info=True)
@@ -571,17 +973,122 @@ class FirestoreServices:
         Stream administration documents for a given Firestore site id (field: siteId).
         Yields raw dicts including administration_id.
         """
+        t0 = time.monotonic()
+        docs = 0
+        bytes_read = 0
         try:
             for snap in self.admin_db.collection("administrations").where(
                 "siteId", "==", site_id
             ).stream():
                 if not snap.exists:
                     continue
+                docs += 1
+                bytes_read += estimate_document_bytes(snap)
                 d = snap.to_dict() or {}
                 d["administration_id"] = snap.id
                 yield d
         except Exception as e:
             logging.error(f"iter_administrations_for_site({site_id!r}): {e}", exc_info=True)
+        finally:
+            # One streamed RPC; seconds include the caller's time between documents.
+            self.usage.record(self.current_org, "iter_administrations_for_site", reads=max(1, docs), docs=docs,
+                              bytes_read=bytes_read, seconds=time.monotonic() - t0)
+
+    def _collection_group_in_range(self, group: str, field: str, start_dt: datetime, end_dt: datetime | None = None):
+        """``collection_group(group)`` restricted to ``start_dt <= field [<= end_dt]``, projecting only ``field``."""
+        query = self.admin_db.collection_group(group).where(field, '>=', start_dt)
+        if end_dt is not None:
+            query = query.where(field, '<=', end_dt)
+        return query.order_by(field).select([field])
+
+    def _scan_parent_user_ids(self, query, collection_name: str, *, method: str, progress: str,
+                              chunk_size: int) -> set[str]:
+        """
+        Ids of the ``{collection_name}/{user_id}`` documents that own the documents matched by
+        a collection-group ``query``. Page errors are raised rather than ending the scan early.
+        """
+        ids = set()
+        for doc in self._paginate(query, method=method, progress=progress,
+                                  chunk_size=chunk_size, raise_errors=True):
+            parts = doc.reference.path.split('/')
+            if len(parts) == 4 and parts[0] == collection_name:
+                ids.add(parts[1])
+        return ids
+
+    def get_activity_index(self, is_guest: bool, date_filter: utils.DateFilter, chunk_size=1000) -> dict | None:
+        """
+        Precompute which users have activity with a few ``collection_group`` scans, so
+        ``get_users`` can replace its per-user probe queries with set lookups.
+
+        Returns ``{"runs": set[user_id], "surveys": set[user_id]}``:
+
+        - users: parents of ``runs`` with ``timeStarted`` in range, and parents of
+          ``surveyResponses`` with ``createdAt`` or ``timeStarted`` in range.
+        - guests: parents of any run (the guest probe has no date range); the scan is
+          bounded to the ``guests/`` subtree by document name.
+
+        Only the cursor field is projected, so no document bodies are downloaded, but every
+        matching run/survey response of the project is a billed read. Results are kept in
+        ``activity_indexes``, so orgs with the same date range reuse one set of scans.
+        Returns None if any scan fails (e.g. a missing collection-group index); callers
+        then fall back to the per-user probes.
+        """
+        collection_name = 'guests' if is_guest else 'users'
+        start_dt = to_datetime(date_filter.start_date, 'start')
+        end_dt = to_datetime(date_filter.end_date, 'end')
+        key = (collection_name, start_dt, end_dt)
+        if key in self.activity_indexes:
+            return self.activity_indexes[key]
+
+        try:
+            if is_guest:
+                # Same name-range bounds as Query.recursive uses for a collection subtree.
+                min_id = "__id-9223372036854775808__"
+                document_id = FieldPath.document_id()
+                guest_runs = (self.admin_db.collection_group('runs')
+                              .order_by(document_id)
+                              .start_at({document_id: self.admin_db.document(f"guests/{min_id}")})
+                              .end_at({document_id: self.admin_db.document(f"guests\0/{min_id}")})
+                              .select([document_id]))
+                index = {
+                    "runs": self._scan_parent_user_ids(guest_runs, collection_name, method="get_activity_index",
+                                                       progress="guest run index", chunk_size=chunk_size),
+                    "surveys": set(),
+                }
+            else:
+                index = {
+                    "runs": self._scan_parent_user_ids(
+                        self._collection_group_in_range('runs', 'timeStarted', start_dt, end_dt),
+                        collection_name, method="get_activity_index", progress="run activity index",
+                        chunk_size=chunk_size),
+                    "surveys": (
+                        self._scan_parent_user_ids(
+                            self._collection_group_in_range('surveyResponses', 'createdAt', start_dt, end_dt),
+                            collection_name, method="get_activity_index",
+                            progress="survey activity index (createdAt)", chunk_size=chunk_size)
+                        | self._scan_parent_user_ids(
+                            self._collection_group_in_range('surveyResponses', 'timeStarted', start_dt, end_dt),
+                            collection_name, method="get_activity_index",
+                            progress="survey activity index (timeStarted)", chunk_size=chunk_size)
+                    ),
+                }
+        except Exception as e:
+            logging.warning(f"Activity index unavailable for {collection_name}, using per-user probes: {e}")
+            self.activity_indexes[key] = None
+            return None
+
+        logging.info(
+            f"Activity index for {collection_name}: {len(index['runs'])} users with runs, "
+            f"{len(index['surveys'])} users with surveys."
+        )
+        self.activity_indexes[key] = index
+        return index
+
+    def build_activity_indexes(self, orgs: list):
+        """Run the activity index scans of every org with ``is_activity_index`` once, up front."""
+        for org in orgs:
+            if org.is_activity_index:
+                self.get_activity_index(org.is_guest, org.resolved_date_filter())
 
     def get_users(
         self,
@@ -590,8 +1097,21 @@ class FirestoreServices:
         org_filter: utils.OrgFilter | None,
         user_filter: utils.UserFilter | None,
         user_number_limit: int | None = None,
+        activity_index: bool = False,
+        changed_since: datetime | None = None,
+        changed_user_ids: set[str] | None = None,
+        refreshed_user_ids: set[str] | None = None,
         chunk_size=100,
     ):
+        """
+        Yield normalized user dicts for the org.
+
+        With ``changed_since`` (incremental exports) only users whose ``lastUpdated`` is
+        after it, plus ``changed_user_ids`` (see ``get_changed_user_ids_by_org``) that match
+        the org/user filters, are candidates; the usual activity checks and relationship
+        backfill then apply to them. Every candidate's id is added to ``refreshed_user_ids``,
+        whether or not it is yielded, so rows of users who no longer qualify can be dropped.
+        """
         date_field = 'lastUpdated'  # 'created' if is_guest else 'createdAt'
         if is_guest:
             collection_name = 'guests'
@@ -634,29 +1154,36 @@ class FirestoreServices:
                     return True
             return False
 
+        # Optional precomputed activity sets; None keeps the per-user probe queries.
+        active_user_ids = self.get_activity_index(is_guest, date_filter) if activity_index else None
+
         def _has_run_in_range(doc_ref, start_dt, end_dt) -> bool:
-            runs = (doc_ref.collection('runs')
-                    .where('timeStarted', '>=', start_dt)
-                    .where('timeStarted', '<=', end_dt)
-                    .limit(1).get())
+            if active_user_ids is not None:
+                return doc_ref.id in active_user_ids["runs"]
+            runs = self._get(doc_ref.collection('runs')
+                             .where('timeStarted', '>=', start_dt)
+                             .where('timeStarted', '<=', end_dt)
+                             .limit(1), "get_users")
             return bool(runs)
 
         def _has_survey_in_range(doc_ref, start_dt, end_dt) -> bool:
+            if active_user_ids is not None:
+                return doc_ref.id in active_user_ids["surveys"]
             sr = doc_ref.collection('surveyResponses')
-            by_created = (
+            by_created = self._get(
                 sr.where('createdAt', '>=', start_dt)
                 .where('createdAt', '<=', end_dt)
-                .limit(1)
-                .get()
+                .limit(1),
+                "get_users",
             )
             if by_created:
                 return True
             try:
-                by_started = (
+                by_started = self._get(
                     sr.where('timeStarted', '>=', start_dt)
                     .where('timeStarted', '<=', end_dt)
-                    .limit(1)
-                    .get()
+                    .limit(1),
+                    "get_users",
                 )
                 return bool(by_started)
             except Exception:
@@ -715,7 +1242,7 @@ class FirestoreServices:
                 for parent_id in (student.get("parent1_id"), student.get("parent2_id")):
                     if not parent_id or parent_id in selected or parent_id in parent_candidates:
                         continue
-                    snap = users_col.document(parent_id).get()
+                    snap = self._get(users_col.document(parent_id), "get_users")
                     if not snap.exists:
                         continue
                     if not _has_survey_in_range(snap.reference, start_dt, end_dt):
@@ -784,7 +1311,7 @@ class FirestoreServices:
 
             if doc_dict.get('created', None):
                 doc_dict['created_at'] = doc_dict.get('created')
-            return process_doc_dict(doc_dict=doc_dict)
+            return process_doc_dict(doc_dict=doc_dict, collection='users')
 
         def _extract_related_user_ids(doc_dict: dict) -> set[str]:
             related_ids: set[str] = set()
@@ -796,11 +1323,29 @@ class FirestoreServices:
                             related_ids.add(uid)
             return related_ids
 
+        def iter_candidates(query):
+            if changed_since is None:
+                yield from self._paginate(query, method="get_users", progress=collection_name,
+                                          chunk_size=chunk_size, with_count=True)
+                return
+
+            seen = set()
+            for doc in self._paginate(query.where(date_field, '>', changed_since), method="get_users",
+                                      progress=f"{collection_name} updated since watermark",
+                                      chunk_size=chunk_size, raise_errors=True):
+                seen.add(doc.id)
+                yield doc
+            remaining = sorted(set(changed_user_ids or ()) - seen)
+            col = self.admin_db.collection(collection_name)
+            for i in range(0, len(remaining), chunk_size):
+                for snap in self._get_all([col.document(uid) for uid in remaining[i:i + chunk_size]], "get_users"):
+                    if snap.exists and user_matches_filters(snap.to_dict() or {}, org_filter, user_filter):
+                        seen.add(snap.id)
+                        yield snap
+            if refreshed_user_ids is not None:
+                refreshed_user_ids.update(seen)
+
         def process_docs(query):
-            last_doc = None
-            total_docs = query.get()
-            total_chunks = len(total_docs) // chunk_size + (len(total_docs) % chunk_size > 0)
-            current_chunk = 0
             selected_by_id: dict[str, dict] = {}
             related_user_ids: set[str] = set()
             use_stratified_sample = (
@@ -809,71 +1354,66 @@ class FirestoreServices:
             students_pool: list[dict] = []
             teachers_pool: list[dict] = []
 
-            while True:
-                try:
-                    query = query.limit(chunk_size)
-                    if last_doc:
-                        query = query.start_after(last_doc)
-                    docs = query.get()
-                    if not docs:
-                        break
-                    current_chunk += 1
-                    logging.info(
-                        f"Setting users... processing chunk {current_chunk} of {total_chunks} {collection_name} chunks.")
-                    for doc in docs:
-                        doc_dict = doc.to_dict()
-                        # Discard users without any assignment.
-                        if is_guest:
-                            runs = doc.reference.collection('runs').limit(1).get()
-                            if not runs:  # Check if there are no documents in the runs subcollection
+            try:
+                for doc in iter_candidates(query):
+                    doc_dict = doc.to_dict()
+                    # Discard users without any assignment.
+                    if is_guest:
+                        if active_user_ids is not None:
+                            if doc.id not in active_user_ids["runs"]:
                                 continue
                         else:
-                            start_dt = to_datetime(date_filter.start_date, 'start')
-                            end_dt = to_datetime(date_filter.end_date, 'end')
-                            if not _any_assigned_between(
-                                    doc_dict.get('assignmentsAssigned', {}),
-                                    start_dt,
-                                    end_dt,
-                            ):
-                                continue
-                            user_type = doc_dict.get('userType', None)
-                            if user_type == 'student' and not _has_run_in_range(doc.reference, start_dt, end_dt):
-                                continue
-                            if user_type in ['teacher', 'parent'] and not _has_survey_in_range(
-                                doc.reference, start_dt, end_dt
-                            ):
-                                continue
-                            if user_type in ['admin']:
-                                continue
-                            if use_stratified_sample and user_type == 'parent':
+                            runs = self._get(doc.reference.collection('runs').limit(1), "get_users")
+                            if not runs:  # Check if there are no documents in the runs subcollection
                                 continue
+                    else:
+                        start_dt = to_datetime(date_filter.start_date, 'start')
+                        end_dt = to_datetime(date_filter.end_date, 'end')
+                        if not _any_assigned_between(
+                                doc_dict.get('assignmentsAssigned', {}),
+                                start_dt,
+                                end_dt,
+                        ):
+                            continue
+                        user_type = doc_dict.get('userType', None)
+                        if user_type == 'student' and not _has_run_in_range(doc.reference, start_dt, end_dt):
+                            continue
+                        if user_type in ['teacher', 'parent'] and not _has_survey_in_range(
+                            doc.reference, start_dt, end_dt
+                        ):
+                            continue
+                        if user_type in ['admin']:
+                            continue
+                        if use_stratified_sample and user_type == 'parent':
+                            continue
 
-                        # Check if user filter is being used
-                        # if user_filter.key:
-                        #     if user_filter.operator == "contains":
-                        #         user_value_firebase = doc_dict.get(user_filter.key, None)
-                        #         if not user_value_firebase:
-                        #             continue  # Skip this document if the filter condition is not met
-                        #         elif user_filter.value not in user_value_firebase:
-                        #             continue
-
-                        converted_doc_dict = _normalize_user_doc(user_id=doc.id, doc_dict=doc_dict)
-                        if not use_stratified_sample:
-                            related_user_ids.update(_extract_related_user_ids(doc_dict))
-                        if use_stratified_sample:
-                            if user_type == 'student':
-                                students_pool.append(converted_doc_dict)
-                            elif user_type == 'teacher':
-                                teachers_pool.append(converted_doc_dict)
-                        elif user_number_limit and user_number_limit > 0:
-                            if _has_activity(doc.reference, doc_dict):
-                                selected_by_id[converted_doc_dict["user_id"]] = converted_doc_dict
-                        else:
+                    # Check if user filter is being used
+                    # if user_filter.key:
+                    #     if user_filter.operator == "contains":
+                    #         user_value_firebase = doc_dict.get(user_filter.key, None)
+                    #         if not user_value_firebase:
+                    #             continue  # Skip this document if the filter condition is not met
+                    #         elif user_filter.value not in user_value_firebase:
+                    #             continue
+
+                    converted_doc_dict = _normalize_user_doc(user_id=doc.id, doc_dict=doc_dict)
+                    if not use_stratified_sample:
+                        related_user_ids.update(_extract_related_user_ids(doc_dict))
+                    if use_stratified_sample:
+                        if user_type == 'student':
+                            students_pool.append(converted_doc_dict)
+                        elif user_type == 'teacher':
+                            teachers_pool.append(converted_doc_dict)
+                    elif user_number_limit and user_number_limit > 0:
+                        if _has_activity(doc.reference, doc_dict):
                             selected_by_id[converted_doc_dict["user_id"]] = converted_doc_dict
-                    last_doc = docs[-1]
-                except Exception as e:
-                    logging.error(f"Error in get_users: {e}")
-                    break
+                    else:
+                        selected_by_id[converted_doc_dict["user_id"]] = converted_doc_dict
+            except Exception as e:
+                logging.error(f"Error in get_users: {e}")
+                if changed_since is not None:
+                    # An incomplete delta would be merged as if it were complete.
+                    raise
 
             if use_stratified_sample:
                 selected_by_id = _apply_stratified_user_limit(
@@ -895,7 +1435,7 @@ class FirestoreServices:
                     missing_related_ids = list(missing_related_ids)
                     random.shuffle(missing_related_ids)
                     rel_refs = [rel_collection.document(uid) for uid in missing_related_ids]
-                    for snap in self.admin_db.get_all(rel_refs):
+                    for snap in self._get_all(rel_refs, "get_users"):
                         if not snap.exists:
                             continue
                         if user_number_limit and user_number_limit > 0 and len(selected_by_id) >= user_number_limit:
@@ -909,178 +1449,139 @@ class FirestoreServices:
 
         yield from process_docs(query=base_query)
 
-    def get_runs(self, user_id: str, run_key_usage: dict, date_filter: utils.DateFilter, is_guest: bool = False,
-                 chunk_size=100):
-        last_doc = None
+    def get_runs(self, user_id: str, run_key_usage: KeyUsage, date_filter: utils.DateFilter, is_guest: bool = False,
+                 chunk_size=100, raise_errors: bool = False):
+        """
+        Stream the user's runs started within ``date_filter``. Read errors end the stream
+        and are logged; with ``raise_errors`` (incremental exports) they are re-raised.
+        """
         collection_name = 'guests' if is_guest else 'users'
         base_query = (self.admin_db.collection(collection_name).document(user_id)
                       .collection('runs'))
         base_query = base_query.where('timeStarted', '>=', to_datetime(date_filter.start_date, 'start'))
         base_query = base_query.where('timeStarted', '<=', to_datetime(date_filter.end_date, 'end'))
         base_query = base_query.order_by('timeStarted')
-        total_docs = base_query.get()
-        total_chunks = len(total_docs) // chunk_size + (len(total_docs) % chunk_size > 0)
-        current_chunk = 0
-
-        while True:
-            try:
-                query = base_query.limit(chunk_size)
-                if last_doc:
-                    query = query.start_after(last_doc)
-                docs = query.get()
-                if not docs:
-                    break
 
-                current_chunk += 1
-                logging.info(f"Setting runs... processing chunk {current_chunk} of {total_chunks} "
-                             f"run chunks for {collection_name} {user_id}.")
-                for doc in docs:
-                    doc_dict = doc.to_dict()
-                    test_comp_scores = doc_dict.get('scores', {}).get('raw', {}).get('composite', {}).get('test', {})
-                    time_created = doc_dict.get("timeStarted", None)  # or handle __time__ if needed
-                    task_id = doc_dict.get('taskId', None)
-                    task_version = doc_dict.get('taskVersion', None)
-
-                    flattened = flatten_document(doc_dict, max_depth=None)
-                    task_dict = run_key_usage.setdefault(task_id, {})
-
-                    for key, value in flattened.items():
-                        new_meta = {
-                            "user_id": user_id,
-                            "run_id": doc.id,
-                            "task_version": task_version,
-                            "time_created": time_created
-                        }
-
-                        if key not in task_dict:
-                            task_dict[key] = new_meta
-                        else:
-                            prev_time = task_dict[key].get("time_created")
-                            if prev_time is None or (time_created and time_created > prev_time):
-                                task_dict[key] = new_meta
+        try:
+            for doc in self._paginate(base_query, method="get_runs",
+                                      progress=f"runs for {collection_name} {user_id}", chunk_size=chunk_size,
+                                      raise_errors=raise_errors):
+                doc_dict = doc.to_dict()
+                test_comp_scores = doc_dict.get('scores', {}).get('raw', {}).get('composite', {}).get('test', {})
+                time_created = doc_dict.get("timeStarted", None)  # or handle __time__ if needed
+                task_id = doc_dict.get('taskId', None)
+                task_version = doc_dict.get('taskVersion', None)
+
+                run_key_usage.record(task_id, doc_dict, None, {
+                    "user_id": user_id,
+                    "run_id": doc.id,
+                    "task_version": task_version,
+                    "time_created": time_created
+                })
 
-                    doc_dict.update({
-                        'run_id': doc.id,
-                        'user_id': user_id,
-                        'administration_id': doc_dict.get('assignmentId', None),
-                        'num_attempted': test_comp_scores.get('numAttempted', None),
-                        'num_correct': test_comp_scores.get('numCorrect', None),
-                        'test_comp_theta_estimate': test_comp_scores.get('thetaEstimate', None),
-                        'test_comp_theta_se': test_comp_scores.get('thetaSE', None)
-                    })
-                    # Convert camelCase to snake_case and handle NaN values
-                    converted_doc_dict = process_doc_dict(doc_dict=doc_dict)
-                    yield converted_doc_dict
-                last_doc = docs[-1]
-            except Exception as e:
-                logging.error(f"Error in get_runs: {e}")
-                break
+                doc_dict.update({
+                    'run_id': doc.id,
+                    'user_id': user_id,
+                    'administration_id': doc_dict.get('assignmentId', None),
+                    'num_attempted': test_comp_scores.get('numAttempted', None),
+                    'num_correct': test_comp_scores.get('numCorrect', None),
+                    'test_comp_theta_estimate': test_comp_scores.get('thetaEstimate', None),
+                    'test_comp_theta_se': test_comp_scores.get('thetaSE', None)
+                })
+                # Convert camelCase to snake_case and handle NaN values
+                converted_doc_dict = process_doc_dict(doc_dict=doc_dict, collection='runs')
+                yield converted_doc_dict
+        except Exception as e:
+            logging.error(f"Error in get_runs: {e}")
+            if raise_errors:
+                raise
 
-    def get_trials(self, user_id: str, run_id: str, task_id: str, trial_key_usage: dict, is_guest: bool = False,
-                   chunk_size=100):
-        last_doc = None
+    def get_trials(self, user_id: str, run_id: str, task_id: str, trial_key_usage: KeyUsage, is_guest: bool = False,
+                   chunk_size=100, raise_errors: bool = False):
+        """Stream the trials of one run; ``raise_errors`` as in ``get_runs``."""
         collection_name = 'guests' if is_guest else 'users'
         base_query = (self.admin_db.collection(collection_name).document(user_id)
                       .collection('runs').document(run_id)
                       .collection('trials'))
-        total_docs = base_query.get()
-        total_chunks = len(total_docs) // chunk_size + (len(total_docs) % chunk_size > 0)
-        current_chunk = 0
-        while True:
-            try:
-                query = base_query.limit(chunk_size)
-                if last_doc:
-                    query = query.start_after(last_doc)
-                docs = query.get()
-                if not docs:
-                    break
-
-                current_chunk += 1
-                logging.info(
-                    f"Setting trials... processing chunk {current_chunk} of {total_chunks} "
-                    f"trial chunks of run {run_id} for user {user_id}.")
-                for doc in docs:
-                    doc_dict = doc.to_dict()
-                    time_created = doc_dict.get('serverTimestamp', None)
-
-                    flattened = flatten_document(doc_dict, max_depth=1)
-                    task_dict = trial_key_usage.setdefault(task_id, {})
-
-                    for key, value in flattened.items():
-                        new_meta = {
-                            "user_id": user_id,
-                            "run_id": run_id,
-                            "trial_id": doc.id,
-                            "time_created": time_created,
-                        }
-
-                        if key not in task_dict:
-                            task_dict[key] = new_meta
-                        else:
-                            prev_time = task_dict[key].get("time_created")
-                            if prev_time is None or (time_created and time_created > prev_time):
-                                task_dict[key] = new_meta
-
-                    doc_dict.update({
-                        'trial_id': doc.id,
-                        'user_id': user_id,
-                        'run_id': run_id,
-                        'task_id': task_id,
-                    })
-
-                    # Add identifiers to the dictionary
-                    if settings.config['INSTANCE'] == 'ROAR':
-                        doc_dict.update({
-                            # Pop required Firekit attributes
-                            'correct': handle_nan(doc_dict.pop('correct', None)),
-                            'assessment_stage': handle_nan(doc_dict.pop('assessment_stage', None)),
-                            # Pop default jsPsych data attributes
-                            'trial_index': handle_nan(doc_dict.pop('trial_index', None)),
-                            'trial_type': handle_nan(doc_dict.pop('trial_type', None)),
-                            'time_elapsed': handle_nan(doc_dict.pop('time_elapsed', None)),
-                        })
+        try:
+            for doc in self._paginate(base_query, method="get_trials",
+                                      progress=f"trials of run {run_id} for user {user_id}",
+                                      chunk_size=chunk_size, raise_errors=raise_errors):
+                yield convert_trial_doc(trial_id=doc.id, doc_dict=doc.to_dict(), user_id=user_id,
+                                        run_id=run_id, task_id=task_id, trial_key_usage=trial_key_usage)
+        except Exception as e:
+            logging.error(f"Error in get_trails: {e}")
+            if raise_errors:
+                raise
 
-                        # Ignore keys which we do not want duplicated in trial_attributes
-                        ignore_keys = ['trial_id', 'user_id', 'run_id', 'task_id']
-                        # Process the remaining doc_dict keys
-                        doc_dict['trial_attributes'] = process_doc_dict(doc_dict, ignore_keys)
-                        converted_doc_dict = doc_dict
-                    else:
-                        answer = doc_dict.get(
-                            'answer',
-                            doc_dict.get('goal', doc_dict.get('sequence', doc_dict.get('word', None)))
-                        )
-                        item = doc_dict.get('item')
-                        distractors = doc_dict.get('distractors')
-                        subtask = doc_dict.get('subtask')
-                        response = doc_dict.get('response')
-                        response_location = doc_dict.get('responseLocation')
-                        rt = doc_dict.get('rt')
-                        doc_dict.update({
-                            # 'corpus_trial_type': stringify_variables(doc_dict.get('corpus_trial_type', '')),
-                            'item': stringify_variables(item) if item is not None else None,
-                            'distractors': stringify_variables(distractors) if distractors is not None else None,
-                            'answer': stringify_variables(answer) if answer is not None else None,
-                            'subtask': stringify_variables(subtask) if subtask is not None else None,
-                            'response': stringify_variables(response) if response is not None else None,
-                            'rt': rt if isinstance(rt, int) else (stringify_variables(rt) if rt is not None else None),
-                            'response_location': stringify_variables(response_location) if response_location is not None else None,
-                        })
-                        converted_doc_dict = process_doc_dict(doc_dict=doc_dict)
-                    yield converted_doc_dict
-                last_doc = docs[-1]
-            except Exception as e:
-                logging.error(f"Error in get_trails: {e}")
-                break
+    def get_trials_for_user(self, user_id: str, run_task_ids: dict, trial_key_usage: KeyUsage,
+                            is_guest: bool = False, chunk_size=500, raise_errors: bool = False):
+        """
+        Stream the trials of many runs of one user with a single ``collection_group('trials')``
+        scan instead of one ``get_trials`` query per run.
+
+        The scan is ordered by document name and bounded to
+        ``{users|guests}/{user_id}/runs/{first_run_id}`` .. ``{last_run_id}\\0`` (the same
+        range trick ``Query.recursive`` uses), so it only touches this user's run subtree.
+        ``run_task_ids`` maps run_id -> task_id. The range would also read (and bill) the
+        trials of any run inside it that is left out of ``run_task_ids``, e.g. by the date
+        filter, so the scan is only used when an aggregation ``count()`` of the runs in that
+        id range matches; otherwise, and for a single run, the runs are read one by one
+        with ``get_trials``. Yields the same dicts as ``get_trials``; ``raise_errors`` as in
+        ``get_runs``.
+        """
+        if not run_task_ids:
+            return
+        collection_name = 'guests' if is_guest else 'users'
+        runs_path = f"{collection_name}/{user_id}/runs"
+        run_ids = sorted(run_task_ids)
+        runs = self.admin_db.collection(collection_name).document(user_id).collection('runs')
+        document_id = FieldPath.document_id()
+        run_count = None
+        if len(run_ids) > 1:
+            run_count = self.count_query(
+                runs.where(filter=FieldFilter(document_id, ">=", runs.document(run_ids[0])))
+                    .where(filter=FieldFilter(document_id, "<=", runs.document(run_ids[-1]))),
+                "get_trials_for_user")
+        if run_count is None or run_count > len(run_ids):
+            for run_id in run_ids:
+                yield from self.get_trials(user_id=user_id, run_id=run_id, task_id=run_task_ids[run_id],
+                                           trial_key_usage=trial_key_usage, is_guest=is_guest,
+                                           raise_errors=raise_errors)
+            return
+        base_query = (self.admin_db.collection_group('trials')
+                      .order_by(document_id)
+                      .start_at({document_id: self.admin_db.document(f"{runs_path}/{run_ids[0]}")})
+                      .end_at({document_id: self.admin_db.document(f"{runs_path}/{run_ids[-1]}\0")}))
+        try:
+            for doc in self._paginate(base_query, method="get_trials_for_user",
+                                      progress=f"trials of {len(run_ids)} runs for user {user_id}",
+                                      chunk_size=chunk_size, raise_errors=raise_errors):
+                run_ref = doc.reference.parent.parent
+                if not doc.reference.path.startswith(f"{runs_path}/") or run_ref.id not in run_task_ids:
+                    continue
+                yield convert_trial_doc(trial_id=doc.id, doc_dict=doc.to_dict(), user_id=user_id,
+                                        run_id=run_ref.id, task_id=run_task_ids[run_ref.id],
+                                        trial_key_usage=trial_key_usage)
+        except Exception as e:
+            logging.error(f"Error in get_trials_for_user: {e}")
+            if raise_errors:
+                raise
 
     def get_surveys(
         self,
         user_id: str,
         user_type: str,
         date_filter: utils.DateFilter,
-        survey_key_usage: dict,
+        survey_key_usage: KeyUsage,
         user_class_ids: list[str] | None = None,
+        raise_errors: bool = False,
     ):
+        """
+        The user's surveys and survey responses within ``date_filter``. Read errors are
+        logged and leave the lists short; with ``raise_errors`` (incremental exports) they
+        are re-raised instead.
+        """
         surveys: list[dict] = []
         survey_responses: list[dict] = []
 
@@ -1166,18 +1667,20 @@ class FirestoreServices:
             # Two queries unioned by doc id. The first catches the three legacy
             # shapes (all keyed on createdAt); the second catches the run-like
             # shape which has no createdAt — only timeStarted.
-            docs_by_created = list(
+            docs_by_created = list(self._get(
                 sr_collection.where('createdAt', '>=', start_dt)
-                             .where('createdAt', '<=', end_dt)
-                             .get()
-            )
+                             .where('createdAt', '<=', end_dt),
+                "get_surveys",
+            ))
             try:
-                docs_by_started = list(
+                docs_by_started = list(self._get(
                     sr_collection.where('timeStarted', '>=', start_dt)
-                                 .where('timeStarted', '<=', end_dt)
-                                 .get()
-                )
+                                 .where('timeStarted', '<=', end_dt),
+                    "get_surveys",
+                ))
             except Exception as e:
+                if raise_errors:
+                    raise
                 # timeStarted index may not exist yet; treat as empty rather than
                 # crashing the entire user's survey ingest.
                 logging.warning(
@@ -1215,27 +1718,16 @@ class FirestoreServices:
                     continue
 
                 # ---------------- key usage tracking ----------------
-                # Run-like docs flatten into the same task_dict; that's fine —
+                # Run-like docs record into the same task entry; that's fine —
                 # it tracks any key Firestore is sending us.
                 time_created_for_keys = (
                     doc_dict.get('createdAt') or doc_dict.get('timeStarted')
                 )
-                flattened = flatten_document(doc=doc_dict, max_depth=2)
-                task_dict = survey_key_usage.setdefault(f'{user_type}_survey', {})
-                for key, value in flattened.items():
-                    new_meta = {
-                        "user_id": user_id,
-                        "survey_response_id": doc.id,
-                        "time_created": time_created_for_keys,
-                    }
-                    if key not in task_dict:
-                        task_dict[key] = new_meta
-                    else:
-                        prev_time = task_dict[key].get("time_created")
-                        if prev_time is None or (
-                            time_created_for_keys and time_created_for_keys > prev_time
-                        ):
-                            task_dict[key] = new_meta
+                survey_key_usage.record(f'{user_type}_survey', doc_dict, 2, {
+                    "user_id": user_id,
+                    "survey_response_id": doc.id,
+                    "time_created": time_created_for_keys,
+                })
 
                 assignment_id = canonical_assignment_id(doc.id, doc_dict)
 
@@ -1246,6 +1738,7 @@ class FirestoreServices:
                         user_id=user_id, user_type=user_type,
                         assignment_id=assignment_id,
                         fallback_survey_type=survey_type,
+                        raise_errors=raise_errors,
                     )
                     r_rows = [
                         row for row in r_rows
@@ -1368,6 +1861,8 @@ class FirestoreServices:
             logging.error(
                 "Error in get_surveys user_id=%s: %s", user_id, e, exc_info=True,
             )
+            if raise_errors:
+                raise
 
         apply_survey_deduplication(surveys, survey_responses)
         for row in surveys:
@@ -1386,6 +1881,7 @@ class FirestoreServices:
         user_type: str,
         assignment_id: str,
         fallback_survey_type: str,
+        raise_errors: bool = False,
     ) -> tuple[dict, list[dict]]:
         """
         Emit one ``Survey`` row + N ``SurveyResponse`` rows for a run-like
@@ -1438,13 +1934,15 @@ class FirestoreServices:
 
         response_rows: list[dict] = []
         try:
-            trial_snaps = list(doc.reference.collection('trials').get())
+            trial_snaps = list(self._get(doc.reference.collection('trials'), "get_surveys"))
         except Exception as e:
             logging.error(
                 "get_surveys: failed to fetch trials for run-like survey "
                 "user_id=%s doc_id=%s: %s",
                 user_id, doc.id, e,
             )
+            if raise_errors:
+                raise
             trial_snaps = []
 
         for trial_snap in trial_snaps:
@@ -1487,7 +1985,7 @@ class FirestoreServices:
             return
 
         task_doc_ref = self.admin_db.collection('tasks').document(task_id)
-        task_doc = task_doc_ref.get().to_dict() or {}
+        task_doc = self._get(task_doc_ref, "upload_task_schema_to_firestore").to_dict() or {}
         stored_dict = task_doc.get(dict_type, {})
 
         task_type = dict_type if task_id == "survey" else task_id
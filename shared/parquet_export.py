@@ -0,0 +1,146 @@
+"""
+Parquet export of validated tables.
+
+Column types come from the pydantic models in ``utils.schema_registry()``: ``str``,
+``int``, ``float``, ``bool`` and ``datetime`` fields become typed Parquet columns
+(datetimes as UTC timestamps), so Redivis and pandas read the types from the file
+instead of inferring them from a sentinel "schema_row". Fields without a flat column
+type (``Any``, containers) and columns no model declares (all of ``invalid_data``)
+are stored as JSON text and marked as such in the field metadata, so ``iter_parquet_blocks``
+returns the original values.
+
+Rows are converted and written one row group at a time, so a table never has to be
+held as a whole in memory.
+"""
+from __future__ import annotations
+
+import json
+import types
+from datetime import datetime
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, Union, get_args, get_origin
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from shared import utils
+from shared.table_spool import SpooledTable
+from shared.table_store import ColumnTable
+
+PARQUET_ROW_GROUP_ROWS = 64 * 1024
+
+# Field metadata marking columns stored as JSON text.
+JSON_FIELD_METADATA = {b"encoding": b"json"}
+
+_encode_json = utils.CustomJSONEncoder().encode
+
+
+def _to_str(value):
+    return value if value is None or type(value) is str else str(value)
+
+
+def _to_float(value):
+    # Non-LEVANTE instances write NaN as the string "NaN".
+    return float(value) if isinstance(value, str) else value
+
+
+def _to_datetime(value):
+    if isinstance(value, str):
+        # Spooled rows carry datetimes as the ISO strings they were written as.
+        return datetime.fromisoformat(value)
+    return value
+
+
+def _to_json(value):
+    return None if value is None else _encode_json(value)
+
+
+def _column_for_annotation(annotation: Any) -> tuple[pa.DataType, Callable | None, bool]:
+    """``(arrow type, value converter or None, is JSON text)`` for a model field annotation."""
+    if get_origin(annotation) in (Union, types.UnionType):
+        args = [a for a in get_args(annotation) if a is not type(None)]
+        if len(args) != 1:
+            # e.g. Union[str, int]: one column of strings.
+            return (pa.string(), _to_str, False) if all(a in (str, int) for a in args) else (pa.string(), _to_json, True)
+        annotation = args[0]
+    if annotation is bool:
+        return pa.bool_(), None, False
+    if annotation is int:
+        return pa.int64(), None, False
+    if annotation is float:
+        return pa.float64(), _to_float, False
+    if annotation is str:
+        return pa.string(), _to_str, False
+    if annotation is datetime:
+        return pa.timestamp("us", tz="UTC"), _to_datetime, False
+    return pa.string(), _to_json, True
+
+
+def _row_columns(rows) -> list[str]:
+    """Column names present in ``rows``, in first-seen order where the container knows it."""
+    if isinstance(rows, ColumnTable):
+        return rows.column_names()
+    if isinstance(rows, SpooledTable):
+        return sorted(rows.columns)
+    names = {}
+    for row in rows:
+        names.update(dict.fromkeys(row))
+    return list(names)
+
+
+def table_schema(table_name: str, rows) -> tuple[pa.Schema, list[Callable | None]]:
+    """
+    Arrow schema of ``table_name`` (its model's fields in declaration order, then any other
+    column found in ``rows`` as JSON text) and the converter of every column.
+    """
+    entry = utils.schema_registry().get(table_name)
+    model_fields = getattr(entry[1], "model_fields", {}) if entry else {}
+    fields, converters = [], []
+    for name, field in model_fields.items():
+        arrow_type, converter, is_json = _column_for_annotation(field.annotation)
+        fields.append(pa.field(name, arrow_type, metadata=JSON_FIELD_METADATA if is_json else None))
+        converters.append(converter)
+    for name in _row_columns(rows):
+        if name not in model_fields:
+            fields.append(pa.field(name, pa.string(), metadata=JSON_FIELD_METADATA))
+            converters.append(_to_json)
+    return pa.schema(fields), converters
+
+
+def write_parquet(table_name: str, rows: Iterable[dict], path: str, compression: str = "snappy") -> int:
+    """Write ``rows`` to a Parquet file at ``path``, one row group at a time; returns the row count."""
+    schema, converters = table_schema(table_name, rows)
+    names = schema.names
+    count = 0
+    with pq.ParquetWriter(path, schema, compression=compression) as writer:
+        rows = iter(rows)
+        while block := list(islice(rows, PARQUET_ROW_GROUP_ROWS)):
+            arrays = []
+            for name, field, converter in zip(names, schema, converters):
+                values = [row.get(name) for row in block]
+                if converter is not None:
+                    values = [converter(v) for v in values]
+                arrays.append(pa.array(values, type=field.type))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            count += len(block)
+        if not count:
+            # Still write the schema, so empty tables keep their columns.
+            writer.write_table(schema.empty_table())
+    return count
+
+
+def iter_parquet_blocks(source, block_rows: int = PARQUET_ROW_GROUP_ROWS) -> Iterator[list[dict]]:
+    """
+    Rows of a Parquet file written by ``write_parquet`` (path or file-like), JSON columns
+    decoded, ``block_rows`` at a time.
+    """
+    parquet_file = pq.ParquetFile(source)
+    json_columns = [field.name for field in parquet_file.schema_arrow
+                    if (field.metadata or {}).get(b"encoding") == JSON_FIELD_METADATA[b"encoding"]]
+    for batch in parquet_file.iter_batches(batch_size=block_rows):
+        rows = batch.to_pylist()
+        for row in rows:
+            for name in json_columns:
+                if row[name] is not None:
+                    row[name] = json.loads(row[name])
+        yield rows
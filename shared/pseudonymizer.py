@@ -0,0 +1,177 @@
+"""
+Deterministic id pseudonymization for masked exports (``Organization.is_user_id_masked``).
+
+``IdPseudonymizer`` maps raw ids to pseudonyms for one salt. Every mapping is kept
+in memory for the life of the process (shared by all orgs of a job through
+``get_pseudonymizer``). When ``PSEUDONYM_STORE_DIR`` is set, mappings are also kept
+in a small SQLite store there, so later jobs on the same host look ids up instead
+of hashing them again. The store is an unencrypted raw id -> pseudonym table, i.e.
+it undoes the masking for anyone who can read it. Whole columns are mapped at once:
+each distinct id is looked up or hashed a single time.
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from functools import lru_cache
+from typing import Iterable
+
+import settings
+from shared.firestore_services import make_survey_id
+from shared.table_store import ColumnTable
+from shared.utils import ID_FIELDS
+
+# Ids per SQLite ``IN (...)`` lookup (SQLite's default host parameter limit is 999).
+STORE_LOOKUP_CHUNK = 900
+
+
+def pseudonym(raw: str, secret_salt: str) -> str:
+    # deterministic, same length & [A-Za-z0-9_-] friendly
+    h = hashlib.blake2b((raw + secret_salt).encode("utf-8"), digest_size=24).digest()
+    b32 = base64.b32encode(h).decode("utf-8").rstrip("=")  # uppercase A-Z2-7
+    # Trim/shape to roughly match original length/charset; fall back to 16 if too short
+    return b32[:max(16, len(raw))]
+
+
+class IdPseudonymizer:
+    """raw id -> pseudonym for one salt, memoized in memory and in an optional SQLite store."""
+
+    def __init__(self, secret_salt: str, store_path: str | None = None):
+        self.secret_salt = secret_salt
+        self.store_path = store_path
+        self._cache: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._store = None
+        if store_path:
+            try:
+                self._store = sqlite3.connect(store_path, timeout=30, check_same_thread=False)
+                self._store.execute("CREATE TABLE IF NOT EXISTS pseudonyms (raw TEXT PRIMARY KEY, fake TEXT NOT NULL)")
+                self._store.commit()
+                os.chmod(store_path, 0o600)
+            except (sqlite3.Error, OSError) as e:
+                logging.warning(f"Pseudonym store {store_path} unavailable, hashing in memory only: {e}")
+                self._store = None
+
+    def __call__(self, raw: str) -> str:
+        if raw is None:
+            return None
+        fake = self._cache.get(raw)
+        if fake is None:
+            fake = self.map_many([raw])[raw]
+        return fake
+
+    def map_many(self, raws: Iterable[str]) -> dict[str, str]:
+        """Mapping that covers every id in ``raws``; ids new to the store are hashed once and stored."""
+        cache = self._cache
+        with self._lock:
+            missing = {raw for raw in raws if raw not in cache}
+            if missing and self._store is not None:
+                missing = self._load_from_store(missing)
+            if missing:
+                new = {raw: pseudonym(raw, self.secret_salt) for raw in missing}
+                cache.update(new)
+                self._save_to_store(new)
+        return cache
+
+    def _load_from_store(self, raws: set) -> set:
+        raws = list(raws)
+        try:
+            for start in range(0, len(raws), STORE_LOOKUP_CHUNK):
+                chunk = raws[start:start + STORE_LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                self._cache.update(self._store.execute(
+                    f"SELECT raw, fake FROM pseudonyms WHERE raw IN ({placeholders})", chunk))
+        except sqlite3.Error as e:
+            logging.warning(f"Pseudonym store lookup failed: {e}")
+        return {raw for raw in raws if raw not in self._cache}
+
+    def _save_to_store(self, new: dict):
+        if self._store is None:
+            return
+        try:
+            self._store.executemany("INSERT OR IGNORE INTO pseudonyms (raw, fake) VALUES (?, ?)", new.items())
+            self._store.commit()
+        except sqlite3.Error as e:
+            logging.warning(f"Pseudonym store write failed: {e}")
+
+    def map_column(self, values: list) -> list:
+        """``values`` with every non-None value replaced by the pseudonym of ``str(value)``."""
+        mapping = self.map_many({str(v) for v in values if v is not None})
+        return [None if v is None else mapping[str(v)] for v in values]
+
+
+def _default_store_path(secret_salt: str) -> str | None:
+    """SQLite store in ``PSEUDONYM_STORE_DIR``; None (no store) when it is not set."""
+    directory = settings.config.get("PSEUDONYM_STORE_DIR")
+    if not directory:
+        return None
+    salt_key = hashlib.sha256(secret_salt.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(directory, f"pseudonyms-{salt_key}.sqlite3")
+
+
+@lru_cache(maxsize=None)
+def get_pseudonymizer(secret_salt: str) -> IdPseudonymizer:
+    """The process-wide pseudonymizer for ``secret_salt``."""
+    return IdPseudonymizer(secret_salt, store_path=_default_store_path(secret_salt))
+
+
+def _survey_ids(pseudo: IdPseudonymizer, user_ids: list, administration_ids: list, survey_parts: list,
+                specific_scopes: list, specific_scope_ids: list) -> tuple[list, list]:
+    """Pseudonymized ``specific_scope_id`` and the ``survey_id`` rebuilt from the masked ids."""
+    child_scope_ids = pseudo.map_many(
+        {str(scope_id) for scope, scope_id in zip(specific_scopes, specific_scope_ids)
+         if scope == "child_id" and scope_id})
+    new_scope_ids, survey_ids = [], []
+    for user_id, administration_id, part, scope, scope_id in zip(
+            user_ids, administration_ids, survey_parts, specific_scopes, specific_scope_ids):
+        if scope == "child_id" and scope_id:
+            scope_id = child_scope_ids[str(scope_id)]
+        part = part or "general"
+        new_scope_ids.append(scope_id)
+        survey_ids.append(make_survey_id(
+            str(user_id),
+            str(administration_id),
+            part,
+            scope_id if part == "specific" else None,
+        ))
+    return new_scope_ids, survey_ids
+
+
+def pseudonymize_dataset(data: dict, salt: str) -> dict:
+    """
+    Replace the user-bearing ids (``utils.ID_FIELDS``) of every table in ``data`` with
+    their pseudonyms, in place, and rebuild ``surveys.survey_id`` from the masked ids.
+    """
+    pseudo = get_pseudonymizer(salt)
+    for table, rows in data.items():
+        if isinstance(rows, ColumnTable):
+            for field in ID_FIELDS.get(table, []):
+                rows.set_column(field, pseudo.map_column(rows.column(field)))
+            if table == "surveys" and len(rows):
+                scope_ids, survey_ids = _survey_ids(
+                    pseudo, *(rows.column(name) for name in
+                              ("user_id", "administration_id", "survey_part", "specific_scope",
+                               "specific_scope_id")))
+                rows.set_column("specific_scope_id", scope_ids)
+                rows.set_column("survey_id", survey_ids)
+        elif isinstance(rows, list):
+            # e.g. invalid_data rows, or tables passed in as plain lists of dicts
+            for field in ID_FIELDS.get(table, []):
+                mapping = pseudo.map_many({str(row[field]) for row in rows if row.get(field) is not None})
+                for row in rows:
+                    if row.get(field) is not None:
+                        row[field] = mapping[str(row[field])]
+            if table == "surveys" and rows:
+                scope_ids, survey_ids = _survey_ids(
+                    pseudo, *([row.get(name) for row in rows] for name in
+                              ("user_id", "administration_id", "survey_part", "specific_scope",
+                               "specific_scope_id")))
+                for row, scope_id, survey_id in zip(rows, scope_ids, survey_ids):
+                    if "specific_scope_id" in row:
+                        row["specific_scope_id"] = scope_id
+                    row["survey_id"] = survey_id
+    return data
@@ -26,6 +26,17 @@ def _human_elapsed(seconds: float | None) -> str:
     return f"{h}h {m}m {sec}s"
 
 
+def _fmt_bytes(v: Any) -> str:
+    try:
+        n = float(v)
+    except (TypeError, ValueError):
+        return "—"
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:,.1f} {unit}" if unit != "B" else f"{int(n):,} B"
+        n /= 1024
+
+
 def _fmt_int(v: Any) -> str:
     if v is None:
         return "—"
@@ -70,7 +81,7 @@ def format_data_validation_slack_summary(response: dict) -> str:
         "",
         "*Pipeline*",
         f"• Save to storage: {dp.get('is_save_to_storage')} · Force Redivis: {dp.get('is_force_uploading_to_redivis')}",
-        f"• Send Slack: {dp.get('send_slack', '—')}",
+        f"• Send Slack: {dp.get('send_slack', '—')} · Incremental: {dp.get('is_incremental', False)}",
         "",
         "*Org scope*",
         orgs_block or "—",
@@ -91,13 +102,35 @@ def format_data_validation_slack_summary(response: dict) -> str:
         for oid, ost in list(per_org.items())[:5]:
             u = ost.get("users", {})
             r = ost.get("runs", {})
+            fs_reads = (ost.get("firestore_usage") or {}).get("reads")
+            reads_s = f", reads {_fmt_int(fs_reads)}" if fs_reads is not None else ""
             lines.append(
                 f"• `{oid}` — users {_fmt_int(u.get('valid_users'))}/{_fmt_int(u.get('total'))}, "
-                f"runs {_fmt_int(r.get('valid_runs'))}/{_fmt_int(r.get('total'))}"
+                f"runs {_fmt_int(r.get('valid_runs'))}/{_fmt_int(r.get('total'))}{reads_s}"
             )
         if len(per_org) > 5:
             lines.append(f"• _…and {len(per_org) - 5} more org(s)_")
 
+    usage = stats.get("firestore_usage") or {}
+    if usage:
+        lines.extend(
+            [
+                "",
+                "*Firestore usage*",
+                f"• Reads (billed, est.): {_fmt_int(usage.get('reads'))} · Docs: {_fmt_int(usage.get('docs'))} "
+                f"· RPCs: {_fmt_int(usage.get('rpcs'))}",
+                f"• Data read (est.): {_fmt_bytes(usage.get('bytes'))} · Time in Firestore calls: "
+                f"{_human_elapsed(usage.get('seconds'))}",
+            ]
+        )
+        by_method = usage.get("by_method") or {}
+        top_methods = sorted(by_method.items(), key=lambda kv: kv[1].get("reads") or 0, reverse=True)[:5]
+        for method, m in top_methods:
+            lines.append(
+                f"   - `{method}`: {_fmt_int(m.get('reads'))} reads, {_fmt_int(m.get('rpcs'))} RPCs, "
+                f"{_human_elapsed(m.get('seconds'))}"
+            )
+
     if gcp:
         file_updated_details = gcp.get('file_updated_details') or []
         lines.extend(
@@ -179,11 +212,17 @@ def format_org_progress_slack(
     if phase == "finished":
         u = (stats or {}).get("users") or {}
         r = (stats or {}).get("runs") or {}
+        usage = (stats or {}).get("firestore_usage") or {}
+        usage_s = (
+            f"\n• Firestore reads {_fmt_int(usage.get('reads'))} · {_fmt_int(usage.get('rpcs'))} RPCs"
+            if usage else ""
+        )
         return (
             f":white_check_mark: *Site finished* ({index}/{total}) · {elapsed}\n"
             f"• Dataset `{dataset_id}` · org `{org_id}`\n"
             f"• Users {_fmt_int(u.get('valid_users'))}/{_fmt_int(u.get('total'))} valid · "
             f"Runs {_fmt_int(r.get('valid_runs'))}/{_fmt_int(r.get('total'))} valid"
+            f"{usage_s}"
         )
     return f"*{phase}* ({index}/{total}) `{dataset_id}` / `{org_id}`"
 
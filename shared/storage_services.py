@@ -1,45 +1,172 @@
 from google.cloud import storage
+from google.cloud.storage.retry import DEFAULT_RETRY
+import codecs
+import gzip
+import hashlib
 import json
 import os
 import logging
+import tempfile
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator
 
 import settings
 from shared import utils
+from shared.parquet_export import iter_parquet_blocks, write_parquet
+from shared.table_partitions import PARTITIONED_TABLES, partition_table
+from shared.table_spool import DEFAULT_MEMORY_BUDGET_BYTES, SpooledTable, TableSpool
 
 logging.basicConfig(level=logging.INFO)
 
+# Custom metadata stamped on every exported table blob, so later runs can tell whether
+# a table changed from one metadata GET instead of downloading it.
+ROW_COUNT_METADATA_KEY = 'row_count'
+CONTENT_SHA256_METADATA_KEY = 'content_sha256'
+
+# Export format -> (table file extension, content type).
+EXPORT_FORMATS = {
+    'json': ('.json', 'application/json'),
+    'ndjson.gz': ('.ndjson.gz', 'application/gzip'),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+}
+NDJSON_GZIP_LEVEL = 6
+# Rows per block when previously exported tables are read back.
+READ_BLOCK_ROWS = 1024
+# Bytes read at a time while parsing a previously exported JSON array table.
+JSON_READ_CHUNK_BYTES = 1024 * 1024
+
+# GCS requires resumable upload chunks to be multiples of 256 KiB.
+_CHUNK_SIZE_MULTIPLE = 256 * 1024
+
 
 class StorageServices:
     storage_prefix = None
 
-    def __init__(self, cred, dataset_id: str, is_forced_uploading_redivis: bool = False):
+    def __init__(self, cred, dataset_id: str, is_forced_uploading_redivis: bool = False,
+                 upload_workers: int | None = None, export_format: str = 'json',
+                 is_partitioned_output: bool = False):
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format {export_format!r}; expected one of {sorted(EXPORT_FORMATS)}")
         self.storage_client = storage.Client(credentials=cred)
         # Use the canonical bucket name resolved at startup by utils.setup_project_environment().
         self.gcp_bucket = self.storage_client.bucket(settings.config['CORE_DATA_BUCKET_NAME'])
         self.dataset_id = dataset_id
         self.storage_prefix = f"{self.dataset_id}/"
+        self.export_format = export_format
+        self.table_extension, self.content_type = EXPORT_FORMATS[export_format]
         self.is_new_version_needed = is_forced_uploading_redivis
+        self.is_partitioned_output = is_partitioned_output
+        # Partitioned table -> its shard names in the last ``process``; shards uploaded in it;
+        # tables with a shard rewritten or removed.
+        self.partitions: dict[str, list[str]] = {}
+        self._partition_uploads: dict[str, list[str]] = {}
+        self._rebuilt_partitions: set[str] = set()
+        self.upload_workers = max(1, upload_workers or settings.config.get('GCS_UPLOAD_WORKERS', 1))
+        chunk_size = settings.config.get('GCS_UPLOAD_CHUNK_SIZE_BYTES') or 0
+        self.upload_chunk_size = max(_CHUNK_SIZE_MULTIPLE, chunk_size // _CHUNK_SIZE_MULTIPLE * _CHUNK_SIZE_MULTIPLE)
         self.upload_to_GCP_log = {
             'new_version_needed': False,
             'blob_file_counts': 0,
             'file_updated': [],
             'file_updated_details': [],
             'file_uploads_fail': [],
+            'file_uploads': [],
             'file_deletion': [],
         }
 
     def process(self, validated_data: dict):
+        """
+        Upload every changed table (every table when the new version is forced), up to
+        ``upload_workers`` tables at a time. Log entries keep the order of ``validated_data``.
+        With ``is_partitioned_output`` the tables of ``PARTITIONED_TABLES`` are split into
+        shards (``{table}/{shard}``) that are compared and uploaded one by one.
+        """
+        tables = []
+        spools = []
+        loose = {name: data for name, data in validated_data.items() if not isinstance(data, SpooledTable)}
+        if loose:
+            # Tables handed in as lists or ColumnTables are spooled too, so every table is
+            # encoded once: hashed while it is written, then uploaded from its file.
+            spool = TableSpool(encoder_cls=utils.CustomJSONEncoder,
+                               memory_budget_bytes=settings.config.get('SPOOL_MEMORY_BUDGET_BYTES',
+                                                                       DEFAULT_MEMORY_BUDGET_BYTES),
+                               directory=settings.config.get('SPOOL_DIR') or None)
+            spool.write_tables(loose)
+            spools.append(spool)
+            validated_data = {name: spool.get(name, data) for name, data in validated_data.items()}
         for table_name, data in validated_data.items():
-            if data and (not self.check_if_same_file(table_name=table_name,
-                                                     local_data_list=data) or self.is_new_version_needed):
-                self.save_to_storage(table_name=table_name, data=data)
-                self.is_new_version_needed = True
+            if self.is_partitioned_output and table_name in PARTITIONED_TABLES and data:
+                shards = partition_table(table_name, data)
+                spools.append(shards)
+                self.partitions[table_name] = list(shards)
+                tables.extend((f"{table_name}/{shard}", rows) for shard, rows in shards.items())
+            # Parquet files carry their schema, so empty tables are exported too (with no rows).
+            elif data or (self.export_format == 'parquet' and table_name != 'invalid_data'):
+                tables.append((table_name, data))
+        is_forced = self.is_new_version_needed
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(self.upload_workers, len(tables))),
+                                    thread_name_prefix="gcs-upload") as pool:
+                results = list(pool.map(lambda table: self._export_table(*table, is_forced=is_forced), tables))
+        finally:
+            for spool in spools:
+                spool.close()
+
+        for (table_name, _), (update_details, upload) in zip(tables, results):
+            if update_details:
+                self._log_file_update(update_details)
+            if upload is None:
+                continue
+            self.is_new_version_needed = True
+            if 'error' in upload:
+                self.upload_to_GCP_log['file_uploads_fail'].append(f"{table_name}, {upload['error']}")
+                continue
+            self.upload_to_GCP_log['file_uploads'].append(upload)
+            partitioned_table, _, shard = table_name.partition('/')
+            if shard:
+                self._partition_uploads.setdefault(partitioned_table, []).append(shard)
+                if update_details is None or not update_details['is_new']:
+                    self._rebuilt_partitions.add(partitioned_table)
 
         self.delete_unmatched_json_files(data=validated_data)
         self.upload_to_GCP_log['new_version_needed'] = self.is_new_version_needed
         self.upload_to_GCP_log['blob_file_counts'] = len(self.list_table_names_in_blob())
 
-    def upload_blob_from_memory(self, data, destination_blob_name, content_type):
+    def _export_table(self, table_name: str, data, is_forced: bool) -> tuple[dict | None, dict | None]:
+        """``(file_updated_details entry or None, upload stats / error or None if not uploaded)``."""
+        content_sha256 = self.serialize_table(data)
+        is_same, update_details = self._compare_with_blob(table_name, len(data), content_sha256)
+        if is_same and not is_forced:
+            return update_details, None
+        try:
+            return update_details, self._upload_table(table_name, data, content_sha256)
+        except Exception as e:
+            logging.error(f"Upload of {table_name} failed: {e}")
+            return update_details, {'table': table_name, 'error': str(e)}
+
+    def serialize_table(self, data: SpooledTable) -> str:
+        """
+        SHA-256 of a spooled table: of its JSON array text (``json``) or of its NDJSON text
+        (``ndjson.gz`` and ``parquet``, before compression or conversion). Both are computed
+        while the table is written to the spool, so hashing encodes nothing again.
+        """
+        return data.content_sha256() if self.export_format == 'json' else data.ndjson_sha256()
+
+    def table_blob_name(self, table_name: str) -> str:
+        return f"{self.dataset_id}/{table_name}{self.table_extension}"
+
+    def _new_blob(self, destination_blob_name: str, size: int, metadata: dict | None):
+        blob = self.gcp_bucket.blob(destination_blob_name)
+        blob.metadata = metadata
+        if size > self.upload_chunk_size:
+            # Resumable upload in chunks: a failed chunk is retried from the last committed offset.
+            blob.chunk_size = self.upload_chunk_size
+        return blob
+
+    def upload_blob_from_memory(self, data, destination_blob_name, content_type, metadata: dict | None = None):
         """
             Uploads a file from memory to Google Cloud Storage.
 
@@ -48,57 +175,206 @@ class StorageServices:
             - data (bytes or str): Data to upload.
             - destination_blob_name (str): Desired name for the file in the bucket.
             - content_type (str): Content type of the file (e.g., 'application/json', 'text/csv').
+            - metadata (dict): Custom metadata stored with the object.
             """
+        if isinstance(data, str):
+            data = data.encode('utf-8')
         # Create a blob object
-        blob = self.gcp_bucket.blob(destination_blob_name)
+        blob = self._new_blob(destination_blob_name, len(data), metadata)
 
         # Upload the file
-        blob.upload_from_string(data, content_type=content_type)
+        blob.upload_from_string(data, content_type=content_type, retry=DEFAULT_RETRY)
 
-    def check_if_same_file(self, table_name, local_data_list):
-        blob = self.gcp_bucket.blob(f"{self.dataset_id}/{table_name}.json")
-        local_count = len(local_data_list)
+    def _compare_with_blob(self, table_name: str, local_count: int,
+                           content_sha256: str | None) -> tuple[bool, dict | None]:
+        """``(is_same, file_updated_details entry if not)`` for ``check_if_same_file``."""
+        blob = self.gcp_bucket.get_blob(self.table_blob_name(table_name))
 
-        if not blob.exists():
-            logging.info(f"creating_{self.dataset_id}/{table_name}.json")
-            self.upload_to_GCP_log['file_updated'].append(
-                f"{table_name}(gcs/local): new/{local_count}")
-            self.upload_to_GCP_log['file_updated_details'].append({
+        if blob is None:
+            logging.info(f"creating_{self.table_blob_name(table_name)}")
+            return False, {
                 'table': table_name,
                 'before': None,
                 'after': local_count,
                 'delta': local_count,
                 'is_new': True,
-            })
-            return False
-
-        # Download the JSON content from GCS into memory as a string
-        gcs_json_string = blob.download_as_text()
-        gcs_json_data = json.loads(gcs_json_string)
-        gcs_count = len(gcs_json_data)
-
-        is_same_length = gcs_count == local_count
-        if not is_same_length:
-            self.upload_to_GCP_log['file_updated'].append(
-                f"{table_name}(gcs/local): {gcs_count}/{local_count}")
-            self.upload_to_GCP_log['file_updated_details'].append({
-                'table': table_name,
-                'before': gcs_count,
-                'after': local_count,
-                'delta': local_count - gcs_count,
-                'is_new': False,
-            })
-        return is_same_length
-
-    def save_to_storage(self, table_name: str, data):
-        data_json = json.dumps(data, cls=utils.CustomJSONEncoder)
-        destination_blob_name = f"{self.dataset_id}/{table_name}.json"
+            }
+
+        metadata = blob.metadata or {}
+        gcs_sha256 = metadata.get(CONTENT_SHA256_METADATA_KEY)
+        is_stamped = ROW_COUNT_METADATA_KEY in metadata and bool(gcs_sha256)
+        if is_stamped:
+            gcs_count = int(metadata[ROW_COUNT_METADATA_KEY])
+        else:
+            # Blobs exported before tables were stamped (Parquet files always are): download
+            # the content from GCS into memory.
+            content = self._decode_blob_bytes(blob.download_as_bytes())
+            gcs_sha256 = hashlib.sha256(content).hexdigest()
+            gcs_count = content.count(b"\n") if self.export_format == 'ndjson.gz' else len(json.loads(content))
+
+        is_same = gcs_count == local_count and (content_sha256 is None or gcs_sha256 == content_sha256)
+        if is_same and not is_stamped and gcs_sha256:
+            # Stamp the unchanged legacy blob so the next run only reads its metadata.
+            try:
+                blob.metadata = {**metadata, ROW_COUNT_METADATA_KEY: str(gcs_count),
+                                 CONTENT_SHA256_METADATA_KEY: gcs_sha256}
+                blob.patch()
+            except Exception as e:
+                logging.warning(f"Could not stamp metadata on {blob.name}: {e}")
+        if is_same:
+            return True, None
+        return False, {
+            'table': table_name,
+            'before': gcs_count,
+            'after': local_count,
+            'delta': local_count - gcs_count,
+            'is_new': False,
+        }
+
+    def _log_file_update(self, details: dict):
+        before = 'new' if details['is_new'] else details['before']
+        self.upload_to_GCP_log['file_updated'].append(f"{details['table']}(gcs/local): {before}/{details['after']}")
+        self.upload_to_GCP_log['file_updated_details'].append(details)
+
+    def check_if_same_file(self, table_name, local_data_list, content_sha256: str | None = None):
+        """
+        Whether ``local_data_list`` matches the exported blob of ``table_name``: same content
+        hash when both are known, otherwise the same row count. Reads only the blob's
+        metadata; blobs exported before it was stamped are downloaded once to compare.
+        """
+        is_same, update_details = self._compare_with_blob(table_name, len(local_data_list), content_sha256)
+        if update_details:
+            self._log_file_update(update_details)
+        return is_same
+
+    def _decode_blob_bytes(self, data: bytes) -> bytes:
+        """Uncompressed content of a table blob in this export format."""
+        return gzip.decompress(data) if self.export_format == 'ndjson.gz' else data
+
+    def iter_table_blocks(self, table_name: str) -> Iterator[list]:
+        """
+        Previously exported rows of ``table_name`` in blocks of at most ``READ_BLOCK_ROWS``
+        (none if the table is not in the bucket), from whichever export format the table was
+        last written in, as one file or as shards. Newline-delimited and Parquet files are
+        streamed; a JSON array is decoded one file (or shard) at a time.
+        """
+        blobs = []
+        for extension, _ in EXPORT_FORMATS.values():
+            blob = self.gcp_bucket.blob(f"{self.dataset_id}/{table_name}{extension}")
+            if blob.exists():
+                blobs = [(extension, blob)]
+                break
+        else:
+            if table_name in PARTITIONED_TABLES:
+                for blob in self.storage_client.list_blobs(settings.config['CORE_DATA_BUCKET_NAME'],
+                                                           prefix=f"{self.storage_prefix}{table_name}/"):
+                    extension = next((ext for ext, _ in EXPORT_FORMATS.values() if blob.name.endswith(ext)), None)
+                    if extension is not None:
+                        blobs.append((extension, blob))
+        for extension, blob in blobs:
+            yield from self._iter_blob_blocks(extension, blob)
+
+    @staticmethod
+    def _iter_blob_blocks(extension: str, blob) -> Iterator[list]:
+        if extension == '.ndjson.gz':
+            with blob.open("rb") as raw, gzip.open(raw, "rb") as f:
+                lines = (line for line in f if line.strip())
+                while block := [json.loads(line) for line in islice(lines, READ_BLOCK_ROWS)]:
+                    yield block
+        elif extension == '.parquet':
+            with tempfile.TemporaryFile(dir=settings.config.get('SPOOL_DIR') or None) as f:
+                blob.download_to_file(f)
+                f.seek(0)
+                yield from iter_parquet_blocks(f, block_rows=READ_BLOCK_ROWS)
+        else:
+            with blob.open("rb") as f:
+                rows = json_array_rows(f)
+                while block := list(islice(rows, READ_BLOCK_ROWS)):
+                    yield block
+
+    def load_table_blocks(self) -> dict:
+        """
+        Every previously exported table of this dataset, ``table name -> row blocks`` as
+        yielded by ``iter_table_blocks``; nothing is downloaded until a table is iterated.
+        """
+        return {table_name: self.iter_table_blocks(table_name)
+                for table_name in dict.fromkeys(self.list_table_names_in_blob())}
+
+    def upload_blob_from_spool(self, table: SpooledTable, destination_blob_name, metadata: dict | None = None):
+        """Streams a spooled table to GCS as a JSON array, straight from its local file."""
+        size = table.json_array_size()
+        blob = self._new_blob(destination_blob_name, size, metadata)
+        with table.open_json_array() as f:
+            blob.upload_from_file(f, size=size, content_type='application/json', retry=DEFAULT_RETRY)
+
+    def upload_blob_from_spool_ndjson_gz(self, table: SpooledTable, destination_blob_name,
+                                         metadata: dict | None = None) -> int:
+        """
+        Gzips a spooled table's newline-delimited file chunk by chunk into a file next to it
+        and uploads that; returns the compressed size.
+        """
+        gz_path = f"{table.path}.gz"
         try:
-            self.upload_blob_from_memory(data=data_json,
-                                    destination_blob_name=destination_blob_name,
-                                    content_type='application/json')
-        except Exception as e:
-            self.upload_to_GCP_log['file_uploads_fail'].append(f"{table_name}, {e}")
+            with table.open_ndjson() as src, open(gz_path, "wb") as dst:
+                for block in gzip_blocks(iter(lambda: src.read(1024 * 1024), b"")):
+                    dst.write(block)
+            size = os.path.getsize(gz_path)
+            blob = self._new_blob(destination_blob_name, size, metadata)
+            with open(gz_path, "rb") as f:
+                blob.upload_from_file(f, size=size, content_type=self.content_type, retry=DEFAULT_RETRY)
+            return size
+        finally:
+            if os.path.exists(gz_path):
+                os.remove(gz_path)
+
+    def upload_blob_parquet(self, table_name: str, data, destination_blob_name,
+                            metadata: dict | None = None) -> int:
+        """
+        Writes a table to a local Parquet file (next to its spool file for spooled tables)
+        and uploads that; returns the file size.
+        """
+        if isinstance(data, SpooledTable):
+            path = f"{data.path}.parquet"
+        else:
+            fd, path = tempfile.mkstemp(suffix='.parquet', dir=settings.config.get('SPOOL_DIR') or None)
+            os.close(fd)
+        try:
+            write_parquet(table_name.split('/')[0], data, path,
+                          compression=settings.config.get('PARQUET_COMPRESSION') or 'snappy')
+            size = os.path.getsize(path)
+            blob = self._new_blob(destination_blob_name, size, metadata)
+            with open(path, "rb") as f:
+                blob.upload_from_file(f, size=size, content_type=self.content_type, retry=DEFAULT_RETRY)
+            return size
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _upload_table(self, table_name: str, data, content_sha256: str) -> dict:
+        """Upload one table with its metadata; returns its size, duration and throughput."""
+        metadata = {
+            ROW_COUNT_METADATA_KEY: str(len(data)),
+            CONTENT_SHA256_METADATA_KEY: content_sha256,
+        }
+        destination_blob_name = self.table_blob_name(table_name)
+        started = time.perf_counter()
+        if self.export_format == 'parquet':
+            size = self.upload_blob_parquet(table_name, data, destination_blob_name, metadata=metadata)
+        elif self.export_format == 'ndjson.gz':
+            size = self.upload_blob_from_spool_ndjson_gz(table=data, destination_blob_name=destination_blob_name,
+                                                         metadata=metadata)
+        else:
+            size = data.json_array_size()
+            self.upload_blob_from_spool(table=data, destination_blob_name=destination_blob_name,
+                                        metadata=metadata)
+        seconds = time.perf_counter() - started
+        return {
+            'table': table_name,
+            'bytes': size,
+            'seconds': round(seconds, 3),
+            'mb_per_second': round(size / (1024 * 1024) / seconds, 2) if seconds > 0 else None,
+            'resumable': size > self.upload_chunk_size,
+        }
 
     def append_list_to_json_in_gcp(self, data: dict, file_name: str):
         # Initialize the GCP Storage client
@@ -133,35 +409,124 @@ class StorageServices:
 
     def list_table_names_in_blob(self):
         table_names = self.list_blobs_with_prefix()
-        return [name.split('/')[-1].split('.')[0] for name in table_names]
+        # Shards ({table}/{shard}.json) count under their table.
+        return [name[len(self.storage_prefix):].split('/')[0].split('.')[0] for name in table_names]
+
+    def partitioned_table_of(self, blob_name: str) -> str | None:
+        """Table a shard file belongs to, or None for a whole-table file."""
+        table_name, is_shard, _ = blob_name.removeprefix(self.storage_prefix).partition('/')
+        return table_name if is_shard and table_name in PARTITIONED_TABLES else None
+
+    def redivis_partition_uploads(self) -> list[tuple[str, str]]:
+        """
+        ``(file name, upload merge strategy)`` of the shard files to attach to Redivis after
+        ``process``. Redivis replaces or appends whole tables, so a table that only gained
+        shards appends those, and a table with a rewritten or removed shard is rebuilt from
+        all of its shards (the first replaces the table, the rest append).
+        """
+        uploads = []
+        for table_name, shards in self.partitions.items():
+            is_rebuilt = table_name in self._rebuilt_partitions
+            names = sorted(shards if is_rebuilt else self._partition_uploads.get(table_name, []))
+            for index, shard in enumerate(names):
+                strategy = 'replace' if is_rebuilt and index == 0 else 'append'
+                uploads.append((self.table_blob_name(f"{table_name}/{shard}"), strategy))
+        return uploads
 
     def delete_unmatched_json_files(self, data):
+        """
+        Delete table files of tables not in ``data``, files a table still has in another
+        export format than the one it was just written in, and whole-table files or shards
+        left over from the other layout or from shards that are gone.
+        """
         # List all blobs in the specified bucket and folder
         blobs = self.gcp_bucket.list_blobs(prefix=self.storage_prefix)
 
         # Iterate through each blob in the folder
         for blob in blobs:
-            # Extract the file name from the blob's name
-            file_name = blob.name.split('/')[-1]
-            # Check if the file is a .json file
-            if file_name.endswith('.json'):
-                # Extract the key from the file name (assuming format 'xxx.json')
-                key = file_name.split('.')[0]
-                # Check if the key is not in the dictionary's keys
-                if key not in data:
-                    # Delete the file
-                    try:
-                        blob.delete()
-                        logging.info(f'{file_name}_deleted_from_{self.dataset_id}')
-                        self.upload_to_GCP_log['file_deletion'].append(f'{file_name}')
-                    except Exception as e:
-                        logging.info(f'{file_name}_deleted_from_{self.dataset_id}_failed, {str(e)}')
-                        self.upload_to_GCP_log['file_deletion'].append(f'{file_name}_failed, {str(e)}')
+            # Extract the file name from the blob's name ('xxx.json' or, for shards, 'xxx/shard.json')
+            file_name = blob.name.removeprefix(self.storage_prefix)
+            extension = next((ext for ext, _ in EXPORT_FORMATS.values() if file_name.endswith(ext)), None)
+            partitioned_table = self.partitioned_table_of(blob.name)
+            if extension is not None and partitioned_table is not None:
+                shard = file_name.split('/', 1)[1][:-len(extension)]
+                is_unmatched = (partitioned_table not in self.partitions or extension != self.table_extension
+                                or shard not in self.partitions[partitioned_table])
+                if is_unmatched and partitioned_table in self.partitions:
+                    self._rebuilt_partitions.add(partitioned_table)
+            elif extension is not None:
+                # Extract the key from the file name (assuming format 'xxx.json' / 'xxx.ndjson.gz' / 'xxx.parquet')
+                key = file_name.split('/')[-1].split('.')[0]
+                # Check if the key is not in the dictionary's keys, the table moved to this format,
+                # or it is written as shards now
+                is_unmatched = key not in data or key in self.partitions or (
+                    extension != self.table_extension and (data[key] or self.export_format == 'parquet'))
+                if key in self.partitions:
+                    self._rebuilt_partitions.add(key)
+            else:
+                is_unmatched = False
+            if is_unmatched:
+                # Delete the file
+                try:
+                    blob.delete()
+                    logging.info(f'{file_name}_deleted_from_{self.dataset_id}')
+                    self.upload_to_GCP_log['file_deletion'].append(f'{file_name}')
+                except Exception as e:
+                    logging.info(f'{file_name}_deleted_from_{self.dataset_id}_failed, {str(e)}')
+                    self.upload_to_GCP_log['file_deletion'].append(f'{file_name}_failed, {str(e)}')
 
     def check_and_delete_single_table(self, table_name):
         """Deletes a blob from the bucket."""
-        blob = self.gcp_bucket.blob(f"{self.dataset_id}/{table_name}.json")
+        blob = self.gcp_bucket.blob(self.table_blob_name(table_name))
         if blob.exists():
             blob.delete()
             logging.info(f"Blob {self.dataset_id}/{table_name} deleted.")
 
+
+
+def json_array_rows(f, chunk_size: int = JSON_READ_CHUNK_BYTES) -> Iterator:
+    """
+    Elements of the JSON array in the binary file ``f``, decoded one at a time from
+    ``chunk_size`` reads so the whole array is never held in memory.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer, pos, eof, opened = "", 0, False, False
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        value, end = None, None
+        if pos < len(buffer):
+            if not opened:
+                if buffer[pos] != "[":
+                    raise ValueError("Expected a JSON array")
+                opened, pos = True, pos + 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            # A value running to the end of the buffer may continue in the next chunk.
+            if end is not None and (end < len(buffer) or eof):
+                yield value
+                pos = end
+                continue
+        elif eof:
+            if opened:
+                raise ValueError("Unterminated JSON array")
+            return
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + utf8.decode(chunk, final=eof), 0
+
+
+def gzip_blocks(blocks: Iterable[bytes]) -> Iterator[bytes]:
+    """``blocks`` compressed into one gzip stream."""
+    compressor = zlib.compressobj(NDJSON_GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+    for block in blocks:
+        if compressed := compressor.compress(block):
+            yield compressed
+    yield compressor.flush()
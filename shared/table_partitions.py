@@ -0,0 +1,102 @@
+"""
+Partitioned output for the large fact tables.
+
+With ``DatasetParameters.is_partitioned_output`` the ``trials``, ``runs`` and
+``survey_responses`` tables are exported as one file per shard,
+``{dataset_id}/{table}/{shard}{ext}``, instead of one file per table. A shard holds
+the rows of one task in one calendar month (``egma-math_2024-05``; survey responses
+have no task and are sharded by month only), so a daily run only changes the shards
+of the months it saw new activity in. Each shard is hashed and compared on its own,
+so only changed shards are uploaded to GCS.
+
+Redivis ingestion is not reduced the same way: a Redivis table can only be replaced
+or appended to, so a table whose existing shard changed (the current month's, on
+most days) is re-ingested from all of its shards; see
+``StorageServices.redivis_partition_uploads``.
+
+Rows keep their order within a shard. The sentinel ``schema_row`` of a table gets
+a shard of its own.
+"""
+from __future__ import annotations
+
+import re
+from datetime import datetime
+from itertools import islice
+
+from shared.table_spool import SpooledTable, TableSpool
+from shared.table_store import ColumnTable
+
+# table -> (task column or None, timestamp column the month is taken from)
+PARTITIONED_TABLES = {
+    "trials": ("task_id", "server_timestamp"),
+    "runs": ("task_id", "time_started"),
+    "survey_responses": (None, "timestamp"),
+}
+
+# Shard of the sentinel row added by utils.append_schema_rows_to_validated_data.
+SCHEMA_ROW_PARTITION = "schema_row"
+UNDATED_PARTITION = "undated"
+
+# Rows read from a spooled table per block while splitting it.
+PARTITION_BLOCK_ROWS = 8192
+
+_UNSAFE_NAME_CHARS = re.compile(r"[^A-Za-z0-9_-]+")
+
+
+def _month(value) -> str:
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m")
+    if isinstance(value, str) and len(value) >= 7 and value[4] == "-":
+        # Spooled rows carry datetimes as the ISO strings they were written as.
+        return value[:7]
+    return UNDATED_PARTITION
+
+
+def _key_columns(table_name: str) -> tuple[str, str]:
+    task_column, time_column = PARTITIONED_TABLES[table_name]
+    # Without a task column the sentinel row is recognized by its survey id.
+    return task_column or "survey_id", time_column
+
+
+def _partition(table_name: str, key, timestamp) -> str:
+    if key == SCHEMA_ROW_PARTITION:
+        return SCHEMA_ROW_PARTITION
+    if PARTITIONED_TABLES[table_name][0] is None:
+        return _month(timestamp)
+    task = _UNSAFE_NAME_CHARS.sub("_", str(key)) if key else "no_task"
+    return f"{task}_{_month(timestamp)}"
+
+
+def partition_name(table_name: str, row: dict) -> str:
+    """Shard of ``row`` in ``table_name``."""
+    key_column, time_column = _key_columns(table_name)
+    return _partition(table_name, row.get(key_column), row.get(time_column))
+
+
+def partition_table(table_name: str, rows) -> dict:
+    """
+    ``shard name -> rows`` of a partitioned table, in the container type it came in:
+    ColumnTables are split with ``take``, spooled tables into a new ``TableSpool`` next
+    to theirs (close it when done), anything else into lists of rows.
+    """
+    if isinstance(rows, ColumnTable):
+        key_column, time_column = _key_columns(table_name)
+        indices = {}
+        for index, (key, timestamp) in enumerate(zip(rows.column(key_column), rows.column(time_column))):
+            indices.setdefault(_partition(table_name, key, timestamp), []).append(index)
+        return {name: rows.take(shard_indices) for name, shard_indices in indices.items()}
+    if isinstance(rows, SpooledTable):
+        shards = TableSpool(encoder_cls=type(rows.spool.encoder),
+                            memory_budget_bytes=rows.spool.memory_budget_bytes,
+                            directory=rows.spool.directory)
+        rows = iter(rows)
+        while block := list(islice(rows, PARTITION_BLOCK_ROWS)):
+            grouped = {}
+            for row in block:
+                grouped.setdefault(partition_name(table_name, row), []).append(row)
+            shards.write_tables(grouped)
+        return shards
+    partitions = {}
+    for row in rows:
+        partitions.setdefault(partition_name(table_name, row), []).append(row)
+    return partitions
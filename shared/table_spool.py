@@ -0,0 +1,219 @@
+"""
+Disk-backed spool for exported tables.
+
+Every org's validated tables are written into a ``TableSpool`` as soon as the org is
+done, instead of being concatenated in memory. Rows are JSON-encoded on write and
+kept in small in-memory buffers; once the buffers of all tables together exceed
+the memory budget they are appended to one newline-delimited file per table in a
+temporary directory (``SPOOL_DIR`` when set). Tables with a dedupe key drop rows
+whose key was already written (first occurrence wins).
+
+A ``SpooledTable`` can be read back row by row, and streamed as the JSON array
+the exports use (``"[" + ", ".join(rows) + "]"``, i.e. byte-identical to
+``json.dumps(rows)``) or as its newline-delimited file straight from disk to GCS.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+import tempfile
+from typing import Iterable, Iterator
+
+from shared.table_store import ColumnTable
+
+DEFAULT_MEMORY_BUDGET_BYTES = 64 * 1024 * 1024
+# Buffered bytes are checked against the budget at least this often while writing.
+ACCOUNT_EVERY_BYTES = 1024 * 1024
+
+
+class SpooledTable:
+    """Rows of one table: a newline-delimited JSON file plus a not yet flushed buffer."""
+
+    def __init__(self, spool: "TableSpool", name: str, dedupe_key: str | None = None):
+        self.spool = spool
+        self.name = name
+        self.dedupe_key = dedupe_key
+        self.path = os.path.join(spool.directory, f"{name}.ndjson")
+        self.row_count = 0
+        self.file_bytes = 0
+        self._seen = set() if dedupe_key else None
+        # Every key a written row had.
+        self.columns: set[str] = set()
+        self._buffer: list[str] = []
+        self._buffered_bytes = 0
+        # SHA-256 of the JSON array form, fed as rows are flushed (``content_sha256`` closes it),
+        # and of the newline-delimited file itself.
+        self._sha256 = hashlib.sha256(b"[")
+        self._hashed_rows = False
+        self._ndjson_sha256 = hashlib.sha256()
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    def __iter__(self) -> Iterator[dict]:
+        # Rows come back as decoded JSON (datetimes as the ISO strings they were written as).
+        for line in self.iter_json():
+            yield json.loads(line)
+
+    def __repr__(self):
+        return f"SpooledTable({self.name!r}, rows={self.row_count})"
+
+    def append(self, row: dict):
+        self.extend([row])
+
+    def extend(self, rows: Iterable[dict]):
+        seen = self._seen
+        if isinstance(rows, ColumnTable):
+            self.columns.update(rows.column_names())
+            if seen is not None:
+                keys = rows.column(self.dedupe_key)
+        else:
+            rows = list(rows)
+            for row in rows:
+                self.columns.update(row)
+            if seen is not None:
+                keys = [row.get(self.dedupe_key) for row in rows]
+        encode = self.spool.encoder.encode
+        ascii_only = self.spool.encoder.ensure_ascii
+        added = 0
+        for index, row in enumerate(rows):
+            if seen is not None:
+                if keys[index] in seen:
+                    continue
+                seen.add(keys[index])
+            line = encode(row)
+            self._buffer.append(line)
+            added += (len(line) if ascii_only else len(line.encode("utf-8"))) + 1
+            self.row_count += 1
+            if added >= ACCOUNT_EVERY_BYTES:
+                self._account(added)
+                added = 0
+        self._account(added)
+
+    def _account(self, added: int):
+        self._buffered_bytes += added
+        self.spool._buffered(added)
+
+    def flush(self):
+        if not self._buffer:
+            return
+        text = "\n".join(self._buffer) + "\n"
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(text)
+        self._ndjson_sha256.update(text.encode("utf-8"))
+        self._sha256.update(((", " if self._hashed_rows else "") + ", ".join(self._buffer)).encode("utf-8"))
+        self._hashed_rows = True
+        self.file_bytes += self._buffered_bytes
+        self.spool._buffered(-self._buffered_bytes)
+        self._buffer = []
+        self._buffered_bytes = 0
+
+    def iter_json(self) -> Iterator[str]:
+        """The JSON text of every row, in write order."""
+        self.flush()
+        if not self.row_count:
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                yield line[:-1]
+
+    def json_array_size(self) -> int:
+        """Size in bytes of ``open_json_array()``'s content."""
+        self.flush()
+        # Every "\n" row terminator becomes ", " (the last one "]"), plus the "[".
+        return self.file_bytes + self.row_count if self.row_count else 2
+
+    def content_sha256(self) -> str:
+        """Hex SHA-256 of ``open_json_array()``'s content."""
+        self.flush()
+        sha256 = self._sha256.copy()
+        sha256.update(b"]")
+        return sha256.hexdigest()
+
+    def ndjson_sha256(self) -> str:
+        """Hex SHA-256 of ``open_ndjson()``'s content."""
+        self.flush()
+        return self._ndjson_sha256.hexdigest()
+
+    def open_ndjson(self) -> io.BufferedIOBase:
+        """Readable binary stream of the rows as newline-delimited JSON (one row per line)."""
+        self.flush()
+        return open(self.path, "rb") if self.row_count else io.BytesIO(b"")
+
+    def open_json_array(self) -> io.BufferedReader:
+        """Readable binary stream of the rows as one JSON array, read from disk."""
+        self.flush()
+        return io.BufferedReader(_JsonArrayReader(self.path if self.row_count else None), buffer_size=1024 * 1024)
+
+
+class _JsonArrayReader(io.RawIOBase):
+    """Turns a newline-delimited JSON file into ``[row, row, ...]`` while reading."""
+
+    def __init__(self, path: str | None):
+        self._file = open(path, "rb") if path else None
+        self._pending = b"["
+        self._first = True
+        self._done = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending and not self._done:
+            line = self._file.readline() if self._file else b""
+            if not line:
+                self._pending, self._done = b"]", True
+            else:
+                self._pending = (b"" if self._first else b", ") + line.rstrip(b"\n")
+                self._first = False
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def close(self):
+        if self._file:
+            self._file.close()
+        super().close()
+
+
+class TableSpool(dict):
+    """
+    ``table name -> SpooledTable``, written through ``write_tables``. Behaves like the
+    ``validated_data`` dict it replaces; the files are removed by ``close()`` (or when
+    the spool is garbage collected).
+    """
+
+    def __init__(self, *, dedupe_keys: dict | None = None, encoder_cls: type[json.JSONEncoder] | None = None,
+                 memory_budget_bytes: int = DEFAULT_MEMORY_BUDGET_BYTES, directory: str | None = None):
+        super().__init__()
+        self.dedupe_keys = dict(dedupe_keys or {})
+        self.encoder = (encoder_cls or json.JSONEncoder)()
+        self.memory_budget_bytes = memory_budget_bytes
+        self._tmp = tempfile.TemporaryDirectory(prefix="table-spool-", dir=directory)
+        self.directory = self._tmp.name
+        self._buffered_bytes = 0
+
+    def table(self, name: str) -> SpooledTable:
+        table = self.get(name)
+        if table is None:
+            table = self[name] = SpooledTable(self, name, self.dedupe_keys.get(name))
+        return table
+
+    def write_tables(self, tables: dict):
+        """Append every table of ``tables`` (e.g. one org's validated data)."""
+        for name, rows in tables.items():
+            self.table(name).extend(rows)
+
+    def _buffered(self, delta: int):
+        self._buffered_bytes += delta
+        if self._buffered_bytes > self.memory_budget_bytes:
+            for table in self.values():
+                if isinstance(table, SpooledTable):
+                    table.flush()
+
+    def close(self):
+        self.clear()
+        self._tmp.cleanup()
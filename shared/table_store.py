@@ -0,0 +1,267 @@
+"""
+Columnar storage for exported tables.
+
+A ``ColumnTable`` keeps the rows of one table (``trials``, ``runs``, ...) column by
+column instead of as a list of dicts. Columns whose model field is ``int``,
+``float`` or ``bool`` live in typed ``array.array`` buffers with a null mask;
+every other column is a plain list in which repeated strings (user ids, run ids,
+task ids, stages) share a single object.
+
+The table still behaves like the list of row dicts it replaces: ``len``,
+iteration, indexing and ``append`` / ``extend`` all work on dict rows, and
+rows come back with exactly the keys, key order and values they were appended
+with, so JSON written from a table is byte-identical to JSON written from the
+list.
+"""
+from __future__ import annotations
+
+import types
+from array import array
+from itertools import islice
+from typing import Any, Iterable, Iterator, Union, get_args, get_origin
+
+# Rows rebuilt per block while iterating.
+ITER_BLOCK_SIZE = 1024
+
+# Object columns stop interning once they hold this many distinct strings.
+MAX_INTERNED_PER_COLUMN = 200_000
+
+_TYPECODES = {"int": "q", "float": "d", "bool": "b"}
+_PYTHON_TYPES = {"int": int, "float": float, "bool": bool}
+
+
+def column_kind(annotation: Any) -> str:
+    """Storage kind ("int", "float", "bool" or "object") for a model field annotation."""
+    if get_origin(annotation) in (Union, types.UnionType):
+        args = [a for a in get_args(annotation) if a is not type(None)]
+        annotation = args[0] if len(args) == 1 else Any
+    if annotation is bool:
+        return "bool"
+    if annotation is int:
+        return "int"
+    if annotation is float:
+        return "float"
+    return "object"
+
+
+class _Column:
+    """One column; typed kinds fall back to "object" on the first value that does not fit."""
+
+    __slots__ = ("kind", "values", "mask", "_interned")
+
+    def __init__(self, kind: str, length: int = 0):
+        self.kind = kind
+        self._interned = {}
+        if kind == "object":
+            self.values = [None] * length
+            self.mask = None
+        else:
+            self.values = array(_TYPECODES[kind], bytes(array(_TYPECODES[kind]).itemsize * length))
+            self.mask = bytearray(length)
+
+    def extend_values(self, values: list):
+        if self.kind == "object":
+            interned = self._interned
+            if interned is not None:
+                values = [interned.setdefault(v, v) if type(v) is str else v for v in values]
+                if len(interned) > MAX_INTERNED_PER_COLUMN:
+                    self._interned = None
+            self.values.extend(values)
+            return
+        python_type = _PYTHON_TYPES[self.kind]
+        if all(v is None or type(v) is python_type for v in values):
+            try:
+                # Built first so an overflow leaves the column untouched.
+                typed = array(self.values.typecode, [0 if v is None else v for v in values])
+            except OverflowError:
+                typed = None
+            if typed is not None:
+                self.values.extend(typed)
+                self.mask.extend(bytes(v is not None for v in values))
+                return
+        self._to_object()
+        self.extend_values(values)
+
+    def extend(self, other: "_Column"):
+        if self.kind == other.kind and self.kind != "object":
+            self.values.extend(other.values)
+            self.mask.extend(other.mask)
+            return
+        if self.kind != "object":
+            self._to_object()
+        self.values.extend(other.slice(0, len(other)))
+
+    def _to_object(self):
+        self.values = self.slice(0, len(self))
+        self.mask = None
+        self.kind = "object"
+        self._interned = None
+
+    def __getstate__(self):
+        # The intern table is only an append-time saving; do not ship it with the column.
+        return self.kind, self.values, self.mask
+
+    def __setstate__(self, state):
+        self.kind, self.values, self.mask = state
+        self._interned = None
+
+    def __len__(self):
+        return len(self.values)
+
+    def slice(self, start: int, stop: int) -> list:
+        if self.kind == "object":
+            return self.values[start:stop]
+        values = self.values[start:stop].tolist()
+        if self.kind == "bool":
+            return [bool(v) if m else None for v, m in zip(values, self.mask[start:stop])]
+        return [v if m else None for v, m in zip(values, self.mask[start:stop])]
+
+    def take(self, indices: list) -> "_Column":
+        column = _Column(self.kind)
+        if self.kind == "object":
+            values = self.values
+            column.values = [values[i] for i in indices]
+            column._interned = None
+        else:
+            values, mask = self.values, self.mask
+            column.values = array(values.typecode, [values[i] for i in indices])
+            column.mask = bytearray(mask[i] for i in indices)
+        return column
+
+
+class ColumnTable:
+    """
+    Rows of one table stored column by column.
+
+    Columns come from ``kinds`` (name -> storage kind, usually from a pydantic
+    model via ``for_model``); keys not declared up front become object columns
+    when first seen. Each row also records its key layout so missing keys and
+    key order survive the round trip.
+    """
+
+    def __init__(self, kinds: dict[str, str] | None = None):
+        self._kinds = dict(kinds or {})
+        self._columns: dict[str, _Column] = {}
+        self._layouts: list[tuple] = []
+        self._layout_ids: dict[tuple, int] = {}
+        self._row_layouts = array("i")
+
+    @classmethod
+    def for_model(cls, model_cls) -> "ColumnTable":
+        fields = getattr(model_cls, "model_fields", {}) or {}
+        return cls({name: column_kind(field.annotation) for name, field in fields.items()})
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[dict], kinds: dict[str, str] | None = None) -> "ColumnTable":
+        table = cls(kinds)
+        table.extend(rows)
+        return table
+
+    def empty_like(self) -> "ColumnTable":
+        return ColumnTable(self._kinds)
+
+    # list-of-rows interface
+
+    def __len__(self) -> int:
+        return len(self._row_layouts)
+
+    def __iter__(self) -> Iterator[dict]:
+        n = len(self)
+        for start in range(0, n, ITER_BLOCK_SIZE):
+            stop = min(start + ITER_BLOCK_SIZE, n)
+            block = {name: column.slice(start, stop) for name, column in self._columns.items()}
+            layouts = self._layouts
+            for j, layout_id in enumerate(self._row_layouts[start:stop]):
+                yield {key: block[key][j] for key in layouts[layout_id]}
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.take(range(*index.indices(len(self))))
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError("ColumnTable index out of range")
+        return {key: self._columns[key].slice(index, index + 1)[0]
+                for key in self._layouts[self._row_layouts[index]]}
+
+    def __repr__(self):
+        return f"ColumnTable(rows={len(self)}, columns={list(self._columns)})"
+
+    def _column(self, name: str) -> _Column:
+        column = self._columns.get(name)
+        if column is None:
+            column = _Column(self._kinds.get(name, "object"), len(self))
+            self._columns[name] = column
+        return column
+
+    def _layout_id(self, layout: tuple) -> int:
+        layout_id = self._layout_ids.get(layout)
+        if layout_id is None:
+            layout_id = self._layout_ids[layout] = len(self._layouts)
+            self._layouts.append(layout)
+            for key in layout:
+                self._column(key)
+        return layout_id
+
+    def append(self, row: dict):
+        self._append_rows([row])
+
+    def extend(self, rows: Iterable[dict]):
+        if isinstance(rows, ColumnTable):
+            self._extend_table(rows)
+            return
+        rows = iter(rows)
+        while block := list(islice(rows, ITER_BLOCK_SIZE)):
+            self._append_rows(block)
+
+    def _append_rows(self, rows: list[dict]):
+        layout_ids = [self._layout_id(tuple(row)) for row in rows]
+        for name, column in self._columns.items():
+            column.extend_values([row.get(name) for row in rows])
+        self._row_layouts.extend(layout_ids)
+
+    def _extend_table(self, other: "ColumnTable"):
+        remap = array("i", (self._layout_id(layout) for layout in other._layouts))
+        for name in other._columns:
+            self._column(name)
+        for name, column in self._columns.items():
+            other_column = other._columns.get(name)
+            if other_column is None:
+                other_column = _Column(column.kind, len(other))
+            column.extend(other_column)
+        self._row_layouts.extend(remap[layout_id] for layout_id in other._row_layouts)
+
+    # column access
+
+    def column_names(self) -> list[str]:
+        """Every key any row has, in first-seen order."""
+        return list(dict.fromkeys(key for layout in self._layouts for key in layout))
+
+    def column(self, name: str) -> list:
+        """Values of ``name`` for every row (None where the row has no such key)."""
+        column = self._columns.get(name)
+        if column is None:
+            return [None] * len(self)
+        return column.slice(0, len(self))
+
+    def set_column(self, name: str, values: list):
+        """Replace the values of an existing column (one per row; rows without the key keep not having it)."""
+        if name not in self._columns:
+            return
+        if len(values) != len(self):
+            raise ValueError(f"column {name!r} needs {len(self)} values, got {len(values)}")
+        column = _Column(self._kinds.get(name, "object"))
+        column.extend_values(list(values))
+        self._columns[name] = column
+
+    def take(self, indices: Iterable[int]) -> "ColumnTable":
+        """New table holding the rows at ``indices``, in that order."""
+        indices = list(indices)
+        table = self.empty_like()
+        table._layouts = list(self._layouts)
+        table._layout_ids = dict(self._layout_ids)
+        table._columns = {name: column.take(indices) for name, column in self._columns.items()}
+        row_layouts = self._row_layouts
+        table._row_layouts = array("i", (row_layouts[i] for i in indices))
+        return table
@@ -7,15 +7,20 @@ import math
 import settings
 import logging
 from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import islice
 from typing import Any, Dict, List
 from dotenv import load_dotenv
 import json
 import requests
 
+from shared.table_spool import SpooledTable
+from shared.table_store import ColumnTable
+
 from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 from typing import List, Union, Optional, Literal, get_args, get_origin
 from datetime import datetime
-import hashlib, base64, re
+import hashlib, re
 
 ID_FIELDS = {
     # core user-bearing tables
@@ -135,6 +140,33 @@ class Organization(BaseModel):
             "40% students, 40% parents of those students, 20% teachers."
         ),
     )
+    max_fetch_workers: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description=(
+            "Optional. Concurrent Firestore fetches for runs, trials and surveys. "
+            "Defaults to settings MAX_FETCH_WORKERS; 1 fetches serially."
+        ),
+    )
+    is_bulk_trial_fetch: bool = Field(
+        default=False,
+        description=(
+            "Optional. When true, read trials with one collection-group scan per user "
+            "instead of one query per run."
+        ),
+    )
+    # Read cost: the index scans are project-wide, one document read per run and per survey
+    # response (twice: createdAt and timeStarted) in the date range, of every user. They run
+    # once per job for each (users/guests, date range) and are shared by every org using
+    # them; the per-user probes they replace cost 1-3 reads per candidate user of the org.
+    # Worth it when the job's orgs cover a large share of the project's activity.
+    is_activity_index: bool = Field(
+        default=False,
+        description=(
+            "Optional. When true, find users with runs/surveys in the date range with a "
+            "few collection-group scans instead of probing each candidate user."
+        ),
+    )
     filters: Filters
 
     @model_validator(mode="after")
@@ -146,6 +178,12 @@ class Organization(BaseModel):
             )
         return self
 
+    def resolved_date_filter(self) -> DateFilter:
+        """Wide default window when the request omits date_filter (matches export defaults)."""
+        if self.filters.date_filter is None:
+            return DateFilter(start_date=WIDE_RANGE_START, end_date=WIDE_RANGE_END)
+        return self.filters.date_filter
+
 
 class DatasetParameters(BaseModel):
     model_config = ConfigDict(extra="forbid")
@@ -158,8 +196,47 @@ class DatasetParameters(BaseModel):
         default=False,
         description="If true, post a Slack summary when validation finishes (and on upload/release when applicable).",
     )
+    is_incremental: bool = Field(
+        default=False,
+        description=(
+            "Optional. When true, only users with activity since the dataset's last incremental "
+            "watermark are re-read and merged into the tables already in GCS."
+        ),
+    )
+    max_org_workers: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description=(
+            "Optional. Orgs validated in parallel, each in its own worker process. "
+            "Unset or 1 validates the orgs one after another."
+        ),
+    )
+    export_format: Literal["json", "ndjson.gz", "parquet"] = Field(
+        default="json",
+        description=(
+            "Optional. Format of the exported table files: one JSON array per table (.json), "
+            "gzip-compressed newline-delimited JSON (.ndjson.gz) or Parquet typed from the "
+            "table models (.parquet)."
+        ),
+    )
+    is_partitioned_output: bool = Field(
+        default=False,
+        description=(
+            "Optional. When true, trials, runs and survey_responses are exported as one file per "
+            "task and month, and only the shards that changed are uploaded."
+        ),
+    )
     orgs: List[Organization] = Field(min_length=1)
 
+    @model_validator(mode="after")
+    def check_incremental(self):
+        if self.is_incremental:
+            if not self.is_save_to_storage:
+                raise ValueError("is_incremental requires is_save_to_storage")
+            if any(org.user_number_limit for org in self.orgs):
+                raise ValueError("is_incremental cannot be combined with user_number_limit")
+        return self
+
     @field_validator("send_slack", mode="before")
     @classmethod
     def coerce_send_slack(cls, v):
@@ -208,6 +285,9 @@ class DatasetParameters(BaseModel):
             "is_save_to_storage": self.is_save_to_storage,
             "is_force_uploading_to_redivis": self.is_force_uploading_to_redivis,
             "send_slack": self.send_slack,
+            "is_incremental": self.is_incremental,
+            "export_format": self.export_format,
+            "is_partitioned_output": self.is_partitioned_output,
             "org_count": len(self.orgs),
             "orgs": full_description_org,
         }
@@ -272,58 +352,183 @@ def setup_project_environment():
     )
 
 
-def merge_dictionaries(dict1, dict2):
-    # Initialize the result dictionary
-    merged_dict = {}
+# Id column of the sentinel schema row in the exported tables that have no primary key
+# in the pipeline's dedupe keys (REDUCE_DUP_KEYS).
+SCHEMA_ROW_ID_FIELDS = {
+    "surveys": "survey_id",
+    "survey_responses": "survey_id",
+    "user_administrations": "user_id",
+    "user_sites": "user_id",
+    "user_cohorts": "user_id",
+    "user_schools": "user_id",
+    "user_classes": "user_id",
+}
 
-    # Get all keys from both dictionaries
-    all_keys = set(dict1.keys()).union(dict2.keys())
 
-    # Iterate over all keys
-    for key in all_keys:
-        # If key is in both dictionaries, concatenate the lists
-        if key in dict1 and key in dict2:
-            merged_dict[key] = dict1[key] + dict2[key]
-        # If key is only in the first dictionary, add it directly
-        elif key in dict1:
-            merged_dict[key] = dict1[key]
-        # If key is only in the second dictionary, add it directly
-        elif key in dict2:
-            merged_dict[key] = dict2[key]
+# Current rows copied into the merged spool per block.
+MERGE_BLOCK_ROWS = 8192
 
-    return merged_dict
 
+def _is_schema_row(table_name: str, row: dict, keys: dict) -> bool:
+    """Whether ``row`` is the sentinel added by append_schema_rows_to_validated_data."""
+    id_field = keys.get(table_name) or SCHEMA_ROW_ID_FIELDS.get(table_name)
+    return id_field is not None and row.get(id_field) == "schema_row"
 
-def reduce_duplication_by_keys(data: dict, keys: dict):
-    processed_data = {}
 
-    for category, items in data.items():
-        if category in keys:
-            unique_key = keys[category]
-            seen = set()
-            unique_list = []
+# ``user_id: <id>`` part of the ``id`` of invalid_data rows reported for runs, trials and surveys.
+_INVALID_ROW_USER_ID = re.compile(r"(?:^|, )user_id: ([^,]+)")
+
+
+def _invalid_row_user_id(row: dict) -> str | None:
+    """User an ``invalid_data`` row was reported for, parsed from its ``id``; None for org-level rows."""
+    row_id = str(row.get("id") or "")
+    table_name = row.get("table_name") or ""
+    if table_name == "users":
+        return row_id
+    if table_name.startswith("user_"):  # user_administrations and the user-org join tables
+        return row_id.split(":")[0]
+    match = _INVALID_ROW_USER_ID.search(row_id)
+    return match.group(1) if match else None
 
-            for item in items:
-                identifier = item.get(unique_key)
-                if identifier not in seen:
-                    seen.add(identifier)
-                    unique_list.append(item)
 
-            processed_data[category] = unique_list
+def merge_incremental_tables(previous: dict, current: dict, keys: dict, out,
+                             refreshed_user_ids: set | None = None):
+    """
+    Merge the tables of an incremental run (``current``) into the previously exported
+    tables (``previous``: table name -> iterable of row blocks, as streamed back from
+    GCS), writing the result to ``out``, an empty ``TableSpool``, block by block.
+
+    Incremental runs re-read every row of each user they touch, so:
+
+    - tables with a ``user_id`` column: previous rows of users present in
+      ``current["users"]`` or in ``refreshed_user_ids`` (users re-read but no longer
+      exported) are replaced by the current ones;
+    - ``survey_responses``: the same, matching the ``{user_id}:`` prefix of ``survey_id``;
+    - other tables in ``keys``: merged by primary key, current rows win;
+    - ``invalid_data``: previous rows reported for re-read users are dropped (the user is
+      parsed from the row's ``id``), then concatenated with exact duplicates dropped.
+
+    Previous rows are written before the current ones, so re-reading unchanged users keeps
+    a table's row order. Schema rows in ``previous`` are dropped; append fresh ones afterwards.
+    """
+    refreshed_user_ids = set(refreshed_user_ids or ())
+    refreshed_user_ids.update(row.get("user_id") for row in current.get("users", []))
+    refreshed_survey_prefixes = set(refreshed_user_ids)
+    refreshed_survey_prefixes.update(str(row.get("survey_id") or "").split(":")[0]
+                                     for row in current.get("survey_responses", []))
+
+    for table_name in list(current) + [t for t in previous if t not in current]:
+        new_rows = current.get(table_name)
+        if new_rows is None:
+            new_rows = []
+        out_table = out.table(table_name)
+
+        if table_name == "invalid_data":
+            seen = set()
+
+            def keep_new(row):
+                fingerprint = hashlib.sha256(
+                    json.dumps(row, sort_keys=True, cls=CustomJSONEncoder).encode("utf-8")).digest()
+                if fingerprint in seen:
+                    return False
+                seen.add(fingerprint)
+                return True
+
+            def keep(row):
+                return _invalid_row_user_id(row) not in refreshed_user_ids and keep_new(row)
+            new_rows = filter(keep_new, new_rows)
+        elif table_name == "survey_responses":
+            def keep(row):
+                return str(row.get("survey_id", "")).split(":")[0] not in refreshed_survey_prefixes
+        elif table_name in ID_FIELDS and "user_id" in ID_FIELDS[table_name]:
+            def keep(row):
+                return row.get("user_id") not in refreshed_user_ids
+        elif table_name in keys:
+            new_keys = {row.get(keys[table_name]) for row in new_rows}
+
+            def keep(row):
+                return row.get(keys[table_name]) not in new_keys
         else:
-            # If no unique key is specified for a category, return it unchanged
-            processed_data[category] = items
+            def keep(row):
+                return True
+
+        for block in previous.get(table_name) or ():
+            out_table.extend([row for row in block if not _is_schema_row(table_name, row, keys) and keep(row)])
+        new_rows = iter(new_rows)
+        while block := list(islice(new_rows, MERGE_BLOCK_ROWS)):
+            out_table.extend(block)
+    return out
+
+
+# Distinct keys remembered by camel_to_snake.
+CAMEL_TO_SNAKE_CACHE_SIZE = 16384
+# Keys a collection's DocNormalizer compiles into its own key map before it stops growing.
+MAX_KEYS_PER_COLLECTION = 4096
+
+_CAMEL_BOUNDARY = re.compile(r'([a-z])([A-Z])')
+# Values that never hold NaN and are returned as is.
+_PLAIN_TYPES = (str, int, bool)
+
+
+class DocNormalizer:
+    """
+    Converts Firestore documents to snake_case keys with NaN handled, for one instance
+    (the NaN replacement is fixed at construction) and optionally one collection, whose
+    keys are compiled into ``key_map`` the first time they are seen.
+    """
+
+    def __init__(self, nan_value=None):
+        self.nan_value = nan_value
+        self.key_map: dict[str, str] = {}
+
+    def snake_key(self, key):
+        snake = self.key_map.get(key)
+        if snake is None:
+            snake = camel_to_snake(key)
+            if len(self.key_map) < MAX_KEYS_PER_COLLECTION:
+                self.key_map[key] = snake
+        return snake
+
+    def normalize_value(self, value):
+        if value is None or type(value) in _PLAIN_TYPES:
+            return value
+        if isinstance(value, float):
+            return self.nan_value if math.isnan(value) else value
+        if isinstance(value, dict):
+            # Recursively handle NaN values in nested dictionaries
+            return {key: self.normalize_value(val) for key, val in value.items()}
+        if isinstance(value, list):
+            if len(value) == 0:
+                return None
+            # Recursively handle NaN values in nested lists
+            return [self.normalize_value(val) for val in value]
+        return value
+
+    def __call__(self, doc_dict, ignore_keys=None):
+        snake_key, normalize_value = self.snake_key, self.normalize_value
+        if not ignore_keys:
+            return {snake_key(key): normalize_value(value) for key, value in doc_dict.items()}
+        ignore_keys = set(ignore_keys)
+        return {snake_key(key): normalize_value(value) for key, value in doc_dict.items()
+                if key not in ignore_keys}
+
+
+_DOC_NORMALIZERS: dict[tuple, DocNormalizer] = {}
+
 
-    return processed_data
+def doc_normalizer(collection: str | None = None) -> DocNormalizer:
+    """The DocNormalizer for the current ``settings.config['INSTANCE']`` and ``collection``."""
+    instance = settings.config['INSTANCE']
+    normalizer = _DOC_NORMALIZERS.get((instance, collection))
+    if normalizer is None:
+        normalizer = _DOC_NORMALIZERS.setdefault(
+            (instance, collection), DocNormalizer(None if instance == 'LEVANTE' else "NaN"))
+    return normalizer
 
 
 # Utility function for converting dictionaries to snake_case and handling NaN values
-def process_doc_dict(doc_dict, ignore_keys=None):
-    if ignore_keys is None:
-        ignore_keys = []
-    converted_doc_dict = {camel_to_snake(key): handle_nan(value) for key, value in doc_dict.items()
-                          if key not in ignore_keys}
-    return converted_doc_dict
+def process_doc_dict(doc_dict, ignore_keys=None, collection=None):
+    return doc_normalizer(collection)(doc_dict, ignore_keys)
 
 
 def promote_last_updated_to_updated_at(converted: dict) -> dict:
@@ -334,32 +539,15 @@ def promote_last_updated_to_updated_at(converted: dict) -> dict:
     return converted
 
 
+@lru_cache(maxsize=CAMEL_TO_SNAKE_CACHE_SIZE)
 def camel_to_snake(camel_str):
-    # Find all matches where a lowercase letter is followed by an uppercase letter
-    matches = re.finditer(r'([a-z])([A-Z])', camel_str)
-
-    # Insert an underscore before each uppercase letter
-    for match in matches:
-        camel_str = camel_str.replace(match.group(), match.group(1) + '_' + match.group(2))
-
-    # Convert the entire string to lowercase
-    snake_str = camel_str.lower()
-
-    return snake_str
+    # Insert an underscore between each lowercase letter and a following uppercase letter,
+    # then convert the entire string to lowercase
+    return _CAMEL_BOUNDARY.sub(r'\1_\2', camel_str).lower()
 
 
 def handle_nan(value):
-    if isinstance(value, float) and math.isnan(value):
-        return None if settings.config['INSTANCE'] == 'LEVANTE' else "NaN"
-    elif isinstance(value, dict):
-        # Recursively handle NaN values in nested dictionaries
-        return {key: handle_nan(val) for key, val in value.items()}
-    elif isinstance(value, list):
-        if len(value) == 0:
-            return None
-        # Recursively handle NaN values in nested lists
-        return [handle_nan(val) for val in value]
-    return value
+    return doc_normalizer().normalize_value(value)
 
 
 def unwrap_nested_dicts(d: dict):
@@ -436,6 +624,26 @@ def flatten_document(doc: dict, parent_key: str = '', sep: str = '.', max_depth:
     return items
 
 
+def document_shape(doc: dict, max_depth: int | None = None, current_depth: int = 0):
+    """
+    Hashable shape of ``doc``: documents with equal shapes flatten (``flatten_document``
+    with the same ``max_depth``) to the same keys in the same order. Cheaper than
+    flattening since no key strings or type names are built.
+    """
+    if max_depth is not None and current_depth + 1 >= max_depth:
+        # Everything below this level flattens to its parent's key.
+        return tuple(doc)
+    shape = []
+    for k, v in doc.items():
+        if isinstance(v, dict):
+            shape.append((k, document_shape(v, max_depth, current_depth + 1)))
+        elif isinstance(v, list) and v and all(isinstance(x, dict) for x in v):
+            shape.append((k, "[]", tuple(document_shape(x, max_depth, current_depth + 1) for x in v)))
+        else:
+            shape.append(k)
+    return tuple(shape)
+
+
 def schema_registry():
     """
         Map export table name -> (controller list attribute, model class).
@@ -476,6 +684,11 @@ def schema_registry():
     }
 
 
+# Datetime value of the sentinel schema row. Fixed, so the row does not change a table's
+# content hash (and force a re-upload) on every run.
+SCHEMA_ROW_TIMESTAMP = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
 def _sentinel_from_annotation(ann: Any, now: datetime) -> Any:
     origin = get_origin(ann)
     base = ann
@@ -513,7 +726,7 @@ def append_schema_rows_to_validated_data(validated_data: Dict[str, Any]) -> Dict
 
     out: Dict[str, Any] = {}
     reg = schema_registry()
-    now = datetime.now(timezone.utc)
+    now = SCHEMA_ROW_TIMESTAMP
 
     for t_name in reg.keys():
         validated_data.setdefault(t_name, [])
@@ -534,7 +747,11 @@ def append_schema_rows_to_validated_data(validated_data: Dict[str, Any]) -> Dict
                       for name, f in fields.items()}
 
         # Always append exactly one schema row
-        if isinstance(rows, list):
+        if isinstance(rows, (ColumnTable, SpooledTable)):
+            # In place: a copy would briefly hold the largest tables twice.
+            rows.append(schema_row)
+            out[table] = rows
+        elif isinstance(rows, list):
             out[table] = list(rows) + [schema_row]
         else:
             # Coerce non-list payloads into a single-row list with the schema row
@@ -577,56 +794,6 @@ def schema_signature(doc: dict, max_depth: Optional[int] = 1) -> str:
     return hashlib.md5(schema_str.encode()).hexdigest()
 
 
-def make_id_pseudonymizer(secret_salt: str):
-    cache = {}
-
-    def pseudonymize(raw: str) -> str:
-        if raw is None:
-            return None
-        if raw in cache:
-            return cache[raw]
-        # deterministic, same length & [A-Za-z0-9_-] friendly
-        h = hashlib.blake2b((raw + secret_salt).encode("utf-8"), digest_size=24).digest()
-        b32 = base64.b32encode(h).decode("utf-8").rstrip("=")  # uppercase A-Z2-7
-        # Trim/shape to roughly match original length/charset; fall back to 16 if too short
-        target_len = max(16, len(raw))
-        fake = b32[:target_len]
-        cache[raw] = fake
-        return fake
-
-    return pseudonymize
-
-
-def pseudonymize_dataset(data: dict, salt: str) -> dict:
-    pseudo = make_id_pseudonymizer(salt)
-    out = {}
-    for table, rows in data.items():
-        if not isinstance(rows, list):
-            out[table] = rows  # e.g., invalid_data blob
-            continue
-        fields = ID_FIELDS.get(table, [])
-        new_rows = []
-        for row in rows:
-            r = dict(row)
-            for f in fields:
-                if f in r and r[f] is not None:
-                    r[f] = pseudo(str(r[f]))
-            if table == "surveys":
-                if r.get("specific_scope") == "child_id" and r.get("specific_scope_id"):
-                    r["specific_scope_id"] = pseudo(str(r["specific_scope_id"]))
-                from shared.firestore_services import make_survey_id
-                part = r.get("survey_part") or "general"
-                r["survey_id"] = make_survey_id(
-                    str(r["user_id"]),
-                    str(r["administration_id"]),
-                    part,
-                    r.get("specific_scope_id") if part == "specific" else None,
-                )
-            new_rows.append(r)
-        out[table] = new_rows
-    return out
-
-
 def ids_with_active(org_map):
     """
     Build (id, is_active) for *every* id in org_map['all'].
@@ -1,19 +1,106 @@
-from pydantic import BaseModel, Extra, Field, field_validator, model_validator, ValidationError
+from pydantic import BaseModel, Extra, Field, TypeAdapter, field_validator, model_validator, ValidationError
 from typing import Optional, Union, List, Set, Any, Literal, get_origin, get_args
 from datetime import datetime, timezone
 from pathlib import Path
+from types import MappingProxyType
+import hashlib
 import json
 import os
-import time
+import tempfile
+import threading
 import logging
 import ast
 import re
-from scipy.stats import binom, binomtest
+from scipy.stats import binom
 from math import isnan
+import numpy as np
+from functools import lru_cache
 
 
-_SURVEY_Q_CACHE: Optional[dict] = None
-_SURVEY_Q_CACHE_TS: float = 0.0
+# Survey question catalog: one immutable snapshot per process, warm-started from a
+# persisted copy (local file, then GCS) and refreshed from Redivis in the background.
+_SURVEY_Q_SNAPSHOT: Optional[MappingProxyType] = None
+_SURVEY_Q_LOCK = threading.Lock()
+SURVEY_QUESTIONS_CACHE_BLOB = "_cache/survey_questions.json"
+
+
+def _survey_questions_cache_path() -> Path:
+    default = Path(tempfile.gettempdir()) / "levante_survey_questions.json"
+    return Path(os.getenv("SURVEY_QUESTIONS_CACHE_PATH", str(default)))
+
+
+def _survey_questions_cache_blob():
+    import settings
+    from google.cloud import storage
+    from shared.firestore_services import firestore_services
+
+    bucket_name = settings.config.get("CORE_DATA_BUCKET_NAME")
+    if not bucket_name:
+        return None
+    # Same credentials as StorageServices, not the ambient ones.
+    client = storage.Client(credentials=firestore_services.admin_credentials)
+    return client.bucket(bucket_name).blob(SURVEY_QUESTIONS_CACHE_BLOB)
+
+
+def _survey_questions_version(questions: dict) -> str:
+    return hashlib.sha256(json.dumps(questions, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _read_survey_questions_cache() -> Optional[dict]:
+    """Persisted ``{"version", "fetched_at", "questions"}`` from the local file, else GCS."""
+    path = _survey_questions_cache_path()
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+    try:
+        blob = _survey_questions_cache_blob()
+        if blob is not None and blob.exists():
+            cached = json.loads(blob.download_as_text())
+            _write_survey_questions_cache(cached, upload=False)
+            return cached
+    except Exception as e:
+        logging.warning(f"Could not read survey questions cache from GCS: {e}")
+    return None
+
+
+def _write_survey_questions_cache(cached: dict, upload: bool = True):
+    path = _survey_questions_cache_path()
+    try:
+        tmp_path = path.with_suffix(".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump(cached, f, default=str)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f"Could not write survey questions cache {path}: {e}")
+    if not upload:
+        return
+    try:
+        blob = _survey_questions_cache_blob()
+        if blob is not None:
+            blob.upload_from_string(json.dumps(cached, default=str), content_type="application/json")
+    except Exception as e:
+        logging.warning(f"Could not write survey questions cache to GCS: {e}")
+
+
+def refresh_survey_questions_cache(current_version: Optional[str] = None) -> Optional[dict]:
+    """
+    Fetch the catalog from Redivis and persist it when its version differs from
+    ``current_version``. Returns the new cache record, or None if unchanged or unavailable.
+    """
+    try:
+        questions = _load_survey_questions_from_redivis()
+    except Exception as e:
+        logging.warning(f"Survey questions refresh from Redivis failed: {e}")
+        return None
+    version = _survey_questions_version(questions)
+    if version == current_version:
+        return None
+    cached = {"version": version, "fetched_at": datetime.now(timezone.utc).isoformat(), "questions": questions}
+    _write_survey_questions_cache(cached)
+    logging.info(f"Survey questions cache updated. version={version[:12]} count={len(questions)}")
+    return cached
 
 
 def _load_survey_questions_from_local_json() -> dict:
@@ -63,25 +150,37 @@ def _load_survey_questions_from_redivis() -> dict:
     return questions
 
 
-def get_survey_questions() -> dict:
-    global _SURVEY_Q_CACHE, _SURVEY_Q_CACHE_TS
-
-    ttl_seconds = int(os.getenv("SURVEY_QUESTIONS_TTL_SECONDS", "300"))
-    now = time.time()
-    if _SURVEY_Q_CACHE is not None and now - _SURVEY_Q_CACHE_TS < ttl_seconds:
-        return _SURVEY_Q_CACHE
-
-    try:
-        questions = _load_survey_questions_from_redivis()
-        logging.info(f"Loaded survey questions from Redivis survey_items table. count={len(questions)}")
-    except Exception as e:
-        logging.warning(f"Failed loading survey questions from Redivis, using local JSON fallback: {e}")
-        questions = _load_survey_questions_from_local_json()
-        logging.info(f"Loaded survey questions from local survey_questions.json fallback. count={len(questions)}")
+def get_survey_questions() -> MappingProxyType:
+    """
+    The process-wide survey question snapshot. It never changes once loaded; a newer
+    catalog fetched in the background is persisted and picked up by the next job.
+    """
+    global _SURVEY_Q_SNAPSHOT
+    if _SURVEY_Q_SNAPSHOT is not None:
+        return _SURVEY_Q_SNAPSHOT
+
+    with _SURVEY_Q_LOCK:
+        if _SURVEY_Q_SNAPSHOT is not None:
+            return _SURVEY_Q_SNAPSHOT
+
+        cached = _read_survey_questions_cache()
+        if cached and isinstance(cached.get("questions"), dict) and cached["questions"]:
+            questions = cached["questions"]
+            logging.info(f"Loaded survey questions from cache. version={str(cached.get('version'))[:12]} "
+                         f"fetched_at={cached.get('fetched_at')} count={len(questions)}")
+            threading.Thread(target=refresh_survey_questions_cache, args=(cached.get("version"),),
+                             name="survey-questions-refresh", daemon=True).start()
+        else:
+            cached = refresh_survey_questions_cache()
+            if cached:
+                questions = cached["questions"]
+                logging.info(f"Loaded survey questions from Redivis survey_items table. count={len(questions)}")
+            else:
+                questions = _load_survey_questions_from_local_json()
+                logging.info(f"Loaded survey questions from local survey_questions.json fallback. count={len(questions)}")
 
-    _SURVEY_Q_CACHE = questions
-    _SURVEY_Q_CACHE_TS = now
-    return questions
+        _SURVEY_Q_SNAPSHOT = MappingProxyType(questions)
+        return _SURVEY_Q_SNAPSHOT
 
 
 class TrialBase(BaseModel):
@@ -293,6 +392,17 @@ class RunBase(BaseModel):
     time_finished: Optional[datetime] = None
 
 
+# Response options per task for below-chance scoring (chance = 1/afc); other tasks use the default.
+BELOW_CHANCE_AFC_BY_TASK: dict[str, int] = {}
+BELOW_CHANCE_DEFAULT_AFC = 4
+BELOW_CHANCE_MIN_TRIALS = 8
+STRAIGHTLINING_MIN_RUN = 10
+
+
+def below_chance_afc(task_id: Optional[str]) -> int:
+    return BELOW_CHANCE_AFC_BY_TASK.get(task_id, BELOW_CHANCE_DEFAULT_AFC)
+
+
 class LevanteRun(RunBase):
     num_attempted: Optional[int] = None
     num_correct: Optional[int] = None
@@ -307,42 +417,8 @@ class LevanteRun(RunBase):
     bc_p_below: Optional[float] = None  # one-tailed p-value P[X <= k]
     # flag_below_chance_0p05: Optional[bool] = None  # True if p <= .05
 
-    _non_practice_trials: Optional[list[LevanteTrial]] = []
-
-    def compute_below_chance_flags_scipy(
-            self,
-            *,
-            default_afc: int = 4,  # 4AFC ⇒ chance p = 0.25
-            alpha: float = 0.05,  # flag threshold
-            min_trials: int = 8  # avoid noisy flags on tiny runs
-    ) -> None:
-        """
-        Compute a one-tailed binomial 'below-chance' p-value from this run's trials
-        and populate three lean fields: bc_score, bc_p_below, flag_below_chance_0p05.
-
-        Uses: self._non_practice_trials (Iterable of trial objects with .correct: bool)
-        """
-
-        trials = self._non_practice_trials or []
-        n = len(trials)
-        k = sum(1 for t in trials if getattr(t, "correct", None) is True)
-
-        # 3 lean columns
-        # self.bc_score = f"{k}/{n}"
-        self.bc_p_below = None
-        # self.flag_below_chance_0p05 = None
-
-        # Not enough data? leave as None
-        if n <= 0 or n < min_trials:
-            return
-
-        # Resolve chance level (4AFC by default). Replace with self.task_afc / self.n_options if you store them.
-        afc = default_afc
-        p = 1.0 / float(afc)
-
-        # One-tailed p-value: P[X <= k] for X ~ Binom(n, p)
-        self.bc_p_below = float(binomtest(k, n, p, alternative='less').pvalue)
-        # self.flag_below_chance_0p05 = (self.bc_p_below <= alpha)
+    _non_practice_trials: Optional[list[dict]] = []
+    _below_chance_counts: Optional[tuple[int, int]] = None  # (correct, non-practice trials)
 
     def add_age_from_users(self, birth_month: int, birth_year: int):
         if not (birth_year and birth_month and self.time_started):
@@ -369,7 +445,11 @@ class LevanteRun(RunBase):
         diff_days = (run_date - birth_date).days
         self.age = round(diff_days / 365.25, 1)  # or use 365.25 for more precision
 
-    def add_non_practice_trials(self, trial: LevanteTrial):
+    def count_below_chance_trials(self):
+        trials = self._non_practice_trials or []
+        self._below_chance_counts = (sum(1 for t in trials if t.get("correct") is True), len(trials))
+
+    def add_non_practice_trials(self, trial: dict):
         self._non_practice_trials.append(trial)
 
     def check_non_practice_trials_count(self):
@@ -379,37 +459,9 @@ class LevanteRun(RunBase):
         if len(self._non_practice_trials) < trial_len_min:
             self.validation_msg_run = f"less_than_{trial_len_min}_test_trials"
 
-    def check_straight_line_trials(self):
-        def sort_key(trial):
-            index = trial.trial_index
-            # Check if index is None or not an integer
-            if index is None or not isinstance(index, int):
-                # Handle None or non-integer by setting them to a high value or other logic
-                return False, float('inf')  # Sorting None or invalid to the end
-            return True, index  # Proper integers sorted normally
-
-        def has_consecutive_identical(lst, n):
-            # Check if the list has fewer than n elements or all elements are blank
-            if len(lst) < n or all(x in ("", None) for x in lst):
-                return False
-
-            # Loop through the list, stopping at the nth-to-last element
-            for i in range(len(lst) - n + 1):
-                # Check if the n elements starting from index i are all the same
-                if all(lst[i] == lst[j] and lst[j] not in ("", None) for j in range(i, i + n)):
-                    return True
-            return False
-
-        self._non_practice_trials.sort(key=sort_key)
-        response_location = [trial.response_location for trial in self._non_practice_trials if
-                             isinstance(trial.trial_index, int)]
-
-        consecutive_identical_min = 10
-        if has_consecutive_identical(response_location, consecutive_identical_min):
-            if self.validation_msg_run:
-                self.validation_msg_run = self.validation_msg_run + f"; straightlining_{consecutive_identical_min}"
-            else:
-                self.validation_msg_run = f"straightlining_{consecutive_identical_min}"
+    def add_straightlining_msg(self):
+        msg = f"straightlining_{STRAIGHTLINING_MIN_RUN}"
+        self.validation_msg_run = f"{self.validation_msg_run}; {msg}" if self.validation_msg_run else msg
 
     def update_valid_run(self):
         self.valid_run = True if not self.validation_msg_run else False
@@ -417,9 +469,10 @@ class LevanteRun(RunBase):
 
     def validate_trials_in_run(self):
         self.check_non_practice_trials_count()
-        self.check_straight_line_trials()
-        self.update_valid_run()
-        self.compute_below_chance_flags_scipy()
+        # Straight-lining, valid_run and bc_p_below are set for all runs at once by validate_runs_trials.
+        self.count_below_chance_trials()
+        # The rows are kept in the controller's trials table; drop this run's references.
+        self._non_practice_trials = []
 
     _ALLOWED_STOP_TYPES = {"taskAbort", "timeOut", "errorOut", "sufficientTrials", "earlyCompletion"}
 
@@ -980,3 +1033,151 @@ for _name, _obj in list(globals().items()):
                 setattr(_obj, "schema_row", classmethod(_schema_row_for_cls))
     except Exception:
         pass
+
+
+# ---------------------------------------------------------------------------
+# Batch validation: one TypeAdapter(list[Model]) call per page of raw rows.
+# ---------------------------------------------------------------------------
+@lru_cache(maxsize=None)
+def _list_adapter(model_cls: type) -> TypeAdapter:
+    return TypeAdapter(list[model_cls])
+
+
+def validate_batch(model_cls: type, rows: list[dict]) -> tuple[list[tuple[int, BaseModel]], dict[int, list[dict]]]:
+    """
+    Validate ``rows`` as ``model_cls`` in one call.
+
+    Returns ``(valid, errors)``: ``valid`` is ``(index, model)`` for every row that
+    validated, in input order; ``errors`` maps the index of every failing row to its
+    ``ValidationError.errors()`` with the list index stripped from ``loc``, i.e. the
+    same records ``model_cls(**row)`` would raise. When any row fails, the remaining
+    rows are validated again in a second batch call.
+    """
+    if not rows:
+        return [], {}
+    adapter = _list_adapter(model_cls)
+    try:
+        return list(enumerate(adapter.validate_python(rows))), {}
+    except ValidationError as e:
+        errors: dict[int, list[dict]] = {}
+        for error in e.errors():
+            loc = error.get("loc") or ()
+            errors.setdefault(loc[0], []).append({**error, "loc": loc[1:]})
+    ok_indexes = [i for i in range(len(rows)) if i not in errors]
+    models = adapter.validate_python([rows[i] for i in ok_indexes]) if ok_indexes else []
+    return list(zip(ok_indexes, models)), errors
+
+
+def dump_batch(model_cls: type, models: list) -> list[dict]:
+    """``model_dump()`` of every model in one call; dict rows are passed through unchanged."""
+    if not models:
+        return []
+    if all(type(m) is model_cls for m in models):
+        return _list_adapter(model_cls).dump_python(models)
+    return [m if isinstance(m, dict) else m.model_dump() for m in models]
+
+
+def score_below_chance(runs: list, *, min_trials: int = BELOW_CHANCE_MIN_TRIALS) -> None:
+    """
+    Set ``bc_p_below`` (one-tailed P[X <= k], X ~ Binom(n, 1/afc)) on every run from the
+    counts recorded by ``validate_trials_in_run``, with one vectorized ``binom.cdf`` call.
+    Runs with fewer than ``min_trials`` non-practice trials get None.
+    """
+    scored = []
+    for run in runs:
+        counts = getattr(run, "_below_chance_counts", None)
+        if counts is None:
+            continue
+        run.bc_p_below = None
+        if counts[1] > 0 and counts[1] >= min_trials:
+            scored.append(run)
+    if not scored:
+        return
+    k = np.fromiter((run._below_chance_counts[0] for run in scored), dtype=np.int64, count=len(scored))
+    n = np.fromiter((run._below_chance_counts[1] for run in scored), dtype=np.int64, count=len(scored))
+    p = np.fromiter((1.0 / below_chance_afc(run.task_id) for run in scored), dtype=np.float64, count=len(scored))
+    for run, p_below in zip(scored, binom.cdf(k, n, p).tolist()):
+        run.bc_p_below = min(1.0, p_below)
+
+
+def is_non_practice_trial(assessment_stage: Optional[str], is_practice_trial: Optional[bool]) -> bool:
+    return assessment_stage == 'test_response' or (is_practice_trial is not None and not is_practice_trial)
+
+
+def _factorize_response_locations(values: list) -> np.ndarray:
+    """
+    Integer code per value such that equal codes <=> ``==``; blank ("" / None) and
+    values not equal to themselves (NaN) get -1, which never forms a run.
+    """
+    codes = np.empty(len(values), dtype=np.int64)
+    hashable_codes: dict = {}
+    unhashable: list = []
+    for i, v in enumerate(values):
+        if v is None or v == "" or v != v:
+            codes[i] = -1
+            continue
+        try:
+            codes[i] = hashable_codes.setdefault(v, len(hashable_codes) + len(unhashable))
+        except TypeError:
+            for code, other in unhashable:
+                if other == v:
+                    codes[i] = code
+                    break
+            else:
+                unhashable.append((len(hashable_codes) + len(unhashable), v))
+                codes[i] = unhashable[-1][0]
+    return codes
+
+
+def flag_straightlining(runs: list, trials) -> None:
+    """
+    Flag straight-lined runs from the trial table.
+
+    Non-practice trials with an integer ``trial_index`` are grouped by run and sorted by
+    ``trial_index`` (ties keep table order), then run-length encoded on
+    ``response_location``. Runs with ``STRAIGHTLINING_MIN_RUN`` or more consecutive
+    identical non-empty values get ``straightlining_10``, applied in ``runs`` order.
+    """
+    run_groups = {(run.user_id, run.run_id): g for g, run in enumerate(runs)}
+    if not run_groups or not len(trials):
+        return
+
+    columns = {name: trials.column(name) for name in
+               ("user_id", "run_id", "trial_index", "response_location", "assessment_stage", "is_practice_trial")}
+    selected = [
+        i for i, (stage, practice, index) in enumerate(zip(
+            columns["assessment_stage"], columns["is_practice_trial"], columns["trial_index"]))
+        if isinstance(index, int) and is_non_practice_trial(stage, practice)
+    ]
+    user_ids, run_ids = columns["user_id"], columns["run_id"]
+    selected = [i for i in selected if (user_ids[i], run_ids[i]) in run_groups]
+    if not selected:
+        return
+
+    groups = np.fromiter((run_groups[(user_ids[i], run_ids[i])] for i in selected),
+                         dtype=np.int64, count=len(selected))
+    trial_indexes = [columns["trial_index"][i] for i in selected]
+    try:
+        order = np.lexsort((np.arange(len(selected)), np.array(trial_indexes, dtype=np.int64), groups))
+    except OverflowError:
+        order = np.array(sorted(range(len(selected)), key=lambda j: (groups[j], trial_indexes[j])), dtype=np.int64)
+
+    groups = groups[order]
+    codes = _factorize_response_locations([columns["response_location"][selected[j]] for j in order])
+
+    # Start of every run of equal (group, code); -1 codes never extend a run.
+    starts = np.flatnonzero(np.concatenate((
+        [True], (groups[1:] != groups[:-1]) | (codes[1:] != codes[:-1]) | (codes[1:] == -1))))
+    lengths = np.diff(np.append(starts, len(codes)))
+    long_runs = starts[(lengths >= STRAIGHTLINING_MIN_RUN) & (codes[starts] != -1)]
+
+    for g in sorted(set(groups[long_runs].tolist())):
+        runs[g].add_straightlining_msg()
+
+
+def validate_runs_trials(runs: list, trials) -> None:
+    """Run-level trial checks for all runs at once, after ``validate_trials_in_run`` on each."""
+    flag_straightlining(runs, trials)
+    for run in runs:
+        run.update_valid_run()
+    score_below_chance(runs)
@@ -4,22 +4,45 @@ Firestore → validate → GCS → Redivis pipeline (``main.py`` / Cloud Run Job
 
 import json
 import logging
+import multiprocessing
+import os
+import pickle
+import tempfile
 import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from typing import Callable
 
 import settings
 from shared import utils
 from shared.firestore_services import firestore_services
+from shared.pseudonymizer import get_pseudonymizer, pseudonymize_dataset
 from shared.slack_services import (
     format_data_validation_slack_summary,
     format_org_progress_slack,
     notify_slack,
 )
 from shared.storage_services import StorageServices
+from shared.table_spool import DEFAULT_MEMORY_BUDGET_BYTES, TableSpool
 from validators.entity_controller import EntityController
 from validators.redivis_services import RedivisServices
 
 logging.basicConfig(level=logging.INFO)
 
+# Primary key per table; later duplicates (e.g. a user in two orgs) are dropped.
+REDUCE_DUP_KEYS = {
+    "sites": "site_id",
+    "cohorts": "cohort_id",
+    "schools": "school_id",
+    "classes": "class_id",
+    "administrations": "administration_id",
+    "tasks": "task_id",
+    "variants": "variant_id",
+    "users": "user_id",
+    "runs": "run_id",
+    "trials": "trial_id",
+}
+
 
 def _notify_slack_safe(message: str) -> None:
     try:
@@ -28,6 +51,147 @@ def _notify_slack_safe(message: str) -> None:
         logging.error("Slack notification failed: %s", e)
 
 
+def _validate_org(org: utils.Organization, changed_since: datetime | None,
+                  changed_user_ids: set[str] | None = None) -> dict:
+    """Validate one org; returns its tables, stats and newly seen schemas."""
+    firestore_services.current_org = org.org_id
+    ec = EntityController(org=org, changed_since=changed_since, changed_user_ids=changed_user_ids)
+    ec.validate_data_from_firestore()
+    org_validated_data = ec.get_validated_data()
+    refreshed_user_ids = ec.refreshed_user_ids
+    if org.is_user_id_masked:
+        pseudonymize_dataset(org_validated_data, salt="LEVANTE")
+        # invalid_data rows keep raw user ids, so both forms are needed to replace them.
+        refreshed_user_ids = refreshed_user_ids | set(
+            get_pseudonymizer("LEVANTE").map_many(refreshed_user_ids).values())
+        logging.info("user_ids have been masked.")
+
+    org_validation_stats = {
+        "cohorts": len(ec.valid_cohorts) + len(ec.invalid_cohorts),
+        "administrations": len(ec.valid_administrations) + len(ec.invalid_administrations),
+        "users": {
+            "total": len(ec.valid_users) + len(ec.invalid_users),
+            "valid_users": sum(1 for user in ec.valid_users if user.valid_user),
+        },
+        "runs": {
+            "total": len(ec.valid_runs) + len(ec.invalid_runs),
+            "valid_runs": sum(1 for run in ec.valid_runs if run.valid_run),
+        },
+        "trials": {
+            "total": len(ec.valid_trials) + len(ec.invalid_trials),
+            "valid_trials": sum(1 for is_valid in ec.valid_trials.column("valid_trial") if is_valid),
+        },
+        "survey_responses": ec.survey_responses_stats,
+        "invalid_data_count": len(org_validated_data.get("invalid_data", [])),
+        "firestore_usage": firestore_services.usage.summary(org=org.org_id),
+    }
+    firestore_services.current_org = None
+    return {"data": org_validated_data, "stats": org_validation_stats, "new_schemas": ec.new_schemas,
+            "refreshed_user_ids": refreshed_user_ids}
+
+
+def _init_org_worker(config: dict, admin_credentials_info: dict | None, activity_indexes: dict) -> None:
+    # Spawned workers import settings afresh and start without credentials: carry over what
+    # the parent resolved at startup (environment variables are inherited by the spawn),
+    # and the activity indexes it already built for the job.
+    settings.config.update(config)
+    if admin_credentials_info is not None:
+        firestore_services.set_admin_credentials_info(admin_credentials_info)
+    firestore_services.activity_indexes.update(activity_indexes)
+
+
+def _validate_org_to_spool(org: utils.Organization, changed_since: datetime | None,
+                           changed_user_ids: set[str] | None, spool_dir: str) -> dict:
+    """
+    Worker-process side of ``_validate_orgs``: tables are pickled (column by column) to
+    files in ``spool_dir`` and only their paths travel back through the pool.
+    """
+    firestore_services.usage.reset()
+    result = _validate_org(org, changed_since, changed_user_ids)
+    spool = {}
+    for table_name, rows in result.pop("data").items():
+        fd, path = tempfile.mkstemp(prefix=f"{table_name}-", suffix=".pkl", dir=spool_dir)
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(rows, f, protocol=pickle.HIGHEST_PROTOCOL)
+        spool[table_name] = path
+    result["spool"] = spool
+    result["firestore_usage"] = firestore_services.usage.export()
+    return result
+
+
+def _load_spooled_tables(spool: dict) -> dict:
+    data = {}
+    for table_name, path in spool.items():
+        with open(path, "rb") as f:
+            data[table_name] = pickle.load(f)
+        os.remove(path)
+    return data
+
+
+def _validate_orgs(dataset_parameters: utils.DatasetParameters, *, changed_since: datetime | None,
+                   changed_user_ids: list[set[str]] | None,
+                   on_started: Callable[[int, utils.Organization], None]):
+    """
+    Yield ``(org_index, org, org_t0, result)`` for every org, in ``orgs`` order.
+    ``changed_user_ids`` (incremental runs) holds each org's changed users, in ``orgs`` order.
+
+    With ``max_org_workers`` > 1 the orgs run in a spawn process pool, at most that
+    many at a time. Results are yielded (and so merged) in the same order as the
+    sequential loop, but ``on_started`` fires as each org is handed to a worker: up to
+    ``max_org_workers`` orgs are reported started before the first one finishes.
+    """
+    orgs = list(enumerate(dataset_parameters.orgs, start=1))
+
+    def org_changed_user_ids(org_index: int) -> set[str] | None:
+        return changed_user_ids[org_index - 1] if changed_user_ids is not None else None
+
+    workers = min(dataset_parameters.max_org_workers or 1, len(orgs))
+    if workers <= 1:
+        for org_index, org in orgs:
+            org_t0 = time.time()
+            on_started(org_index, org)
+            yield org_index, org, org_t0, _validate_org(org, changed_since, org_changed_user_ids(org_index))
+        return
+
+    spool_root = settings.config.get('SPOOL_DIR') or None
+    with tempfile.TemporaryDirectory(prefix="org-spool-", dir=spool_root) as spool_dir, ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_org_worker,
+            initargs=(dict(settings.config), firestore_services.admin_credentials_info,
+                      firestore_services.activity_indexes),
+    ) as pool:
+        queue = iter(orgs)
+        in_flight = {}
+        finished = {}
+
+        def submit_next():
+            item = next(queue, None)
+            if item is None:
+                return
+            org_index, org = item
+            org_t0 = time.time()
+            on_started(org_index, org)
+            future = pool.submit(_validate_org_to_spool, org, changed_since, org_changed_user_ids(org_index), spool_dir)
+            in_flight[future] = (org_index, org, org_t0)
+
+        for _ in range(workers):
+            submit_next()
+        next_index = 1
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                org_index, org, org_t0 = in_flight.pop(future)
+                finished[org_index] = (org, org_t0, future.result())
+                submit_next()
+            while next_index in finished:
+                org, org_t0, result = finished.pop(next_index)
+                firestore_services.usage.merge(result.pop("firestore_usage"))
+                result["data"] = _load_spooled_tables(result.pop("spool"))
+                yield next_index, org, org_t0, result
+                next_index += 1
+
+
 def run_data_validation(
     dataset_parameters: utils.DatasetParameters,
     *,
@@ -43,7 +207,6 @@ def run_data_validation(
     """
     t0 = start_time if start_time is not None else time.time()
 
-    validated_data: dict = {}
     new_version_release = False
     total_validation_stats = {
         "cohorts": 0,
@@ -58,9 +221,53 @@ def run_data_validation(
     }
     org_count = len(dataset_parameters.orgs)
     logging.info(f"Syncing data from Firestore to Redivis for orgs: {dataset_parameters.orgs}.")
+    firestore_services.usage.reset()
+    firestore_services.current_org = None
+
+    # Incremental mode: extract only activity since the stored watermark (minus an overlap)
+    # and merge it into the tables already in GCS. Without a watermark or a previous
+    # export this run is a full extraction that establishes one.
+    storage = None
+    changed_since = None
+    changed_user_ids = None
+    refreshed_user_ids = set()
+    incremental_log = None
+    if dataset_parameters.is_incremental:
+        storage = StorageServices(
+            cred=firestore_services.admin_credentials,
+            dataset_id=dataset_parameters.dataset_id,
+            is_forced_uploading_redivis=dataset_parameters.is_force_uploading_to_redivis,
+            export_format=dataset_parameters.export_format,
+            is_partitioned_output=dataset_parameters.is_partitioned_output,
+        )
+        watermark = firestore_services.get_incremental_watermark(dataset_parameters.dataset_id)
+        if watermark is not None and "users" in storage.list_table_names_in_blob():
+            overlap = timedelta(minutes=settings.config.get('INCREMENTAL_OVERLAP_MINUTES', 0))
+            changed_since = watermark - overlap
+            logging.info(f"Incremental run for {dataset_parameters.dataset_id}: changes since {changed_since.isoformat()}.")
+            # One project-wide scan for the whole job, intersected with each org's users.
+            changed_user_ids = firestore_services.get_changed_user_ids_by_org(dataset_parameters.orgs, changed_since)
+        else:
+            logging.info(f"No incremental watermark or previous export for {dataset_parameters.dataset_id}; "
+                         f"running a full extraction.")
+        incremental_log = {
+            "watermark": watermark.isoformat() if watermark is not None else None,
+            "changed_since": changed_since.isoformat() if changed_since is not None else None,
+        }
+
+    # Project-wide activity scans run once here and are shared by every org that uses them.
+    firestore_services.activity_indexes.clear()
+    firestore_services.build_activity_indexes(dataset_parameters.orgs)
+
+    # Every org's tables go straight to disk; deduplication happens as they are written.
+    spool = TableSpool(
+        dedupe_keys=REDUCE_DUP_KEYS,
+        encoder_cls=utils.CustomJSONEncoder,
+        memory_budget_bytes=settings.config.get('SPOOL_MEMORY_BUDGET_BYTES', DEFAULT_MEMORY_BUDGET_BYTES),
+        directory=settings.config.get('SPOOL_DIR') or None,
+    )
 
-    for org_index, org in enumerate(dataset_parameters.orgs, start=1):
-        org_t0 = time.time()
+    def notify_org_started(org_index: int, org: utils.Organization):
         logging.info(f"Getting data from Firestore for org_id: {org.org_id}.")
         if slack_org_progress and dataset_parameters.send_slack:
             _notify_slack_safe(
@@ -72,34 +279,15 @@ def run_data_validation(
                     total=org_count,
                 )
             )
-        ec = EntityController(org=org)
-        ec.validate_data_from_firestore()
-        org_validated_data = ec.get_validated_data()
-        if org.is_user_id_masked:
-            org_validated_data = utils.pseudonymize_dataset(
-                org_validated_data, salt="LEVANTE"
-            )
-            logging.info("user_ids have been masked.")
-
-        org_validation_stats = {
-            "cohorts": len(ec.valid_cohorts) + len(ec.invalid_cohorts),
-            "administrations": len(ec.valid_administrations) + len(ec.invalid_administrations),
-            "users": {
-                "total": len(ec.valid_users) + len(ec.invalid_users),
-                "valid_users": sum(1 for user in ec.valid_users if user.valid_user),
-            },
-            "runs": {
-                "total": len(ec.valid_runs) + len(ec.invalid_runs),
-                "valid_runs": sum(1 for run in ec.valid_runs if run.valid_run),
-            },
-            "trials": {
-                "total": len(ec.valid_trials) + len(ec.invalid_trials),
-                "valid_trials": sum(1 for trial in ec.valid_trials if trial.valid_trial),
-            },
-            "survey_responses": ec.survey_responses_stats,
-            "invalid_data_count": len(org_validated_data.get("invalid_data", [])),
-        }
+
+    for org_index, org, org_t0, org_result in _validate_orgs(
+            dataset_parameters, changed_since=changed_since, changed_user_ids=changed_user_ids,
+            on_started=notify_org_started):
+        org_validated_data = org_result["data"]
+        org_validation_stats = org_result["stats"]
+        new_schemas = org_result["new_schemas"]
         total_validation_stats["orgs"][org.org_id] = org_validation_stats
+        refreshed_user_ids |= org_result["refreshed_user_ids"]
 
         total_validation_stats["cohorts"] += org_validation_stats["cohorts"]
         total_validation_stats["administrations"] += org_validation_stats["administrations"]
@@ -113,10 +301,11 @@ def run_data_validation(
         total_validation_stats["survey_responses"]["teacher"] += org_validation_stats["survey_responses"]["teacher"]
         total_validation_stats["survey_responses"]["caregiver"] += org_validation_stats["survey_responses"]["caregiver"]
         total_validation_stats["invalid_data_count"] += org_validation_stats["invalid_data_count"]
-        total_validation_stats["new_schemas"]["runs"].extend(ec.new_schemas["runs"])
-        total_validation_stats["new_schemas"]["trials"].extend(ec.new_schemas["trials"])
-        total_validation_stats["new_schemas"]["surveys"].extend(ec.new_schemas["surveys"])
-        validated_data = utils.merge_dictionaries(validated_data, org_validated_data)
+        total_validation_stats["new_schemas"]["runs"].extend(new_schemas["runs"])
+        total_validation_stats["new_schemas"]["trials"].extend(new_schemas["trials"])
+        total_validation_stats["new_schemas"]["surveys"].extend(new_schemas["surveys"])
+        spool.write_tables(org_validated_data)
+        del org_validated_data, org_result
         if slack_org_progress and dataset_parameters.send_slack:
             _notify_slack_safe(
                 format_org_progress_slack(
@@ -130,21 +319,28 @@ def run_data_validation(
                 )
             )
 
-    reduce_dup_keys = {
-        "sites": "site_id",
-        "cohorts": "cohort_id",
-        "schools": "school_id",
-        "classes": "class_id",
-        "administrations": "administration_id",
-        "tasks": "task_id",
-        "variants": "variant_id",
-        "users": "user_id",
-        "runs": "run_id",
-        "trials": "trial_id",
-    }
+    total_validation_stats["firestore_usage"] = firestore_services.usage.summary()
 
-    validated_data = utils.reduce_duplication_by_keys(data=validated_data, keys=reduce_dup_keys)
-    validated_data = utils.append_schema_rows_to_validated_data(validated_data)
+    if changed_since is not None:
+        # Incremental runs only hold the re-read users: the previous export streams from GCS
+        # into a new spool, less those users' rows, followed by this run's rows.
+        merged = TableSpool(
+            dedupe_keys=REDUCE_DUP_KEYS,
+            encoder_cls=utils.CustomJSONEncoder,
+            memory_budget_bytes=settings.config.get('SPOOL_MEMORY_BUDGET_BYTES', DEFAULT_MEMORY_BUDGET_BYTES),
+            directory=settings.config.get('SPOOL_DIR') or None,
+        )
+        utils.merge_incremental_tables(previous=storage.load_table_blocks(), current=spool,
+                                       keys=REDUCE_DUP_KEYS, out=merged, refreshed_user_ids=refreshed_user_ids)
+        spool.close()
+        spool = merged
+    if dataset_parameters.export_format == 'parquet':
+        # Parquet files carry their column types; only make sure every registry table is exported.
+        for table_name in utils.schema_registry():
+            spool.table(table_name)
+        validated_data = spool
+    else:
+        validated_data = utils.append_schema_rows_to_validated_data(spool)
 
     if not dataset_parameters.is_save_to_storage:
         elapsed_time = time.time() - t0
@@ -167,6 +363,7 @@ def run_data_validation(
             }
             _notify_slack_safe(message=format_data_validation_slack_summary(slack_response))
 
+        spool.close()
         return json.dumps(output, cls=utils.CustomJSONEncoder), 200
 
     if slack_org_progress and dataset_parameters.send_slack:
@@ -177,12 +374,25 @@ def run_data_validation(
 
     logging.info(f"Saving data to GCP storage for dataset_id: {dataset_parameters.dataset_id}.")
 
-    storage = StorageServices(
-        cred=firestore_services.admin_credentials,
-        dataset_id=dataset_parameters.dataset_id,
-        is_forced_uploading_redivis=dataset_parameters.is_force_uploading_to_redivis,
-    )
+    if storage is None:
+        storage = StorageServices(
+            cred=firestore_services.admin_credentials,
+            dataset_id=dataset_parameters.dataset_id,
+            is_forced_uploading_redivis=dataset_parameters.is_force_uploading_to_redivis,
+            export_format=dataset_parameters.export_format,
+            is_partitioned_output=dataset_parameters.is_partitioned_output,
+        )
     storage.process(validated_data=validated_data)
+    spool.close()
+
+    if dataset_parameters.is_incremental:
+        if storage.upload_to_GCP_log['file_uploads_fail']:
+            logging.error("GCS uploads failed; incremental watermark not advanced.")
+        else:
+            # The job start time: anything written after it is picked up by the next run.
+            new_watermark = datetime.fromtimestamp(t0, timezone.utc)
+            firestore_services.set_incremental_watermark(dataset_parameters.dataset_id, new_watermark)
+            incremental_log["new_watermark"] = new_watermark.isoformat()
 
     if storage.is_new_version_needed:
         new_version_release = storage.is_new_version_needed
@@ -199,10 +409,14 @@ def run_data_validation(
             logging.info(f"GCP bucket {dataset_parameters.dataset_id} has files {file_names}.")
 
             for file_name in file_names:
-                rs.save_to_redivis_table(file_name=file_name)
+                if storage.partitioned_table_of(file_name) is None:
+                    rs.save_to_redivis_table(file_name=file_name)
+            # Shards: only the ones that changed, or every shard of a table that is rebuilt.
+            for file_name, upload_merge_strategy in storage.redivis_partition_uploads():
+                rs.save_to_redivis_table(file_name=file_name, upload_merge_strategy=upload_merge_strategy)
 
             table_names_in_redivis = [table.name for table in rs.dataset.list_tables()]
-            table_names_in_gcp_bucket = [name.split("/")[-1].split(".")[0] for name in file_names]
+            table_names_in_gcp_bucket = [name.split("/")[1].split(".")[0] for name in file_names]
 
             exception_tables = ["invalid_data"]
             for table_name in exception_tables:
@@ -222,6 +436,8 @@ def run_data_validation(
             "total_validation_stats": total_validation_stats,
             "gcp_logs": storage.upload_to_GCP_log,
         }
+    if incremental_log is not None:
+        output["incremental"] = incremental_log
 
     elapsed_time = time.time() - t0
     response = {
@@ -1,14 +1,20 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from itertools import islice
 from pydantic import ValidationError
 import logging
 import json
 
 import settings
 from shared import utils
+from shared.table_store import ColumnTable
 from shared.firestore_services import (
     DUPLICATE_SURVEY_MSG,
     MULTIPLE_COMPLETED_SURVEY_MSG,
+    KeyUsage,
     firestore_services as fs,
+    merge_key_usage,
     stringify_variables,
 )
 from validators import core_models
@@ -17,16 +23,29 @@ logging.basicConfig(level=logging.INFO)
 
 now_utc = datetime.now(timezone.utc).isoformat()
 
+# Raw rows validated per TypeAdapter call when a set_* method receives a stream (users).
+VALIDATION_PAGE_SIZE = 1000
+
 
 class EntityController:
 
-    def __init__(self, org: utils.Organization):
+    def __init__(self, org: utils.Organization, changed_since: datetime | None = None,
+                 changed_user_ids: set[str] | None = None):
         self.org = org
+        # Incremental mode: only users with activity after this instant are extracted.
+        self.changed_since = changed_since
+        # Incremental mode: this org's users with runs/surveys changed since then, found
+        # once per job by firestore_services.get_changed_user_ids_by_org.
+        self.changed_user_ids = changed_user_ids
+        # Incremental mode: every user re-read, exported or not; their previous rows are replaced.
+        self.refreshed_user_ids = set()
+        # Incremental mode: a short read would be merged as if it were complete, so reads raise.
+        self.raise_read_errors = changed_since is not None
 
         self.validation_log = {"org_info": str(org)}
-        self.run_key_usage = {}
-        self.trial_key_usage = {}
-        self.survey_key_usage = {}
+        self.run_key_usage = KeyUsage()
+        self.trial_key_usage = KeyUsage()
+        self.survey_key_usage = KeyUsage()
         self.new_schemas = {"runs": [], "trials": [], "surveys": []}
 
         self.valid_sites = []
@@ -49,38 +68,88 @@ class EntityController:
         self.invalid_users = []
         self.valid_runs = []
         self.invalid_runs = []
-        self.valid_trials = []
+        # Rows stored already dumped (trials, survey rows, joins) are kept column by column.
+        self.valid_trials = ColumnTable.for_model(core_models.LevanteTrial)
         self.invalid_trials = []
 
-        self.valid_surveys = []
+        self.valid_surveys = ColumnTable.for_model(core_models.Survey)
         self.invalid_surveys = []
-        self.valid_survey_responses = []
+        self.valid_survey_responses = ColumnTable.for_model(core_models.SurveyResponse)
         self.invalid_survey_responses = []
         self.survey_responses_stats = {"student": 0, "teacher": 0, "caregiver": 0}
 
-        self.valid_user_sites = []
-        self.valid_user_cohorts = []
-        self.valid_user_schools = []
-        self.valid_user_classes = []
+        self.valid_user_sites = ColumnTable.for_model(core_models.UserSite)
+        self.valid_user_cohorts = ColumnTable.for_model(core_models.UserCohort)
+        self.valid_user_schools = ColumnTable.for_model(core_models.UserSchool)
+        self.valid_user_classes = ColumnTable.for_model(core_models.UserClass)
 
         self.invalid_user_sites = []
         self.invalid_user_cohorts = []
         self.invalid_user_schools = []
         self.invalid_user_classes = []
 
-        self._user_org_maps = {}
+        # Join indexes maintained as rows are appended, so lookups never rescan the lists:
+        # user_id -> ordered class ids, user_id -> runs,
+        # task_id -> ordered variant ids (dict keys as an insertion-ordered set).
+        self._user_class_ids = {}
+        self._runs_by_user = {}
+        self._task_variants = {}
 
-        self.valid_user_administrations = []
+        self.valid_user_administrations = ColumnTable.for_model(core_models.UserAdministration)
         self.invalid_user_administrations = []
 
     def _resolved_date_filter(self) -> utils.DateFilter:
-        """Wide default window when the request omits date_filter (matches export defaults)."""
-        if self.org.filters.date_filter is None:
-            return utils.DateFilter(
-                start_date=utils.WIDE_RANGE_START,
-                end_date=utils.WIDE_RANGE_END,
-            )
-        return self.org.filters.date_filter
+        return self.org.resolved_date_filter()
+
+    def _fetch_workers(self) -> int:
+        """Worker count for per-user / per-run Firestore fan-out (1 = serial)."""
+        if self.org.max_fetch_workers is not None:
+            return self.org.max_fetch_workers
+        return max(1, int(settings.config.get('MAX_FETCH_WORKERS', 1) or 1))
+
+    def _ordered_fetch(self, items: list, fetch):
+        """
+        Yield ``(item, fetch(item))`` in input order, running up to
+        ``_fetch_workers()`` fetches concurrently. Only a bounded window of
+        results is buffered ahead of the consumer, and all ``set_*`` calls stay on
+        the calling thread, so output order matches the serial loop.
+        """
+        workers = self._fetch_workers()
+        if workers <= 1 or len(items) <= 1:
+            for item in items:
+                yield item, fetch(item)
+            return
+
+        # Build the shared Firestore client once, before threads race on the lazy property.
+        _ = fs.admin_db
+        pending = deque()
+        remaining = iter(items)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fs-fetch") as pool:
+            for item in islice(remaining, workers * 2):
+                pending.append((item, pool.submit(fetch, item)))
+            while pending:
+                item, future = pending.popleft()
+                for nxt in islice(remaining, 1):
+                    pending.append((nxt, pool.submit(fetch, nxt)))
+                yield item, future.result()
+
+    def _run_concurrently(self, stages: list):
+        """
+        Run independent ``process_*`` stages on a thread pool and wait for all of them.
+        Each stage only writes its own ``valid_*`` / ``invalid_*`` lists, so they can
+        overlap their Firestore round-trips; the first exception is re-raised.
+        """
+        workers = min(self._fetch_workers(), len(stages))
+        if workers <= 1:
+            for stage in stages:
+                stage()
+            return
+
+        _ = fs.admin_db
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fs-stage") as pool:
+            futures = [pool.submit(stage) for stage in stages]
+            for future in futures:
+                future.result()
 
     def adding_schema_row_to_data(self):
         """
@@ -107,39 +176,46 @@ class EntityController:
             self.process_runs()
             if self.valid_runs:
                 self.process_trials()
+                core_models.validate_runs_trials(self.valid_runs, self.valid_trials)
                 self.process_tasks_variants()
 
         # Determine whether it's using guest.
         if not self.org.is_guest:
             of = self.org.filters.org_filter
+            stages = []
             if of is not None and of.key == "districts":
-                self.process_sites()
-                self.process_cohorts()
-                self.process_schools()
-                self.process_classes()
+                stages = [self.process_sites, self.process_cohorts, self.process_schools, self.process_classes]
             elif of is not None and of.key == "groups":
-                self.process_cohorts()
-
-            self.process_administration()
+                stages = [self.process_cohorts]
+            stages.append(self.process_administration)
+            self._run_concurrently(stages)
 
         # self.adding_schema_row_to_data()
 
         # Track schema
         # for task in self.valid_tasks:
         #     if task.task_id == 'survey':
-        #         for survey_type, schema_dict in self.survey_key_usage.items():
-        #             fs.upload_task_schema_to_firestore(dict_type=survey_type, schema_usage=self.survey_key_usage,
+        #         for survey_type, schema_dict in self.survey_key_usage.to_dict().items():
+        #             fs.upload_task_schema_to_firestore(dict_type=survey_type, schema_usage=self.survey_key_usage.to_dict(),
         #                                                task_id=task.task_id, new_schemas=self.new_schemas['surveys'])
         #     else:
-        #         fs.upload_task_schema_to_firestore(dict_type='runKeys', schema_usage=self.run_key_usage,
+        #         fs.upload_task_schema_to_firestore(dict_type='runKeys', schema_usage=self.run_key_usage.to_dict(),
         #                                            task_id=task.task_id, new_schemas=self.new_schemas['runs'])
-        #         fs.upload_task_schema_to_firestore(dict_type='trialKeys', schema_usage=self.trial_key_usage,
+        #         fs.upload_task_schema_to_firestore(dict_type='trialKeys', schema_usage=self.trial_key_usage.to_dict(),
         #                                            task_id=task.task_id, new_schemas=self.new_schemas['trials'])
 
     def get_validated_data(self):
         data = {}
-        for table_name, (attr, _model_cls) in utils.schema_registry().items():
-            data[table_name] = [obj.model_dump() for obj in getattr(self, attr, [])]
+        for table_name, (attr, model_cls) in utils.schema_registry().items():
+            rows = getattr(self, attr, [])
+            # Trials, survey rows and join tables are stored already dumped.
+            if isinstance(rows, ColumnTable):
+                data[table_name] = rows
+                continue
+            table = ColumnTable.for_model(model_cls)
+            for start in range(0, len(rows), VALIDATION_PAGE_SIZE):
+                table.extend(core_models.dump_batch(model_cls, rows[start:start + VALIDATION_PAGE_SIZE]))
+            data[table_name] = table
         invalid_data = self.get_invalid_data()
         if invalid_data:
             data["invalid_data"] = invalid_data
@@ -192,7 +268,7 @@ class EntityController:
 
     def process_sites(self):
         logging.info("Now Validating Sites...")
-        site_ids = sorted({x.site_id for x in self.valid_user_sites})
+        site_ids = sorted(set(self.valid_user_sites.column('site_id')))
         sites = fs.get_org_by_org_id_list(org_name="site", org_id_list=list(site_ids))
 
         self.set_sites(sites=sites)
@@ -200,7 +276,7 @@ class EntityController:
     def process_cohorts(self):
         logging.info("Now Validating Cohorts...")
 
-        cohort_ids = sorted({x.cohort_id for x in self.valid_user_cohorts})
+        cohort_ids = sorted(set(self.valid_user_cohorts.column('cohort_id')))
         cohorts = fs.get_org_by_org_id_list(org_name="cohort", org_id_list=list(cohort_ids))
 
         self.set_cohorts(cohorts=cohorts)
@@ -208,7 +284,7 @@ class EntityController:
     def process_schools(self):
         logging.info("Now Validating Schools...")
 
-        school_ids = sorted({x.school_id for x in self.valid_user_schools})
+        school_ids = sorted(set(self.valid_user_schools.column('school_id')))
 
         schools = fs.get_org_by_org_id_list(org_name="school", org_id_list=list(school_ids))
 
@@ -217,7 +293,7 @@ class EntityController:
     def process_classes(self):
         logging.info("Now Validating Classes...")
 
-        class_ids = sorted({x.class_id for x in self.valid_user_classes})
+        class_ids = sorted(set(self.valid_user_classes.column('class_id')))
 
         classes = fs.get_org_by_org_id_list(org_name="class", org_id_list=list(class_ids))
 
@@ -228,18 +304,13 @@ class EntityController:
         Must be called AFTER users are processed, since we now
         derive administrations from the user_assignments table.
         """
-        admin_ids = {ua.administration_id for ua in self.valid_user_administrations}
+        admin_ids = set(self.valid_user_administrations.column('administration_id'))
         administrations = fs.get_administrations_by_ids(list(admin_ids))
         self.set_administrations(administrations=administrations)
 
     def process_tasks_variants(self):
         logging.info("Now Validating Tasks and Variants...")
-        task_variants = {}
-        for item in self.valid_runs:
-            if item.task_id not in task_variants:
-                task_variants[item.task_id] = []
-            if item.variant_id and item.variant_id not in task_variants[item.task_id]:
-                task_variants[item.task_id].append(item.variant_id)
+        task_variants = {task_id: list(variant_ids) for task_id, variant_ids in self._task_variants.items()}
 
         tasks = fs.get_tasks(task_filter=list(task_variants.keys()))
         self.set_tasks(tasks=tasks)
@@ -259,22 +330,32 @@ class EntityController:
             org_filter=self.org.filters.org_filter,
             user_filter=self.org.filters.user_filter,
             user_number_limit=self.org.user_number_limit,
+            activity_index=self.org.is_activity_index,
+            changed_since=self.changed_since,
+            changed_user_ids=self.changed_user_ids,
+            refreshed_user_ids=self.refreshed_user_ids,
         )
         self.set_users(users=users)
 
     def process_surveys(self):
         logging.info("Now Validating Surveys...")
-        for user in self.valid_users:
-            user_class_ids = sorted({
-                uc.class_id for uc in self.valid_user_classes if uc.user_id == user.user_id
-            })
+        date_filter = self._resolved_date_filter()
+
+        def fetch(user):
+            user_class_ids = sorted(set(self._user_class_ids.get(user.user_id, ())))
+            key_usage = KeyUsage()
             surveys, survey_responses = fs.get_surveys(
                 user_id=user.user_id,
                 user_type=user.user_type,
-                date_filter=self._resolved_date_filter(),
-                survey_key_usage=self.survey_key_usage,
+                date_filter=date_filter,
+                survey_key_usage=key_usage,
                 user_class_ids=user_class_ids,
+                raise_errors=self.raise_read_errors,
             )
+            return surveys, survey_responses, key_usage
+
+        for user, (surveys, survey_responses, key_usage) in self._ordered_fetch(self.valid_users, fetch):
+            merge_key_usage(self.survey_key_usage, key_usage)
 
             if surveys:
                 self.set_surveys(user=user, surveys=surveys)
@@ -293,28 +374,70 @@ class EntityController:
 
     def process_runs(self):
         logging.info("Now Validating Runs...")
-        for user in self.valid_users:
-            self.set_runs(
-                user=user,
-                runs=fs.get_runs(
-                    user_id=user.user_id,
-                    run_key_usage=self.run_key_usage,
-                    is_guest=self.org.is_guest,
-                    date_filter=self._resolved_date_filter(),
-                ),
-            )
+        date_filter = self._resolved_date_filter()
+
+        def fetch(user):
+            key_usage = KeyUsage()
+            runs = list(fs.get_runs(
+                user_id=user.user_id,
+                run_key_usage=key_usage,
+                is_guest=self.org.is_guest,
+                date_filter=date_filter,
+                raise_errors=self.raise_read_errors,
+            ))
+            return runs, key_usage
+
+        for user, (runs, key_usage) in self._ordered_fetch(self.valid_users, fetch):
+            merge_key_usage(self.run_key_usage, key_usage)
+            self.set_runs(user=user, runs=runs)
 
     def process_trials(self):
         logging.info("Now Validating Trials...")
-        for run in self.valid_runs:
-            self.set_trials(run=run,
-                            trials=fs.get_trials(user_id=run.user_id,
-                                                 run_id=run.run_id,
-                                                 task_id=run.task_id,
-                                                 is_guest=self.org.is_guest,
-                                                 trial_key_usage=self.trial_key_usage))
+        if self.org.is_bulk_trial_fetch:
+            self.process_trials_by_user()
+            return
+
+        def fetch(run):
+            key_usage = KeyUsage()
+            trials = list(fs.get_trials(user_id=run.user_id,
+                                        run_id=run.run_id,
+                                        task_id=run.task_id,
+                                        is_guest=self.org.is_guest,
+                                        trial_key_usage=key_usage,
+                                        raise_errors=self.raise_read_errors))
+            return trials, key_usage
+
+        for run, (trials, key_usage) in self._ordered_fetch(self.valid_runs, fetch):
+            merge_key_usage(self.trial_key_usage, key_usage)
+            self.set_trials(run=run, trials=trials)
             run.validate_trials_in_run()
 
+    def process_trials_by_user(self):
+        """
+        Bulk variant of process_trials: one collection-group scan per user streams the
+        trials of all their valid runs, which are then grouped by run in memory.
+        Runs of a user keep their ``valid_runs`` order.
+        """
+        runs_by_user = self._runs_by_user  # user_id -> runs, in valid_runs order
+
+        def fetch(user_id):
+            key_usage = KeyUsage()
+            trials_by_run = {}
+            run_task_ids = {run.run_id: run.task_id for run in runs_by_user[user_id]}
+            for trial in fs.get_trials_for_user(user_id=user_id,
+                                                run_task_ids=run_task_ids,
+                                                is_guest=self.org.is_guest,
+                                                trial_key_usage=key_usage,
+                                                raise_errors=self.raise_read_errors):
+                trials_by_run.setdefault(trial['run_id'], []).append(trial)
+            return trials_by_run, key_usage
+
+        for user_id, (trials_by_run, key_usage) in self._ordered_fetch(list(runs_by_user), fetch):
+            merge_key_usage(self.trial_key_usage, key_usage)
+            for run in runs_by_user[user_id]:
+                self.set_trials(run=run, trials=trials_by_run.get(run.run_id, []))
+                run.validate_trials_in_run()
+
     def set_cohorts(self, cohorts: list):
         for cohort in cohorts:
             try:
@@ -375,147 +498,137 @@ class EntityController:
                         {**error, 'id': f"variant_id: {variant['variant_id']}, task_id: {task_id}"})
 
     def set_users(self, users: list[dict]):
-        for raw in users:
-            # keep original dict for assignment extraction
-            user_dict = dict(raw)
-            uid = user_dict.get('user_id') or user_dict.get('uid')
-            if not uid or uid in self._valid_user_ids:
-                continue
-            try:
-                if settings.config.get('INSTANCE') == 'LEVANTE':
-                    user_model = core_models.LevanteUser(**user_dict)
-                else:
-                    user_model = core_models.UserBase(**user_dict)
+        user_cls = core_models.LevanteUser if settings.config.get('INSTANCE') == 'LEVANTE' else core_models.UserBase
+        users = iter(users)
+        while page := list(islice(users, VALIDATION_PAGE_SIZE)):
+            # keep original dicts for assignment extraction
+            user_dicts = {}
+            for raw in page:
+                user_dict = dict(raw)
+                uid = user_dict.get('user_id') or user_dict.get('uid')
+                if not uid or uid in self._valid_user_ids or uid in user_dicts:
+                    continue
+                user_dicts[uid] = user_dict
+            uids = list(user_dicts)
+            valid, errors = core_models.validate_batch(user_cls, list(user_dicts.values()))
+            for index, user_model in valid:
                 self.valid_users.append(user_model)
-                self._valid_user_ids.add(uid)
-            except ValidationError as e:
-                for err in e.errors():
-                    self.invalid_users.append({**err, 'id': uid})
-
-            # Build user_assignments from the user doc
-            self.set_user_administrations(user_dict)
-            self.process_user_org_joins(user_dict)
-
-    def set_user_administrations(self, user: dict):
-        user_id = user.get('user_id') or user.get('uid')
-        if not user_id:
-            return
+                self._valid_user_ids.add(uids[index])
+            for index, errs in errors.items():
+                for err in errs:
+                    self.invalid_users.append({**err, 'id': uids[index]})
+
+            # Build user_assignments from the user docs
+            self.set_user_administrations(list(user_dicts.values()))
+            self.process_user_org_joins(list(user_dicts.values()))
+
+    def set_user_administrations(self, users: list[dict]):
+        rows = []
+        for user in users:
+            user_id = user.get('user_id') or user.get('uid')
+            if not user_id:
+                continue
 
-        assigned_map = user.get('assignments_assigned') or {}
-        started_map = user.get('assignments_started') or {}
-        completed_map = user.get('assignments_completed') or {}
+            assigned_map = user.get('assignments_assigned') or {}
+            started_map = user.get('assignments_started') or {}
+            completed_map = user.get('assignments_completed') or {}
 
-        for administration_id, assigned_payload in assigned_map.items():
-            try:
-                ua = core_models.UserAdministration(
+            for administration_id, assigned_payload in assigned_map.items():
+                rows.append(dict(
                     user_id=user_id,
                     administration_id=administration_id,
                     date_assigned=assigned_payload,
                     date_started=started_map.get(administration_id),
                     is_completed=(administration_id in completed_map),
-                )
-                self.valid_user_administrations.append(ua)
-            except ValidationError as e:
-                for err in e.errors():
-                    self.invalid_user_administrations.append(
-                        {**err, 'id': f"{user_id}:{administration_id}"}
-                    )
-
-    def process_user_org_joins(self, user: dict):
-        user_id = user.get('user_id') or user.get('uid')
-        if not user_id:
-            return
-
-        sites = user.get("districts", {})
-        cohorts = user.get("groups", {})
-        schools = user.get("schools", {})
-        classes = user.get("classes", {})
-
-        for site_id, is_active in utils.ids_with_active(org_map=sites):
-            try:
-                self.valid_user_sites.append(core_models.UserSite(
-                    user_id=user_id, site_id=site_id, is_active=is_active
-                ))
-            except ValidationError as e:
-                self.invalid_user_sites.append({'id': f'{user_id}:{site_id}', 'errors': e.errors()})
-
-        for cohort_id, is_active in utils.ids_with_active(org_map=cohorts):
-            try:
-                self.valid_user_cohorts.append(core_models.UserCohort(
-                    user_id=user_id, cohort_id=cohort_id, is_active=is_active
                 ))
-            except ValidationError as e:
-                self.invalid_user_cohorts.append({'id': f'{user_id}:{cohort_id}', 'errors': e.errors()})
 
-        for school_id, is_active in utils.ids_with_active(org_map=schools):
-            try:
-                self.valid_user_schools.append(core_models.UserSchool(
-                    user_id=user_id, school_id=school_id, is_active=is_active
-                ))
-            except ValidationError as e:
-                self.invalid_user_schools.append({'id': f'{user_id}:{school_id}', 'errors': e.errors()})
+        valid, errors = core_models.validate_batch(core_models.UserAdministration, rows)
+        self.valid_user_administrations.extend(
+            core_models.dump_batch(core_models.UserAdministration, [ua for _, ua in valid]))
+        for index, errs in errors.items():
+            for err in errs:
+                self.invalid_user_administrations.append(
+                    {**err, 'id': f"{rows[index]['user_id']}:{rows[index]['administration_id']}"}
+                )
 
-        for class_id, is_active in utils.ids_with_active(org_map=classes):
-            try:
-                self.valid_user_classes.append(core_models.UserClass(
-                    user_id=user_id, class_id=class_id, is_active=is_active
-                ))
-            except ValidationError as e:
-                self.invalid_user_classes.append({'id': f'{user_id}:{class_id}', 'errors': e.errors()})
+    def process_user_org_joins(self, users: list[dict]):
+        org_joins = (
+            ("sites", "districts", "site_id", core_models.UserSite,
+             self.valid_user_sites, self.invalid_user_sites),
+            ("cohorts", "groups", "cohort_id", core_models.UserCohort,
+             self.valid_user_cohorts, self.invalid_user_cohorts),
+            ("schools", "schools", "school_id", core_models.UserSchool,
+             self.valid_user_schools, self.invalid_user_schools),
+            ("classes", "classes", "class_id", core_models.UserClass,
+             self.valid_user_classes, self.invalid_user_classes),
+        )
+        users = [(user.get('user_id') or user.get('uid'), user) for user in users]
+        for org_type, user_field, id_field, model_cls, valid_rows, invalid_rows in org_joins:
+            rows = [
+                {"user_id": user_id, id_field: org_id, "is_active": is_active}
+                for user_id, user in users if user_id
+                for org_id, is_active in utils.ids_with_active(org_map=user.get(user_field, {}))
+            ]
+            valid, errors = core_models.validate_batch(model_cls, rows)
+            valid_rows.extend(core_models.dump_batch(model_cls, [m for _, m in valid]))
+            if org_type == "classes":
+                for index, _ in valid:
+                    self._user_class_ids.setdefault(rows[index]["user_id"], []).append(rows[index][id_field])
+            for index, errs in errors.items():
+                invalid_rows.append({'id': f'{rows[index]["user_id"]}:{rows[index][id_field]}', 'errors': errs})
 
     def set_surveys(self, user: core_models.LevanteUser, surveys: list):
-        for survey in surveys:
-            try:
-                self.valid_surveys.append(core_models.Survey(**survey))
-            except ValidationError as e:
-                for error in e.errors():
-                    self.invalid_surveys.append(
-                        {**error, 'id': f"user_id: {user.user_id}, survey_id: {survey.get('survey_id')}"})
+        valid, errors = core_models.validate_batch(core_models.Survey, surveys)
+        self.valid_surveys.extend(core_models.dump_batch(core_models.Survey, [m for _, m in valid]))
+        for index, errs in errors.items():
+            for error in errs:
+                self.invalid_surveys.append(
+                    {**error, 'id': f"user_id: {user.user_id}, survey_id: {surveys[index].get('survey_id')}"})
 
     def set_survey_responses(self, user: core_models.LevanteUser, survey_responses: list):
-        for survey_response in survey_responses:
-            try:
-                survey_part = survey_response.get("survey_part")
-                survey_type = survey_response.get("survey_type")
-                response = survey_response.get("response")
-                response_type = survey_response.get("response_type")
-                is_duplicate = survey_response.get("validation_msg_survey_response") in {
-                    DUPLICATE_SURVEY_MSG,
-                    MULTIPLE_COMPLETED_SURVEY_MSG,
+        # survey_schema_source is carried as a model field so the
+        # auto-running question-existence validator can emit a tailored
+        # message (audioFile vs question).
+        payloads = [
+            {
+                k: v for k, v in survey_response.items()
+                if k not in {
+                    "survey_part",
+                    "survey_type",
+                    "response",
+                    "response_type",
                 }
-                # survey_schema_source is carried as a model field so the
-                # auto-running question-existence validator can emit a tailored
-                # message (audioFile vs question).
-                survey_payload = {
-                    k: v for k, v in survey_response.items()
-                    if k not in {
-                        "survey_part",
-                        "survey_type",
-                        "response",
-                        "response_type",
-                    }
-                }
-
-                survey_response_model = core_models.SurveyResponse(**survey_payload)
-                if is_duplicate:
-                    survey_response_model.validation_msg_survey_response = (
-                        survey_response.get("validation_msg_survey_response")
-                    )
-                    survey_response_model.valid_survey_response = False
-                else:
-                    survey_response_model.coerce_response_from_raw(
-                        response=response,
-                        response_type=response_type
-                    )
-                    survey_response_model.validate_response_against_schema(
-                        survey_part=survey_part,
-                        survey_type=survey_type,
-                    )
-                self.valid_survey_responses.append(survey_response_model)
-            except ValidationError as e:
-                for error in e.errors():
-                    self.invalid_survey_responses.append(
-                        {**error, 'id': f"user_id: {user.user_id}, survey_id: {survey_response.get('survey_id')}"})
+            }
+            for survey_response in survey_responses
+        ]
+        valid, errors = core_models.validate_batch(core_models.SurveyResponse, payloads)
+        for index, survey_response_model in valid:
+            survey_response = survey_responses[index]
+            is_duplicate = survey_response.get("validation_msg_survey_response") in {
+                DUPLICATE_SURVEY_MSG,
+                MULTIPLE_COMPLETED_SURVEY_MSG,
+            }
+            if is_duplicate:
+                survey_response_model.validation_msg_survey_response = (
+                    survey_response.get("validation_msg_survey_response")
+                )
+                survey_response_model.valid_survey_response = False
+            else:
+                survey_response_model.coerce_response_from_raw(
+                    response=survey_response.get("response"),
+                    response_type=survey_response.get("response_type")
+                )
+                survey_response_model.validate_response_against_schema(
+                    survey_part=survey_response.get("survey_part"),
+                    survey_type=survey_response.get("survey_type"),
+                )
+        self.valid_survey_responses.extend(
+            core_models.dump_batch(core_models.SurveyResponse, [m for _, m in valid]))
+        for index, errs in errors.items():
+            for error in errs:
+                self.invalid_survey_responses.append(
+                    {**error,
+                     'id': f"user_id: {user.user_id}, survey_id: {survey_responses[index].get('survey_id')}"})
 
     def set_administrations(self, administrations: list):
         for administration in administrations:
@@ -527,38 +640,47 @@ class EntityController:
                     self.invalid_administrations.append({**error, 'id': administration['administration_id']})
 
     def set_runs(self, user: core_models.LevanteUser, runs: list):
-        for run in runs:
-            try:
-                run_model = core_models.LevanteRun(**run)
-                # remove intro runs.
-                if run_model.task_id == "intro":
-                    continue
-                run_model.add_age_from_users(birth_year=user.birth_year, birth_month=user.birth_month)
-                self.valid_runs.append(run_model)
-            except ValidationError as e:
-                for error in e.errors():
-                    self.invalid_runs.append(
-                        {**error, 'id': f"run_id: {run['run_id']}, user_id: {user.user_id}"})
+        # Run models are kept (not dumped) until get_validated_data: trials update them later.
+        valid, errors = core_models.validate_batch(core_models.LevanteRun, runs)
+        for _, run_model in valid:
+            # remove intro runs.
+            if run_model.task_id == "intro":
+                continue
+            run_model.add_age_from_users(birth_year=user.birth_year, birth_month=user.birth_month)
+            self.valid_runs.append(run_model)
+            self._runs_by_user.setdefault(run_model.user_id, []).append(run_model)
+            variant_ids = self._task_variants.setdefault(run_model.task_id, {})
+            if run_model.variant_id:
+                variant_ids[run_model.variant_id] = None
+        for index, errs in errors.items():
+            for error in errs:
+                self.invalid_runs.append(
+                    {**error, 'id': f"run_id: {runs[index]['run_id']}, user_id: {user.user_id}"})
 
     def set_trials(self, run: core_models.RunBase, trials: list):
-        for trial in trials:
-            try:
-                trial_model = core_models.LevanteTrial(**trial)
-                # remove instruction and training
-                if ("instruction" in str(trial_model.assessment_stage or "").lower() or
-                        "display" in str(trial_model.trial_mode or "").lower() or
-                        "training" in str(trial_model.corpus_trial_type or "").lower()):
-                    continue
-                is_test_trial = (trial_model.assessment_stage == 'test_response' or
-                                 (trial_model.is_practice_trial is not None and not trial_model.is_practice_trial))
-                # Execute action based on the condition
-                if is_test_trial:
-                    run.add_non_practice_trials(trial_model)
-
-                self.valid_trials.append(trial_model)
-
-            except ValidationError as e:
-                for error in e.errors():
-                    self.invalid_trials.append(
-                        {**error,
-                         'id': f"trial_id: {trial['trial_id']}, run_id: {run.run_id}, user_id: {run.user_id}, task_id:{trial.get('task_id', None)}"})
+        valid, errors = core_models.validate_batch(core_models.LevanteTrial, trials)
+        kept = []
+        is_test_trials = []
+        for _, trial_model in valid:
+            # remove instruction and training
+            if ("instruction" in str(trial_model.assessment_stage or "").lower() or
+                    "display" in str(trial_model.trial_mode or "").lower() or
+                    "training" in str(trial_model.corpus_trial_type or "").lower()):
+                continue
+            kept.append(trial_model)
+            is_test_trials.append(core_models.is_non_practice_trial(trial_model.assessment_stage,
+                                                                    trial_model.is_practice_trial))
+
+        # Only the dumped rows are kept; the run's checks read the same dicts.
+        rows = core_models.dump_batch(core_models.LevanteTrial, kept)
+        for row, is_test_trial in zip(rows, is_test_trials):
+            if is_test_trial:
+                run.add_non_practice_trials(row)
+        self.valid_trials.extend(rows)
+
+        for index, errs in errors.items():
+            trial = trials[index]
+            for error in errs:
+                self.invalid_trials.append(
+                    {**error,
+                     'id': f"trial_id: {trial['trial_id']}, run_id: {run.run_id}, user_id: {run.user_id}, task_id:{trial.get('task_id', None)}"})
@@ -41,8 +41,9 @@ class RedivisServices:
         logging.info(properties_value)
 
     def save_to_redivis_table(self, file_name: str, upload_merge_strategy: str = 'replace'):
-        upload_name = file_name.split("/")[1]
-        table_name = upload_name.split(".")[0]
+        # '{dataset}/{table}.json', or '{dataset}/{table}/{shard}.json' for partitioned tables
+        upload_name = file_name.split("/")[-1]
+        table_name = file_name.split("/")[1].split(".")[0]
         if self.dataset.table(table_name).exists():
             table = self.dataset.table(table_name)
             table.update(upload_merge_strategy=upload_merge_strategy, description=f"This upload is from {file_name}")
@@ -55,8 +56,16 @@ class RedivisServices:
             )
         logging.info(f"Uploading {table_name} to Redivis.")
         upload = table.upload(name=upload_name)
+        # .json files are typed from their extension; gzipped NDJSON and Parquet are named explicitly.
+        if upload_name.endswith(".ndjson.gz"):
+            upload_type = "ndjson"
+        elif upload_name.endswith(".parquet"):
+            upload_type = "parquet"
+        else:
+            upload_type = None
         try:
             upload.create(
+                type=upload_type,
                 transfer_specification={
                     "sourceType": "gcs",  # one of gcs, s3, bigQuery, url, redivis
                     "sourcePath": f"{settings.config['CORE_DATA_BUCKET_NAME']}/{file_name}",